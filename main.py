@@ -8,18 +8,34 @@ exporting checklist, and converting.
 """
 import argparse
 import logging
+import multiprocessing
 import sys
 import tempfile
-from pathlib import Path
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, Dict, List, Optional
 
-import pythoncom
 import yaml
 
-from py_files.config import LOG_PATH, CONFIG_PATH, CHECKLIST_CSV
-from py_files.sharepoint_gateway import SharePointGateway
-from py_files.mock_sharepoint_gateway import MockSharePointGateway
+from py_files.config import LOG_PATH, CONFIG_PATH, CHECKLIST_CSV, REJECTED_PATH
 from py_files.checklist import load_checklist, save_checklist
-from py_files.excel_converter import ExcelConverter
+from py_files.metrics import metrics
+from py_files.utils import SourceInfo, key_from_pdf
+from py_files.worker_pool import BACKENDS, ConverterPool
+
+# Gateways (office365/azure), the pipeline and the scan index are imported
+# only by the code paths that use them, keeping cold start of the frozen
+# exe fast for --export-checklist and --mock-local.
+# `python -m py_files.import_bench` guards this.
+if TYPE_CHECKING:
+    from py_files.change_tracker import ChangeTracker
+    from py_files.conversion_cache import ConversionCache
+    from py_files.lease_queue import LeaseQueue
+    from py_files.pipeline import PipelineStats
+    from py_files.quarantine import Quarantine
+    from py_files.run_journal import RunJournal
+    from py_files.scan_index import ScanIndex
+    from py_files.scheduler import CostModel
+    from py_files.upload_manifest import UploadManifest
 
 
 def parse_args():
@@ -37,6 +53,29 @@ def parse_args():
         metavar="CSV_PATH",
         help="Export the checklist to a CSV file and exit"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        metavar="N",
+        help="Number of parallel converter processes (overrides config 'workers')"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=sorted(BACKENDS),
+        help="Converter backend (overrides config 'converter_backend')"
+    )
+    parser.add_argument(
+        "--changed",
+        action="store_true",
+        default=False,
+        help="Only convert sources added or modified since the last --changed run"
+    )
+    parser.add_argument(
+        "--reset-failed",
+        action="store_true",
+        default=False,
+        help="Reopen units the shared lease queue gave up on after repeated failures"
+    )
     parser.add_argument(
         "folders",
         nargs="*",
@@ -68,28 +107,81 @@ def load_cfg() -> dict:
     return yaml.safe_load(CONFIG_PATH.read_text())
 
 
-def list_subfolders_with_stats(gateway):
+_scan_index: Optional["ScanIndex"] = None
+# Menu counts for gateways with no local tree to walk (SharePoint), from
+# one gateway.list_completed_pdfs() listing; None until first listed
+_pdf_counts: Optional[Dict[str, int]] = None
+
+
+def get_scan_index() -> "ScanIndex":
+    """Process-wide scan index, so menu redraws reuse the last scan."""
+    global _scan_index
+    if _scan_index is None:
+        from py_files.scan_index import ScanIndex
+        _scan_index = ScanIndex()
+    return _scan_index
+
+
+def count_by_subfolder(pdfs: List[str], subs) -> Dict[str, int]:
+    """Completed PDFs per subfolder URL, each PDF counted under the subfolder it lies in."""
+    counts = {fld.serverRelativeUrl: 0 for fld in subs}
+    by_path = {rel.replace("\\", "/").rstrip("/"): rel for rel in counts}
+    for pdf in pdfs:
+        for parent in PurePosixPath(pdf.replace("\\", "/")).parents:
+            rel = by_path.get(str(parent))
+            if rel is not None:
+                counts[rel] += 1
+                break
+    return counts
+
+
+def list_subfolders_with_stats(gateway, refresh: bool = False):
+    """
+    (index, name, rel, completed PDF count) per subfolder. The mock gateway's
+    counts come from the in-memory scan index; SharePoint's from one
+    recursive list_completed_pdfs() call grouped by subfolder. Both are
+    memoised for redraws unless `refresh`.
+    """
+    from py_files.mock_sharepoint_gateway import MockSharePointGateway
+
+    global _pdf_counts
     subs = gateway.list_immediate_subfolders()
-    stats = []
-    for idx, fld in enumerate(subs, start=1):
-        rel = fld.serverRelativeUrl
-        file_count = len(list(Path(rel).rglob("*_lease_leadpaint_xrf.pdf")))
-        stats.append((idx, fld.name, rel, file_count))
-    return stats
+    rels = [fld.serverRelativeUrl for fld in subs]
+    if isinstance(gateway, MockSharePointGateway):
+        found = get_scan_index().scan(rels, refresh=refresh)
+        counts = {rel: len(found[rel]) for rel in rels}
+    else:
+        if refresh or _pdf_counts is None:
+            _pdf_counts = count_by_subfolder(gateway.list_completed_pdfs(), subs)
+        counts = _pdf_counts
+    return [(idx, fld.name, fld.serverRelativeUrl, counts.get(fld.serverRelativeUrl, 0))
+            for idx, fld in enumerate(subs, start=1)]
 
 
 def scan_all_folders(gateway):
-    stats = list_subfolders_with_stats(gateway)
+    """
+    Rebuild the checklist from one recursive listing of every completed PDF
+    (gateway.list_completed_pdfs), then report completed counts per folder.
+    """
+    global _pdf_counts
+    pdfs = [p.replace("\\", "/") for p in gateway.list_completed_pdfs()]
+    found = {}
+    for pdf in pdfs:
+        key = key_from_pdf(PurePosixPath(pdf).stem)
+        if "_" in key:
+            found[key] = True
     done_map = load_checklist()
-    for _, _, rel, _ in stats:
-        for pdf in Path(rel).rglob("*_lease_leadpaint_xrf.pdf"):
-            parts = pdf.stem.replace("_lease_leadpaint_xrf", "").split("_")
-            if len(parts) >= 2:
-                done_map[f"{parts[0]}_{parts[1]}"] = True
+    added = sum(1 for key in found if not done_map.get(key))
+    # One batched write rather than one per unit
+    done_map.update(found)
     save_checklist(done_map)
-    print("Scan complete. Checklist updated.")
-    for _, name, rel, count in list_subfolders_with_stats(gateway):
-        print(f"{name}: {count} completed")
+    subs = gateway.list_immediate_subfolders()
+    # Menu counts are memoised; this listing is the freshest there is
+    _pdf_counts = count_by_subfolder(pdfs, subs)
+    get_scan_index().invalidate()
+    print(f"Scan complete. {len(pdfs)} PDFs found, {added} unit(s) newly marked complete.")
+    for fld in subs:
+        print(f"{fld.name}: {_pdf_counts[fld.serverRelativeUrl]} completed")
     return done_map
 
 
@@ -144,39 +236,87 @@ def select_subfolders(gateway):
         print("No valid selection, try again.")
 
 
-def convert_folder(rel_path: str, gateway, done_map):
-    folder = Path(rel_path)
-    out_dir = folder / "automation_output"
-    out_dir.mkdir(parents=True, exist_ok=True)
-    tmpdir = tempfile.TemporaryDirectory(prefix="lp_src_")
-    sources = list(gateway.download_sources(rel_path, Path(tmpdir.name)))
-    jobs = []
-    for src in sources:
-        prop, unit = ExcelConverter._extract_ids(src.stem)
-        if prop and unit and not done_map.get(f"{prop}_{unit}"):
-            jobs.append(src)
-    if not jobs:
-        print(f"No new files in {rel_path}")
-        tmpdir.cleanup()
-        return
-    pythoncom.CoInitialize()
-    conv = ExcelConverter(out_dir)
-    conv.__enter__()
-    try:
-        print(f"Converting {len(jobs)} files in {rel_path}...")
-        for i, src in enumerate(jobs, 1):
-            print(f"[{i}/{len(jobs)}] {src.name} ... ", end="", flush=True)
-            pdf = conv.convert(src)
-            if pdf:
-                key = Path(pdf).stem.replace("_lease_leadpaint_xrf", "")
-                done_map[key] = True
-                print("Done")
-            else:
-                print("Skipped")
-    finally:
-        conv.__exit__(None, None, None)
-        pythoncom.CoUninitialize()
-        tmpdir.cleanup()
+def make_gateway(cfg: dict, mock: bool):
+    """Import and build only the gateway this run needs."""
+    if mock:
+        from py_files.mock_sharepoint_gateway import MockSharePointGateway
+        return MockSharePointGateway(cfg)
+    from py_files.sharepoint_gateway import SharePointGateway
+    return SharePointGateway(cfg)
+
+
+def convert_folders(rel_paths: List[str], gateway, done_map, pool: ConverterPool,
+                    cache: Optional["ConversionCache"] = None, cfg: Optional[dict] = None,
+                    quarantine: Optional["Quarantine"] = None,
+                    lease_queue: Optional["LeaseQueue"] = None,
+                    journal: Optional["RunJournal"] = None,
+                    cost_model: Optional["CostModel"] = None,
+                    sources: Optional[Dict[str, List[SourceInfo]]] = None,
+                    manifest: Optional["UploadManifest"] = None,
+                    rejections: Optional["Quarantine"] = None
+                    ) -> Dict[str, "PipelineStats"]:
+    """
+    Download, convert and upload the folders as one pipeline run. Sources of
+    all folders share a single longest-first queue, so `pool` stays evenly
+    loaded; progress is reported per folder and overall. `sources` limits
+    the folders it covers to those files (see changed_folders).
+    """
+    from py_files.pipeline import Pipeline
+
+    global _pdf_counts
+    cfg = cfg or {}
+    pipeline = Pipeline(
+        gateway,
+        pool,
+        cache=cache,
+        upload=cfg.get("upload_outputs", True),
+        upload_workers=cfg.get("upload_workers", 2),
+        queue_size=cfg.get("queue_size", 8),
+        quarantine=quarantine,
+        lease_queue=lease_queue,
+        journal=journal,
+        cost_model=cost_model,
+        preflight=cfg.get("preflight", True),
+        manifest=manifest,
+        rejections=rejections,
+    )
+    print(f"Processing {len(rel_paths)} folder(s) with {pool.size} worker(s)...")
+    with metrics.span("run", folders=len(rel_paths)) as sp:
+        results = pipeline.run_all(rel_paths, done_map, sources)
+        for key in ("listed", "converted", "cached", "failed", "uploaded"):
+            sp[key] = sum(getattr(st, key) for st in results.values())
+    # Uploads changed the completed counts the menu shows
+    _pdf_counts = None
+    index = get_scan_index()
+    for rel_path, stats in results.items():
+        index.invalidate(rel_path)
+        if not (stats.cached or stats.converted or stats.skipped or stats.rejected
+                or stats.failed or stats.resumed):
+            print(f"No new files in {rel_path}")
+        else:
+            print(f"{rel_path}: {stats.summary()}")
+    return results
+
+
+def changed_folders(gateway, tracker: "ChangeTracker"):
+    """
+    (folders, sources) with what changed since the last committed token.
+    Without a usable token, every folder is returned with sources None.
+    """
+    with metrics.span("list.changes") as sp:
+        changes = tracker.poll(gateway)
+        sp["folders"] = -1 if changes is None else len(changes)
+    if changes is None:
+        print("No change token yet; listing every folder once.")
+        return [fld.serverRelativeUrl for fld in gateway.list_immediate_subfolders()], None
+    print(f"{sum(map(len, changes.values()))} changed source(s) in {len(changes)} folder(s).")
+    return sorted(changes), changes
+
+
+def convert_folder(rel_path: str, gateway, done_map, pool: ConverterPool,
+                   **kwargs) -> "PipelineStats":
+    """convert_folders() for a single folder; returns its stats."""
+    return convert_folders([rel_path], gateway, done_map, pool, **kwargs)[rel_path]
 
 
 def main():
@@ -186,8 +326,6 @@ def main():
     # Load external or bundled config.yaml
     cfg = load_cfg()
 
-    gateway = MockSharePointGateway(cfg) if args.mock_local else SharePointGateway(cfg)
-
     if args.export_checklist:
         dm = load_checklist()
         p = Path(args.export_checklist)
@@ -198,7 +336,20 @@ def main():
         print(f"Checklist exported to {p}")
         return
 
-    if args.folders:
+    gateway = make_gateway(cfg, args.mock_local)
+
+    tracker = sources = None
+    if args.changed:
+        from py_files.change_tracker import ChangeTracker
+
+        tracker = ChangeTracker()
+        done_map = load_checklist()
+        rels, sources = changed_folders(gateway, tracker)
+        if not rels:
+            tracker.commit()
+            print("Nothing changed since the last run.")
+            return
+    elif args.folders:
         done_map = load_checklist()
         rels = args.folders
     else:
@@ -207,12 +358,73 @@ def main():
             print("No folders selected, exiting.")
             return
 
-    for rel in rels:
-        convert_folder(rel, gateway, done_map)
+    from py_files.conversion_cache import ConversionCache
+    from py_files.lease_queue import LeaseQueue
+    from py_files.quarantine import Quarantine
+    from py_files.run_journal import RunJournal
+    from py_files.scheduler import CostModel
+    from py_files.upload_manifest import UploadManifest
+
+    metrics_file = cfg.get("metrics_file")
+    metrics.open(Path(metrics_file) if metrics_file else None)
+    workers = args.workers or cfg.get("workers", 1)
+    backend = args.backend or cfg.get("converter_backend", "excel")
+    cache = ConversionCache.from_cfg(cfg, backend)
+    quarantine = Quarantine()
+    rejections = Quarantine(REJECTED_PATH, label="rejected")
+    lease_queue = LeaseQueue.from_cfg(cfg)
+    if lease_queue and args.reset_failed:
+        print(f"Reopened {lease_queue.reset_failed()} failed unit(s) in the lease queue")
+    # Replays what an interrupted run left unfinished
+    journal = RunJournal()
+    manifest = UploadManifest() if cfg.get("skip_unchanged_uploads", True) else None
+    options = {}
+    if backend == "excel":
+        options = {
+            "max_workbooks": cfg.get("excel_recycle_workbooks", 200),
+            "max_memory_mb": cfg.get("excel_recycle_memory_mb", 0),
+            "csv_fast_path": cfg.get("csv_fast_path", True),
+        }
+    try:
+        with tempfile.TemporaryDirectory(prefix="lp_pdf_") as staging, \
+                ConverterPool(Path(staging), workers=workers, backend=backend,
+                              backend_options=options, isolate=True,
+                              timeouts=cfg.get("stage_timeouts")) as pool:
+            results = convert_folders(rels, gateway, done_map, pool, cache=cache, cfg=cfg,
+                                      quarantine=quarantine, lease_queue=lease_queue,
+                                      journal=journal, cost_model=CostModel(),
+                                      sources=sources, manifest=manifest,
+                                      rejections=rejections)
+        if tracker:
+            # Keep the old token unless every change was handled, so sources
+            # that failed (or a run that dies) are offered again next time
+            unfinished = [rel for rel, st in results.items()
+                          if st.errors or st.failed or st.upload_failed]
+            if unfinished:
+                logging.warning("Not saving the change token: %d folder(s) had failures",
+                                len(unfinished))
+            else:
+                tracker.commit()
+    finally:
+        # Drops finished units; anything left is resumed by the next run
+        journal.close()
+        if lease_queue:
+            lease_queue.close()
 
     save_checklist(done_map)
+    if cache:
+        logging.info(cache.summary())
+    print(metrics.summary())
+    metrics.close()
+    if len(quarantine):
+        logging.warning("%d source(s) quarantined, see %s", len(quarantine), quarantine.path)
+    if len(rejections):
+        logging.warning("%d source(s) rejected by preflight, see %s", len(rejections),
+                        rejections.path)
     print("All done.")
 
 
 if __name__ == "__main__":
+    # Required for the spawned converter workers in the PyInstaller exe
+    multiprocessing.freeze_support()
     main()
@@ -7,12 +7,18 @@ block_cipher = None
 # collect every win32com submodule (this will grab win32timezone too)
 pywin32_hidden = collect_submodules('win32com') + ['win32timezone']
 
+# converter backends are imported by name inside the worker processes
+backend_hidden = ['py_files.excel_converter', 'py_files.pdf_converter', 'py_files.fake_converter']
+
+# azure-identity loads the encrypted token cache support lazily
+auth_hidden = collect_submodules('msal_extensions')
+
 a = Analysis(
     ['main.py'],
     pathex=['.'],               # look in the current directory
     binaries=[],
     datas=[],
-    hiddenimports=pywin32_hidden,
+    hiddenimports=pywin32_hidden + backend_hidden + auth_hidden,
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
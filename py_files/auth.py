@@ -0,0 +1,194 @@
+# auth.py
+"""
+Credentials for SharePointGateway, backed by a persistent token cache.
+
+Tokens are kept in the MSAL cache that azure-identity encrypts with the
+OS (DPAPI on Windows, Keychain on macOS, libsecret on Linux) under
+CACHE_NAME, so they survive between runs and are refreshed silently.
+For device-code sign-in, the account chosen at the first login is saved
+to AUTH_RECORD. That file holds no secrets, only which cached account to
+use. Once it exists, later runs start without a prompt.
+
+auth.method in config.yaml selects:
+    device_code    interactive first login, silent afterwards (default)
+    client_secret  app registration secret, for headless nodes
+    certificate    app registration certificate, for headless nodes
+
+Run directly to check the device-code flow against stub credential and
+record classes: the first login saves the record, the next run is
+silent, and a non-interactive run with no record fails fast:
+    python -m py_files.auth
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from py_files.config import AUTH_RECORD, PUBLIC_GRAPH_CLIENT_ID
+
+logger = logging.getLogger(__name__)
+
+CACHE_NAME = "leadpaint-xrf"
+METHODS = ("device_code", "client_secret", "certificate")
+
+
+def site_scope(site_url: str) -> str:
+    """The .default scope of the SharePoint host serving `site_url`."""
+    parts = urlsplit(site_url)
+    return f"{parts.scheme}://{parts.netloc}/.default"
+
+
+def load_record(path: Path, record_cls):
+    """The saved AuthenticationRecord, or None if there is none (or it is unreadable)."""
+    try:
+        return record_cls.deserialize(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Ignoring unreadable auth record %s: %s", path, e)
+        return None
+
+
+def save_record(record, path: Path) -> None:
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(record.serialize(), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def device_code_credential(client_id: str, tenant_id: str, scope: str,
+                           record_path: Path = AUTH_RECORD, interactive: bool = True,
+                           cache_options=None, credential_cls=None, record_cls=None):
+    """
+    A DeviceCodeCredential bound to the cached account. The first login
+    writes `record_path`; after that tokens come silently from the cache.
+
+    :param interactive: Allow a device-code prompt. Scheduled runs pass
+                        False so an expired sign-in fails fast instead of
+                        waiting for a login nobody will do.
+    :param credential_cls: DeviceCodeCredential, or a stub with the same
+                           constructor, authenticate() and get_token().
+    :param record_cls: AuthenticationRecord, or a stub with deserialize().
+    """
+    if credential_cls is None:
+        from azure.identity import DeviceCodeCredential as credential_cls
+    if record_cls is None:
+        from azure.identity import AuthenticationRecord as record_cls
+    record = load_record(record_path, record_cls)
+    if record is None and not interactive:
+        raise RuntimeError(f"No saved sign-in at {record_path}; run once with "
+                           "auth.interactive: true to create it")
+    cred = credential_cls(
+        tenant_id=tenant_id,
+        client_id=client_id,
+        cache_persistence_options=cache_options,
+        authentication_record=record,
+        disable_automatic_authentication=not interactive,
+    )
+    if record is None:
+        record = cred.authenticate(scopes=[scope])
+        save_record(record, record_path)
+        logger.info("Saved sign-in for %s to %s", record.username, record_path)
+    else:
+        logger.info("Using cached sign-in for %s", record.username)
+    return cred
+
+
+def make_credential(auth_cfg: dict, scope: str, record_path: Path = AUTH_RECORD):
+    """Build the credential selected by the 'auth' section of config.yaml."""
+    from azure.identity import TokenCachePersistenceOptions
+
+    method = auth_cfg.get("method", "device_code")
+    client_id = auth_cfg.get("client_id", PUBLIC_GRAPH_CLIENT_ID)
+    tenant_id = auth_cfg.get("tenant_id", "common")
+    options = TokenCachePersistenceOptions(
+        name=CACHE_NAME,
+        allow_unencrypted_storage=bool(auth_cfg.get("allow_unencrypted_cache", False)),
+    )
+    if method == "device_code":
+        return device_code_credential(client_id, tenant_id, scope, record_path,
+                                      interactive=auth_cfg.get("interactive", True),
+                                      cache_options=options)
+    if method not in METHODS:
+        raise ValueError(f"Unknown auth.method {method!r}; expected one of {', '.join(METHODS)}")
+    if tenant_id in ("common", "organizations"):
+        raise ValueError(f"auth.method {method} needs auth.tenant_id set to your tenant GUID")
+    if method == "client_secret":
+        from azure.identity import ClientSecretCredential
+
+        secret = auth_cfg.get("client_secret") or os.environ.get("AZURE_CLIENT_SECRET")
+        if not secret:
+            raise ValueError("auth.method client_secret needs auth.client_secret "
+                             "or the AZURE_CLIENT_SECRET environment variable")
+        return ClientSecretCredential(tenant_id, client_id, secret,
+                                      cache_persistence_options=options)
+    from azure.identity import CertificateCredential
+
+    cert_path = auth_cfg.get("certificate_path")
+    if not cert_path:
+        raise ValueError("auth.method certificate needs auth.certificate_path")
+    password = (auth_cfg.get("certificate_password")
+                or os.environ.get("AZURE_CLIENT_CERTIFICATE_PASSWORD"))
+    return CertificateCredential(tenant_id, client_id, certificate_path=cert_path,
+                                 password=password, cache_persistence_options=options)
+
+
+class _StubRecord:
+    """AuthenticationRecord stand-in for main()."""
+    def __init__(self, username: str):
+        self.username = username
+
+    def serialize(self) -> str:
+        return json.dumps({"username": self.username})
+
+    @classmethod
+    def deserialize(cls, data: str) -> "_StubRecord":
+        return cls(json.loads(data)["username"])
+
+
+class _StubCredential:
+    """DeviceCodeCredential stand-in for main(); counts device-code prompts."""
+    prompts = 0
+
+    def __init__(self, tenant_id, client_id, cache_persistence_options=None,
+                 authentication_record=None, disable_automatic_authentication=False):
+        self.record = authentication_record
+        self.silent_only = disable_automatic_authentication
+
+    def authenticate(self, scopes):
+        if self.silent_only:
+            raise RuntimeError("authentication required")
+        type(self).prompts += 1
+        self.record = _StubRecord("inspector@example.com")
+        return self.record
+
+
+def main(argv=None) -> int:
+    scope = site_scope("https://contoso.sharepoint.com/sites/xrf")
+    stubs = {"credential_cls": _StubCredential, "record_cls": _StubRecord}
+    with tempfile.TemporaryDirectory() as tmp:
+        record_path = Path(tmp) / "auth_record.json"
+        try:
+            device_code_credential("client", "common", scope, record_path,
+                                   interactive=False, **stubs)
+            fails_fast = False
+        except RuntimeError:
+            fails_fast = not record_path.exists()
+        device_code_credential("client", "common", scope, record_path, **stubs)
+        saved = record_path.exists() and _StubCredential.prompts == 1
+        # Silent whether or not a prompt would be allowed
+        creds = [device_code_credential("client", "common", scope, record_path,
+                                        interactive=interactive, **stubs)
+                 for interactive in (True, False)]
+        silent = _StubCredential.prompts == 1 and all(
+            cred.record.username == "inspector@example.com" for cred in creds)
+    print(f"first login {'saved the record' if saved else 'DID NOT SAVE'}, "
+          f"second run {'silent' if silent else 'PROMPTED'}, "
+          f"non-interactive without a record {'failed fast' if fails_fast else 'DID NOT FAIL'}")
+    return 0 if saved and silent and fails_fast else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+# benchmark.py
+"""
+Conversion throughput benchmark on synthetic XRF sources.
+
+Generates <prop>-<unit>-XRF.csv/.xlsx files of the requested sizes in a
+scratch directory, runs them through main.convert_folder with the mock
+gateway and the chosen converter backend, and reports files/sec,
+per-stage latency percentiles and peak memory. Results are compared with
+the stored baseline for the same scenario; a drop beyond the tolerance
+exits 1.
+
+    python -m py_files.benchmark [--files 40] [--rows 50,500,5000]
+        [--formats csv,xlsx] [--backend fake|python|excel] [--workers 2]
+        [--baseline bench_baseline.json] [--save-baseline] [--tolerance 0.2]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+BASELINE_PATH = Path("bench_baseline.json")
+DEFAULT_TOLERANCE = 0.2
+
+HEADER = ["Reading", "Room", "Side", "Component", "Substrate", "Condition",
+          "Color", "PbC (mg/cm2)", "Result", "Date"]
+_ROOMS = ["Kitchen", "Bath", "Living", "Bedroom 1", "Bedroom 2", "Hall", "Porch"]
+_COMPONENTS = ["Wall", "Door", "Door Jamb", "Window Sill", "Baseboard", "Ceiling", "Radiator"]
+_SUBSTRATES = ["Drywall", "Wood", "Metal", "Plaster", "Concrete"]
+
+
+# --------------------------------------------------------------------------- #
+# Synthetic sources
+# --------------------------------------------------------------------------- #
+def synthetic_rows(rows: int, rng: random.Random) -> Iterator[List]:
+    """A title row, a blank row, the header, then `rows` readings."""
+    yield ["XRF Lead Paint Inspection", "", "", "", "", "", "", "", "", ""]
+    yield []
+    yield HEADER
+    for i in range(1, rows + 1):
+        pbc = round(rng.random() * 2.5, 2)
+        yield [i, rng.choice(_ROOMS), rng.choice("ABCD"), rng.choice(_COMPONENTS),
+               rng.choice(_SUBSTRATES), rng.choice(["Intact", "Fair", "Poor"]),
+               rng.choice(["White", "Beige", "Blue"]), pbc,
+               "Positive" if pbc >= 1.0 else "Negative", "3/14/2024"]
+
+
+def write_csv(path: Path, rows: int, rng: random.Random) -> None:
+    import csv
+    with path.open("w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(synthetic_rows(rows, rng))
+
+
+def _col_letter(n: int) -> str:
+    s = ""
+    while n > 0:
+        n, r = divmod(n - 1, 26)
+        s = chr(65 + r) + s
+    return s
+
+
+def write_xlsx(path: Path, rows: int, rng: random.Random) -> None:
+    """Minimal one-sheet workbook with inline strings (Excel opens it as-is)."""
+    ns = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    rel_ns = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    pkg_ns = "http://schemas.openxmlformats.org/package/2006/relationships"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '</Types>'))
+        zf.writestr("_rels/.rels", (
+            f'<?xml version="1.0" encoding="UTF-8"?><Relationships xmlns="{pkg_ns}">'
+            f'<Relationship Id="rId1" Type="{rel_ns}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'))
+        zf.writestr("xl/workbook.xml", (
+            f'<?xml version="1.0" encoding="UTF-8"?><workbook {ns} xmlns:r="{rel_ns}">'
+            '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>'))
+        zf.writestr("xl/_rels/workbook.xml.rels", (
+            f'<?xml version="1.0" encoding="UTF-8"?><Relationships xmlns="{pkg_ns}">'
+            f'<Relationship Id="rId1" Type="{rel_ns}/worksheet" Target="worksheets/sheet1.xml"/>'
+            '</Relationships>'))
+        with zf.open("xl/worksheets/sheet1.xml", "w") as f:
+            f.write(f'<?xml version="1.0" encoding="UTF-8"?><worksheet {ns}><sheetData>'.encode())
+            for r, row in enumerate(synthetic_rows(rows, rng), start=1):
+                cells = []
+                for c, v in enumerate(row, start=1):
+                    ref = f"{_col_letter(c)}{r}"
+                    if isinstance(v, (int, float)):
+                        cells.append(f'<c r="{ref}"><v>{v}</v></c>')
+                    elif v != "":
+                        cells.append(f'<c r="{ref}" t="inlineStr"><is><t>{escape(v)}</t></is></c>')
+                f.write(f'<row r="{r}">{"".join(cells)}</row>'.encode())
+            f.write(b"</sheetData></worksheet>")
+
+
+def generate(folder: Path, files: int, sizes: Sequence[int], formats: Sequence[str],
+             seed: int = 1) -> List[str]:
+    """Write `files` sources cycling through sizes x formats; returns their unit codes."""
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    writers = {"csv": write_csv, "xlsx": write_xlsx}
+    units = []
+    for i in range(files):
+        prop = str(9000 + i // 26)
+        unit = f"{i % 26 + 1}{chr(65 + i % 4)}"
+        rows = sizes[i % len(sizes)]
+        fmt = formats[(i // len(sizes)) % len(formats)]
+        writers[fmt](folder / f"{prop}-{unit}-XRF.{fmt}", rows, rng)
+        units.append(unit)
+    return units
+
+
+# --------------------------------------------------------------------------- #
+# Measurement
+# --------------------------------------------------------------------------- #
+class _TimedGateway:
+    """Wraps a gateway, timing each downloaded and uploaded file."""
+    def __init__(self, gateway):
+        self.gateway = gateway
+        self.download_s: List[float] = []
+        self.upload_s: List[float] = []
+
+    def __getattr__(self, name):
+        return getattr(self.gateway, name)
+
+    def download_sources(self, rel_url, dest, sources=None):
+        from py_files.utils import DownloadFailed
+
+        t0 = time.perf_counter()
+        for path in self.gateway.download_sources(rel_url, dest, sources):
+            if isinstance(path, DownloadFailed):
+                yield path
+                continue
+            self.download_s.append(time.perf_counter() - t0)
+            yield path
+            t0 = time.perf_counter()
+
+    def upload_pdf(self, pdf_path):
+        t0 = time.perf_counter()
+        self.gateway.upload_pdf(pdf_path)
+        self.upload_s.append(time.perf_counter() - t0)
+
+
+class _TimedPool:
+    """Wraps a ConverterPool, keeping the worker-side time of each conversion."""
+    def __init__(self, pool):
+        self.pool = pool
+        self.convert_s: List[float] = []
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+    def poll(self, timeout=None):
+        results = self.pool.poll(timeout=timeout)
+        self.convert_s.extend(r.seconds for r in results if r.pdf and r.seconds is not None)
+        return results
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+    return {"p50": pick(0.50), "p95": pick(0.95), "max": ordered[-1]}
+
+
+def peak_memory_mb() -> Dict[str, Optional[float]]:
+    """Peak RSS of this process and of the largest reaped worker."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import win32api
+            import win32process
+            info = win32process.GetProcessMemoryInfo(win32api.GetCurrentProcess())
+            return {"parent": info["PeakWorkingSetSize"] / 1048576, "worker": None}
+        except Exception:
+            return {"parent": None, "worker": None}
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    div = 1048576 if sys.platform == "darwin" else 1024
+    return {
+        "parent": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / div,
+        "worker": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / div,
+    }
+
+
+def run(files: int, sizes: Sequence[int], formats: Sequence[str], backend: str,
+        workers: int, work: Path) -> dict:
+    """Generate sources under `work` (the current directory) and convert them."""
+    units = generate(work / "src" / "BENCH", files, sizes, formats)
+    # Unit codes are validated against the checklist; register the synthetic ones
+    with open("XRF_checklist.csv", "w", encoding="utf-8") as f:
+        f.write("Property,Unit,Complete\n")
+        f.writelines(f"9000,{u},\n" for u in sorted(set(units)))
+
+    import main
+    from py_files.mock_sharepoint_gateway import MockSharePointGateway
+    from py_files.worker_pool import ConverterPool
+
+    gateway = _TimedGateway(MockSharePointGateway(
+        {"local_root": str(work / "src"), "local_output": str(work / "out")}
+    ))
+    rel = str(work / "src" / "BENCH")
+    with tempfile.TemporaryDirectory(prefix="lp_bench_") as staging, \
+            ConverterPool(Path(staging), workers=workers, backend=backend, isolate=True) as pool:
+        pool = _TimedPool(pool)
+        start = time.perf_counter()
+        stats = main.convert_folder(rel, gateway, {}, pool, cfg={})
+        elapsed = time.perf_counter() - start
+    done = stats.converted + stats.skipped + stats.failed
+    return {
+        "files": files,
+        "converted": stats.converted,
+        "failed": stats.failed,
+        "seconds": elapsed,
+        "files_per_sec": done / elapsed if elapsed else 0.0,
+        "latency_s": {
+            "download": percentiles(gateway.download_s),
+            "convert": percentiles(pool.convert_s),
+            "upload": percentiles(gateway.upload_s),
+        },
+        "peak_mb": peak_memory_mb(),
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions of `result` against `baseline` beyond `tolerance`."""
+    problems = []
+    floor = baseline["files_per_sec"] * (1 - tolerance)
+    if result["files_per_sec"] < floor:
+        problems.append(f"throughput {result['files_per_sec']:.2f} files/s "
+                        f"< {floor:.2f} (baseline {baseline['files_per_sec']:.2f})")
+    for proc in ("parent", "worker"):
+        now, before = result["peak_mb"].get(proc), baseline["peak_mb"].get(proc)
+        if now and before and now > before * (1 + tolerance):
+            problems.append(f"peak {proc} memory {now:.0f} MB > {before * (1 + tolerance):.0f} MB "
+                            f"(baseline {before:.0f} MB)")
+    return problems
+
+
+def _report(scenario: str, result: dict) -> None:
+    print(f"Scenario {scenario}")
+    print(f"  {result['converted']}/{result['files']} converted, {result['failed']} failed "
+          f"in {result['seconds']:.2f}s = {result['files_per_sec']:.2f} files/s")
+    for stage, pct in result["latency_s"].items():
+        if pct:
+            print(f"  {stage:<9} p50 {pct['p50'] * 1000:8.1f} ms  p95 {pct['p95'] * 1000:8.1f} ms  "
+                  f"max {pct['max'] * 1000:8.1f} ms")
+    mem = result["peak_mb"]
+    fmt = lambda v: f"{v:.0f} MB" if v is not None else "n/a"
+    print(f"  peak memory: parent {fmt(mem['parent'])}, worker {fmt(mem['worker'])}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark conversion throughput")
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--rows", default="50,500,5000", help="Comma-separated row counts")
+    parser.add_argument("--formats", default="csv,xlsx", help="Comma-separated: csv, xlsx")
+    parser.add_argument("--backend", default="fake", help="fake, python or excel")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store this run as the baseline for its scenario")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    sizes = [int(r) for r in args.rows.split(",")]
+    formats = [f.strip().lower() for f in args.formats.split(",")]
+    scenario = f"{args.backend}/{args.workers}w/{args.files}x{args.rows}/{'+'.join(formats)}"
+    baseline_path = args.baseline.resolve()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="lp_bench_") as tmp:
+        # Checklist, database and logs all resolve relative to the cwd
+        os.chdir(tmp)
+        try:
+            result = run(args.files, sizes, formats, args.backend, args.workers, Path(tmp))
+        finally:
+            os.chdir(cwd)
+    _report(scenario, result)
+
+    stored = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    if args.save_baseline:
+        stored[scenario] = result
+        baseline_path.write_text(json.dumps(stored, indent=2))
+        print(f"Baseline saved to {baseline_path}")
+        return 0
+    if scenario not in stored:
+        print(f"No baseline for this scenario in {baseline_path} (use --save-baseline)")
+        return 0
+    problems = compare(result, stored[scenario], args.tolerance)
+    for p in problems:
+        print(f"  REGRESSION: {p}")
+    if not problems:
+        print(f"  within {args.tolerance:.0%} of baseline")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+# change_tracker.py
+"""
+Persisted change tokens for "what's new" runs.
+
+    tracker = ChangeTracker()
+    changes = tracker.poll(gateway)     # {folder: [SourceInfo]} or None
+    ... convert ...
+    tracker.commit()
+
+poll() asks the gateway for sources added or modified since the saved
+token. The new token is only written by commit(), which main() calls
+once every change was converted and uploaded, so a run that dies or
+fails on some sources is shown the same changes again. Tokens are
+kept per gateway type, so mock and SharePoint runs do not clobber each other.
+"""
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from py_files.config import CHANGE_TOKENS
+from py_files.utils import SourceInfo
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeTracker:
+    """
+    :param path: JSON file mapping gateway type -> change token.
+    """
+    def __init__(self, path: Path = CHANGE_TOKENS):
+        self.path = path
+        self._tokens: Dict[str, str] = {}
+        self._scope: Optional[str] = None
+        self._pending: Optional[str] = None
+        try:
+            self._tokens = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable change tokens %s: %s", path, e)
+
+    def poll(self, gateway) -> Optional[Dict[str, List[SourceInfo]]]:
+        """
+        Changed sources by folder since the last commit(), or None when
+        there is no usable token and every folder must be listed.
+        """
+        self._scope = type(gateway).__name__
+        changes, self._pending = gateway.list_changes(self._tokens.get(self._scope))
+        return changes
+
+    def commit(self) -> None:
+        """Save the token from the last poll(); call once its changes are handled."""
+        if self._pending is None:
+            return
+        self._tokens[self._scope] = self._pending
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._tokens), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._pending = None
@@ -1,23 +1,264 @@
 # checklist.py
+"""
+Completion checklist keyed by "Property_Unit".
+
+State lives in an indexed SQLite database (WAL mode) so each completion is
+committed the moment it happens; a crash mid-run loses nothing. The CSV
+(XRF_checklist.csv) is kept as the human-editable import/export format:
+it replaces the stored checklist whenever it changed since the database
+last saw it (units deleted from the CSV are dropped), and is rewritten by
+save_checklist().
+"""
 import csv
+import sqlite3
+import threading
+import time
 from pathlib import Path
 import logging
-from typing import Dict
+from typing import Dict, Iterable, Optional, Set, Tuple
 
-from py_files.config import CHECKLIST_CSV
+from py_files.config import CHECKLIST_CSV, CHECKLIST_DB
 
+_TRUTHY = ("x", "yes", "true", "1", "✓")
 
-def load_checklist() -> Dict[str, bool]:
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checklist (
+    property TEXT NOT NULL,
+    unit     TEXT NOT NULL,
+    complete INTEGER NOT NULL DEFAULT 0,
+    updated  REAL NOT NULL,
+    PRIMARY KEY (property, unit)
+);
+CREATE INDEX IF NOT EXISTS checklist_unit ON checklist (unit);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _split_key(key: str) -> Tuple[str, str]:
+    if "_" in key:
+        prop, unit = key.split("_", 1)
+        return prop, unit
+    return key, ""
+
+
+class ChecklistStore:
     """
-    Load the checklist into a mapping keyed by "Property_Unit" with completion booleans.
+    SQLite-backed checklist. Safe to share between threads.
+
+    :param path: Database file; created with the schema if missing.
+    """
+    def __init__(self, path: Path = CHECKLIST_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------ #
+    # Reads
+    # ------------------------------------------------------------------ #
+    def load(self) -> Dict[str, bool]:
+        with self._lock:
+            rows = self._conn.execute("SELECT property, unit, complete FROM checklist").fetchall()
+        return {f"{p}_{u}": bool(c) for p, u, c in rows}
+
+    def is_complete(self, prop: str, unit: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT complete FROM checklist WHERE property = ? AND unit = ?", (prop, unit)
+            ).fetchone()
+        return bool(row and row[0])
+
+    def units_for_property(self, prop: str) -> Dict[str, bool]:
+        """Unit -> complete for one property (uses the primary-key index)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT unit, complete FROM checklist WHERE property = ?", (prop,)
+            ).fetchall()
+        return {u: bool(c) for u, c in rows}
+
+    def properties_for_unit(self, unit: str) -> Dict[str, bool]:
+        """Property -> complete for one unit code (uses checklist_unit)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT property, complete FROM checklist WHERE unit = ?", (unit,)
+            ).fetchall()
+        return {p: bool(c) for p, c in rows}
+
+    def unit_codes(self) -> Set[str]:
+        """Every distinct unit code in the checklist (uses checklist_unit)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT unit FROM checklist WHERE unit != ''"
+            ).fetchall()
+        return {u for (u,) in rows}
+
+    # ------------------------------------------------------------------ #
+    # Writes
+    # ------------------------------------------------------------------ #
+    def upsert(self, key: str, complete: bool = True) -> None:
+        """Record one unit's state; committed immediately."""
+        self.upsert_many([(key, complete)])
+
+    def upsert_many(self, items: Iterable[Tuple[str, bool]], replace: bool = False) -> None:
+        """
+        Record many units' states in one transaction.
+
+        :param replace: Delete every other unit in the same transaction, so
+                        the table holds exactly `items`.
+        """
+        now = time.time()
+        rows = [(*_split_key(k), int(bool(v)), now) for k, v in items]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if replace:
+                    self._conn.execute("DELETE FROM checklist")
+                self._conn.executemany(
+                    "INSERT INTO checklist (property, unit, complete, updated) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (property, unit) DO UPDATE SET "
+                    "complete = excluded.complete, updated = excluded.updated",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM checklist WHERE property = ? AND unit = ?", _split_key(key)
+            )
+
+    # ------------------------------------------------------------------ #
+    # CSV compatibility
+    # ------------------------------------------------------------------ #
+    def _get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+    def sync_from_csv(self, path: Path = CHECKLIST_CSV) -> bool:
+        """Import `path` if it changed since it was last imported or exported."""
+        if not path.exists():
+            return False
+        stamp = str(path.stat().st_mtime_ns)
+        if self._get_meta("csv_mtime") == stamp:
+            return False
+        self.import_csv(path, replace=True)
+        self._set_meta("csv_mtime", stamp)
+        return True
+
+    def import_csv(self, path: Path, replace: bool = False) -> int:
+        """
+        Upsert every row of a Property,Unit,Complete or legacy Folder,Complete CSV.
+
+        :param replace: Also drop units the CSV no longer lists. Ignored when
+                        no rows could be read, so an unreadable file never
+                        empties the store.
+        """
+        state = read_checklist_csv(path)
+        if replace and not state:
+            logging.warning(f"No checklist rows read from {path}; keeping the stored checklist")
+            return 0
+        self.upsert_many(state.items(), replace=replace)
+        return len(state)
+
+    def export_csv(self, path: Path) -> None:
+        write_checklist_csv(self.load(), path)
+        if path == CHECKLIST_CSV:
+            self._set_meta("csv_mtime", str(path.stat().st_mtime_ns))
+
+
+class ChecklistMap(dict):
+    """
+    The Dict[str, bool] returned by load_checklist(). Every mutating dict
+    method writes through to the store at once, so callers that update
+    done_map as each PDF completes get per-file persistence for free.
+    """
+    def __init__(self, store: ChecklistStore, state: Dict[str, bool]):
+        super().__init__(state)
+        self.store = store
+
+    def __setitem__(self, key: str, value: bool) -> None:
+        if key not in self or self[key] != value:
+            self.store.upsert(key, value)
+        super().__setitem__(key, value)
+
+    def update(self, *args, **kwargs) -> None:
+        items = dict(*args, **kwargs)
+        self.store.upsert_many(items.items())
+        super().update(items)
+
+    def __delitem__(self, key: str) -> None:
+        self.store.delete(key)
+        super().__delitem__(key)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def setdefault(self, key: str, default: bool = False) -> bool:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key: str, *default):
+        if key not in self:
+            return super().pop(key, *default)
+        value = self[key]
+        del self[key]
+        return value
+
+    def popitem(self) -> Tuple[str, bool]:
+        key, value = super().popitem()
+        self.store.delete(key)
+        return key, value
+
+    def clear(self) -> None:
+        self.store.upsert_many((key, False) for key in self)
+        super().clear()
+
+
+_store: Optional[ChecklistStore] = None
+
+
+def get_store() -> ChecklistStore:
+    """Process-wide store, opened on first use."""
+    global _store
+    if _store is None:
+        _store = ChecklistStore(CHECKLIST_DB)
+    return _store
+
+
+def read_checklist_csv(path: Path) -> Dict[str, bool]:
+    """
+    Parse a checklist CSV into a mapping keyed by "Property_Unit".
     Supports both new (Property,Unit,Complete) CSV format and legacy (Folder,Complete) where
     we derive Property and Unit from the PDF filenames in each folder.
     """
     state: Dict[str, bool] = {}
     try:
-        if not CHECKLIST_CSV.exists():
+        if not path.exists():
             return state
-        with CHECKLIST_CSV.open(newline="", encoding="utf-8") as f:
+        with path.open(newline="", encoding="utf-8") as f:
             reader = csv.DictReader(f)
             headers = reader.fieldnames or []
             if set(["Property","Unit","Complete"]).issubset(headers):
@@ -27,7 +268,7 @@ def load_checklist() -> Dict[str, bool]:
                     unit = row.get("Unit", "").strip()
                     complete = row.get("Complete", "").strip().lower()
                     key = f"{prop}_{unit}"
-                    state[key] = complete in ("x","yes","true","1","✓")
+                    state[key] = complete in _TRUTHY
             elif set(["Folder","Complete"]).issubset(headers):
                 # Legacy format: derive from PDF filenames within folder
                 for row in reader:
@@ -43,7 +284,7 @@ def load_checklist() -> Dict[str, bool]:
                         if len(parts) >= 2:
                             prop, unit = parts[0], parts[1]
                             key = f"{prop}_{unit}"
-                            state[key] = complete in ("x","yes","true","1","✓")
+                            state[key] = complete in _TRUTHY
             else:
                 logging.warning("Checklist CSV has unexpected headers, ignoring file")
     except Exception as e:
@@ -51,20 +292,43 @@ def load_checklist() -> Dict[str, bool]:
     return state
 
 
+def write_checklist_csv(state: Dict[str, bool], path: Path) -> None:
+    """Write Property,Unit,Complete rows, sorted by key."""
+    with path.open("w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["Property","Unit","Complete"])
+        writer.writeheader()
+        for key, done in sorted(state.items()):
+            prop, unit = _split_key(key)
+            writer.writerow({"Property": prop, "Unit": unit, "Complete": "X" if done else ""})
+
+
+def load_checklist() -> Dict[str, bool]:
+    """
+    Load the checklist into a mapping keyed by "Property_Unit" with completion booleans.
+    XRF_checklist.csv is imported first if it was edited since the last sync
+    (new or legacy format). Assignments to the returned mapping are saved
+    immediately.
+    """
+    store = get_store()
+    try:
+        store.sync_from_csv(CHECKLIST_CSV)
+    except Exception as e:
+        logging.warning(f"Error importing checklist CSV: {e}")
+    return ChecklistMap(store, store.load())
+
+
 def save_checklist(state: Dict[str, bool], path: Path = None) -> None:
     """
     Save the checklist as CSV with columns Property,Unit,Complete.
 
     :param state: Mapping of "Property_Unit" keys to completion status.
-    :param path: Optional Path to save the CSV; if None, use CHECKLIST_CSV.
+    :param path: Optional Path to save the CSV; if None, use CHECKLIST_CSV
+                 (after storing `state` in the database).
     """
-    out_path = path or CHECKLIST_CSV
-    with out_path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["Property","Unit","Complete"])
-        writer.writeheader()
-        for key, done in sorted(state.items()):
-            if "_" in key:
-                prop, unit = key.split("_", 1)
-            else:
-                prop, unit = key, ""
-            writer.writerow({"Property": prop, "Unit": unit, "Complete": "X" if done else ""})
\ No newline at end of file
+    if path is None:
+        store = get_store()
+        if not isinstance(state, ChecklistMap):
+            store.upsert_many(state.items())
+        store.export_csv(CHECKLIST_CSV)
+        return
+    write_checklist_csv(state, path)
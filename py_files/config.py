@@ -1,3 +1,4 @@
+from functools import lru_cache
 from pathlib import Path
 import csv
 import sys
@@ -24,6 +25,15 @@ else:
 # --------------------------------------------------------------------------- #
 LOG_PATH      = Path("excel_converter.log")
 CHECKLIST_CSV = Path("XRF_checklist.csv")
+CHECKLIST_DB  = Path("XRF_checklist.db")
+SCAN_INDEX    = Path("scan_index.json")
+QUARANTINE_PATH = Path("quarantine.json")
+REJECTED_PATH = Path("rejected.json")
+RUN_JOURNAL   = Path("run_journal.jsonl")
+COST_MODEL    = Path("cost_model.json")
+AUTH_RECORD   = Path("auth_record.json")
+CHANGE_TOKENS = Path("change_tokens.json")
+UPLOAD_MANIFEST = Path("upload_manifest.json")
 
 PUBLIC_GRAPH_CLIENT_ID = "04f0c124-f2bc-4f7a-ac24-a29dd5d43626"
 
@@ -36,10 +46,26 @@ STRIPE_RGB        = (242, 242, 242)
 
 
 # --------------------------------------------------------------------------- #
-# Helper: read valid unit codes once at import time
+# Valid unit codes: read from the checklist on first use, then cached
 # --------------------------------------------------------------------------- #
-def _load_valid_units() -> set[str]:
-    units: set[str] = set()
+@lru_cache(maxsize=None)
+def valid_unit_codes() -> frozenset:
+    """
+    Upper-cased unit codes of the checklist database, or of the Unit column
+    of CHECKLIST_CSV while the database is empty or unreadable. Loaded
+    lazily so importing this module (and starting the exe) never has to
+    open the checklist.
+    """
+    # checklist imports this module, so it can only be imported here
+    from py_files.checklist import get_store
+
+    try:
+        units = {u.upper() for u in get_store().unit_codes()}
+        if units:
+            return frozenset(units)
+    except Exception:
+        pass
+    units = set()
     try:
         if CHECKLIST_CSV.exists():
             with CHECKLIST_CSV.open(newline="", encoding="utf-8") as f:
@@ -51,6 +77,11 @@ def _load_valid_units() -> set[str]:
                             units.add(unit.upper())
     except Exception:
         pass
-    return units
+    return frozenset(units)
+
 
-VALID_UNIT_CODES: set[str] = _load_valid_units()
+def __getattr__(name: str):
+    # Keeps `from py_files.config import VALID_UNIT_CODES` working
+    if name == "VALID_UNIT_CODES":
+        return valid_unit_codes()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,153 @@
+# conversion_cache.py
+"""
+Persistent cache of converted PDFs keyed by source content.
+
+The key is a SHA-256 over the source bytes plus the page-layout settings
+from config.py, the converter backend and whether that backend sends
+CSVs to the streaming renderer, so an edited source or a
+formatting change is a miss while a checklist reset or a re-run is a hit.
+Entries are plain files whose mtime doubles as the LRU clock; the least
+recently used ones are evicted once the cache exceeds its size limit.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Optional
+
+from py_files import config
+
+logger = logging.getLogger(__name__)
+
+# Bump when a converter change alters output for identical inputs.
+CACHE_VERSION = 1
+
+_CHUNK = 1024 * 1024
+
+
+def format_fingerprint(backend: str, csv_fast_path: bool = True) -> str:
+    """Stable string of everything besides the source that shapes the PDF."""
+    settings = (
+        CACHE_VERSION,
+        backend,
+        # Only the excel backend has a second renderer for CSVs
+        backend == "excel" and bool(csv_fast_path),
+        config.MARGIN_LEFT_RIGHT,
+        config.MARGIN_TOP,
+        config.MARGIN_BOTTOM,
+        config.HEADER_MARGIN,
+        config.FOOTER_MARGIN,
+        tuple(config.STRIPE_RGB),
+    )
+    return repr(settings)
+
+
+def file_digest(path: Path) -> str:
+    """SHA-256 of a file, read in chunks."""
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ConversionCache:
+    """
+    Size-bounded, least-recently-used store of PDFs on disk.
+
+    :param cache_dir: Directory holding cached PDFs (created if missing).
+    :param max_bytes: Evict LRU entries once the total exceeds this.
+    :param backend: Converter backend name, part of every key.
+    :param csv_fast_path: The converter's csv_fast_path switch, also part of every key.
+    """
+    def __init__(self, cache_dir: Path, max_bytes: int, backend: str = "excel",
+                 csv_fast_path: bool = True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.fingerprint = format_fingerprint(backend, csv_fast_path)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._total = sum(p.stat().st_size for p in self._entries())
+
+    @classmethod
+    def from_cfg(cls, cfg: dict, backend: str) -> Optional["ConversionCache"]:
+        """
+        Build from config.yaml ('cache_dir', 'cache_max_mb', 'csv_fast_path');
+        None if disabled.
+        """
+        cache_dir = cfg.get("cache_dir")
+        if not cache_dir:
+            return None
+        max_mb = float(cfg.get("cache_max_mb", 1024))
+        return cls(Path(cache_dir), int(max_mb * 1024 * 1024), backend,
+                   csv_fast_path=cfg.get("csv_fast_path", True))
+
+    def _entries(self):
+        return self.cache_dir.glob("*/*.pdf")
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.pdf"
+
+    def key_for(self, src: Path) -> str:
+        h = hashlib.sha256(self.fingerprint.encode())
+        h.update(file_digest(src).encode())
+        return h.hexdigest()
+
+    def get(self, key: str, dest: Path) -> Optional[Path]:
+        """Copy the cached PDF for `key` to `dest`; None on a miss."""
+        entry = self._path(key)
+        # A fresh file swapped in: dest may be hardlinked to an uploaded copy
+        tmp = dest.with_name(f".{dest.name}.part")
+        try:
+            shutil.copyfile(entry, tmp)
+            os.replace(tmp, dest)
+        except FileNotFoundError:
+            tmp.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+        now = time.time()
+        os.utime(entry, (now, now))
+        self.hits += 1
+        return dest
+
+    def put(self, key: str, pdf: Path) -> None:
+        """Store a freshly converted PDF, then evict down to max_bytes."""
+        entry = self._path(key)
+        entry.parent.mkdir(exist_ok=True)
+        tmp = entry.with_suffix(".part")
+        try:
+            shutil.copyfile(pdf, tmp)
+            old = entry.stat().st_size if entry.exists() else 0
+            os.replace(tmp, entry)
+        except OSError as e:
+            logger.warning("Could not cache %s: %s", pdf.name, e)
+            tmp.unlink(missing_ok=True)
+            return
+        self._total += entry.stat().st_size - old
+        if self._total > self.max_bytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for p in self._entries():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+        self._total = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if self._total <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            self._total -= size
+            self.evictions += 1
+
+    def summary(self) -> str:
+        return (f"cache: {self.hits} hit(s), {self.misses} miss(es), "
+                f"{self.evictions} eviction(s), {self._total / 1048576:.1f} MB used")
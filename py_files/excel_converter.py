@@ -4,19 +4,19 @@ excel_converter.py
 
 Context-managed COM Excel converter that formats spreadsheets
 and exports them as one-page-wide landscape PDFs, using DispatchEx
-for unique Excel instances per process.
+for unique Excel instances per process. The instance is kept warm in an
+ExcelPool and recycled after a number of workbooks or a memory threshold.
 
 Optimized: disables UI, events, and switches to manual calculation to speed up.
 Handles export errors gracefully to avoid crashing the worker pool.
+CSV sources skip Excel entirely and are streamed through the pure-Python
+renderer in pdf_converter.py.
 """
+import importlib
 import logging
-import re
 import shutil
 from pathlib import Path
-from typing import Optional, Tuple
-import pythoncom
-import win32com.client as win32
-from win32com.client import constants as xl
+from typing import Callable, List, Optional, Tuple, Union
 
 from py_files.config import (
     MARGIN_LEFT_RIGHT,
@@ -25,11 +25,21 @@ from py_files.config import (
     HEADER_MARGIN,
     FOOTER_MARGIN,
     STRIPE_RGB,
-    VALID_UNIT_CODES,
 )
+from py_files.excel_pool import ExcelPool
+from py_files.metrics import metrics
+from py_files.pdf_converter import PdfConverter
+from py_files.utils import extract_ids, find_header_row, pdf_name
 
 logger = logging.getLogger(__name__)
 
+# Excel enum values, spelled out so formatting works with late-bound
+# DispatchEx objects (win32com.client.constants is only filled by makepy).
+XL_CALCULATION_MANUAL = -4135
+XL_LANDSCAPE = 2
+XL_EXPRESSION = 2
+XL_LIST_SEPARATOR = 5  # Application.International index
+
 class ExcelConverter:
     """
     Context manager to convert Excel/CSV files to formatted PDFs.
@@ -39,76 +49,137 @@ class ExcelConverter:
     """
     SUPPORTED_EXTENSIONS = (".xlsx", ".xls", ".csv")
 
-    def __init__(self, output_dir: Path):
+    def __init__(self, output_dir: Path, csv_fast_path: bool = True,
+                 max_workbooks: int = 200, max_memory_mb: float = 0,
+                 app_factory: Union[Callable, str, None] = None):
+        """
+        :param max_workbooks: Recycle the Excel instance after this many workbooks.
+        :param max_memory_mb: Recycle it once its working set exceeds this (0 = off).
+        :param app_factory: Callable or "module:callable" returning an
+                            Application; defaults to a DispatchEx instance.
+                            Pass "py_files.fake_com:FakeApplication" to run
+                            without Excel.
+        """
         self.output_dir = output_dir
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        self._excel = None
+        self.max_workbooks = max_workbooks
+        self.max_memory_mb = max_memory_mb
+        if isinstance(app_factory, str):
+            module, attr = app_factory.split(":", 1)
+            app_factory = getattr(importlib.import_module(module), attr)
+        self._factory = app_factory
+        self._com = False
+        self._pool: Optional[ExcelPool] = None
+        # Set by the worker pool; told which stage a conversion is in so a
+        # hung Open/Export can be timed out and killed
+        self.on_stage: Optional[Callable[[str], None]] = None
+        # CSVs have no formatting for Excel to preserve, so render them in
+        # bounded memory without Workbooks.Open or any COM round trips
+        self._csv = PdfConverter(output_dir) if csv_fast_path else None
+        # Formula argument separator of Excel's locale, read once
+        self._list_sep: Optional[str] = None
 
-    def __enter__(self):
-        pythoncom.CoInitialize()
-        self._excel = win32.DispatchEx("Excel.Application")
+    @staticmethod
+    def _dispatch_excel():
+        import win32com.client as win32
+        excel = win32.DispatchEx("Excel.Application")
         for attr in ("Visible", "ScreenUpdating", "DisplayAlerts", "EnableEvents", "AskToUpdateLinks"):  
             try:
-                setattr(self._excel, attr, False)
+                setattr(excel, attr, False)
             except Exception:
                 pass
         try:
-            self._excel.Calculation = xl.xlCalculationManual
+            excel.Calculation = XL_CALCULATION_MANUAL
         except Exception:
             pass
+        return excel
+
+    def __enter__(self):
+        factory = self._factory
+        if factory is None:
+            import pythoncom
+            pythoncom.CoInitialize()
+            self._com = True
+            factory = self._dispatch_excel
+        self._pool = ExcelPool(factory, size=1, max_workbooks=self.max_workbooks,
+                               max_memory_mb=self.max_memory_mb)
+        # Start Excel now so the worker only reports ready once it is warm
+        self._pool.warm()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if self._excel:
-            try:
-                self._excel.Calculation = xl.xlCalculationAutomatic
-            except Exception:
-                pass
-            try:
-                self._excel.Quit()
-            except Exception:
-                pass
-        pythoncom.CoUninitialize()
-        self._excel = None
+        if self._pool:
+            logger.info(self._pool.summary())
+            self._pool.close()
+            self._pool = None
+        if self._com:
+            import pythoncom
+            pythoncom.CoUninitialize()
+            self._com = False
+
+    def _stage(self, name: str) -> None:
+        if self.on_stage:
+            self.on_stage(name)
+
+    def helper_pids(self) -> List[int]:
+        """EXCEL.EXE processes to kill if this converter hangs."""
+        return self._pool.pids() if self._pool else []
 
     def convert(self, src: Path) -> Optional[Path]:
         """Convert a single spreadsheet to PDF."""
-        try:
-            wb = self._excel.Workbooks.Open(str(src))
-        except Exception as e:
-            logger.error("Failed to open %s: %s", src.name, e)
-            return None
-        try:
-            ws = wb.Worksheets(1)
-            if self._is_empty(ws):
-                logger.info("Skipping empty workbook %s", src.name)
+        if self._csv and src.suffix.lower() == ".csv":
+            return self._csv.convert(src)
+        # lease() may recycle or restart Excel; that falls under the start limit
+        self._stage("start")
+        with self._pool.lease() as excel:
+            self._stage("open")
+            try:
+                with metrics.span("excel.open", file=src.name, bytes=src.stat().st_size):
+                    wb = excel.Workbooks.Open(str(src))
+            except Exception as e:
+                logger.error("Failed to open %s: %s", src.name, e)
                 return None
+            try:
+                ws = wb.Worksheets(1)
+                if self._is_empty(ws):
+                    logger.info("Skipping empty workbook %s", src.name)
+                    return None
 
-            prop, unit = self._extract_ids(src.stem)
-            if not prop or not unit:
-                logger.warning("Pattern not recognised for %s, skipping", src.name)
-                return None
+                prop, unit = self._extract_ids(src.stem)
+                if not prop or not unit:
+                    logger.warning("Pattern not recognised for %s, skipping", src.name)
+                    return None
 
-            self._format_sheet(ws)
-            temp_pdf = src.with_suffix(".pdf")
-            try:
-                wb.ExportAsFixedFormat(0, str(temp_pdf))
-            except Exception as ee:
-                logger.error("Error exporting %s: %s", src.name, ee)
-                return None
-        finally:
-            wb.Close(False)
+                self._stage("format")
+                with metrics.span("excel.format", file=src.name) as sp:
+                    sp["rows"], sp["cols"] = self._format_sheet(ws)
+                # Exported into the run's output directory, never beside the
+                # source, which may be the user's own folder (read in place)
+                temp_pdf = self.output_dir / f"{src.stem}.export.pdf"
+                self._stage("export")
+                try:
+                    with metrics.span("excel.export", file=src.name):
+                        wb.ExportAsFixedFormat(0, str(temp_pdf))
+                except Exception as ee:
+                    logger.error("Error exporting %s: %s", src.name, ee)
+                    temp_pdf.unlink(missing_ok=True)
+                    return None
+            finally:
+                wb.Close(False)
 
-        final_name = f"{prop}_{unit}_lease_leadpaint_xrf.pdf"
+        final_name = pdf_name(prop, unit)
         final_path = self.output_dir / final_name
-        try:
-            temp_pdf.replace(final_path)
-        except Exception:
+        with metrics.span("excel.move", file=src.name) as sp:
             try:
-                shutil.move(str(temp_pdf), str(final_path))
-            except Exception as mv:
-                logger.error("Failed to move PDF for %s: %s", src.name, mv)
-                return None
+                temp_pdf.replace(final_path)
+            except Exception:
+                try:
+                    shutil.move(str(temp_pdf), str(final_path))
+                except Exception as mv:
+                    logger.error("Failed to move PDF for %s: %s", src.name, mv)
+                    sp["outcome"] = "failed"
+                    temp_pdf.unlink(missing_ok=True)
+                    return None
         logger.info("Created %s", final_name)
         return final_path
 
@@ -120,26 +191,44 @@ class ExcelConverter:
             return val is None or str(val).strip() == ""
         return False
 
-    @staticmethod
-    def _extract_ids(stem: str) -> Tuple[Optional[str], Optional[str]]:
-        m = re.match(r'^([^-]+)', stem)
-        prop = m.group(1) if m else None
-        m2 = re.search(r'-([^-]+)-XRF', stem)
-        unit = m2.group(1) if m2 else None
-        if unit and unit.upper() not in VALID_UNIT_CODES:
-            unit = None
-        return prop, unit
-
-    def _format_sheet(self, ws):
+    _extract_ids = staticmethod(extract_ids)
+
+    def _list_separator(self, app) -> str:
+        """
+        The list separator Excel expects in formulas given to
+        FormatConditions.Add, which are read in the user's locale (";" in
+        much of Europe). Falls back to ",".
+        """
+        if self._list_sep is None:
+            try:
+                self._list_sep = str(app.International(XL_LIST_SEPARATOR)) or ","
+            except Exception:
+                self._list_sep = ","
+        return self._list_sep
+
+    def _format_sheet(self, ws) -> Tuple[int, int]:
+        """
+        Apply page layout, header row and striping to `ws`; returns its
+        used (rows, cols).
+        Every COM property access is a cross-process round trip, so cell
+        values are read in one UsedRange.Value call and the row striping is
+        a single conditional format rather than one call per row.
+        """
         ps = ws.PageSetup
-        inch = ps.Application.InchesToPoints
+        app = ps.Application
+        try:
+            # Batch the PageSetup writes instead of syncing each with the printer
+            app.PrintCommunication = False
+        except Exception:
+            pass
+        inch = app.InchesToPoints
         ps.LeftMargin = inch(MARGIN_LEFT_RIGHT)
         ps.RightMargin = inch(MARGIN_LEFT_RIGHT)
         ps.TopMargin = inch(MARGIN_TOP)
         ps.BottomMargin = inch(MARGIN_BOTTOM)
         ps.HeaderMargin = inch(HEADER_MARGIN)
         ps.FooterMargin = inch(FOOTER_MARGIN)
-        ps.Orientation = xl.xlLandscape
+        ps.Orientation = XL_LANDSCAPE
         ps.CenterHorizontally = False
         ps.CenterVertically = False
         ps.FitToPagesWide = 1
@@ -148,16 +237,13 @@ class ExcelConverter:
         ps.PrintGridlines = False
         ps.PrintHeadings = False
         used = ws.UsedRange
-        rows = used.Rows.Count
-        cols = used.Columns.Count
-        header_row = 1
-        maxpop = 0
-        for r in range(1, rows+1):
-            cnt = sum(1 for c in range(1, cols+1)
-                      if used.Cells(r,c).Value not in (None, ""))
-            if cnt > maxpop:
-                maxpop = cnt
-                header_row = r
+        values = used.Value
+        if not isinstance(values, tuple):
+            # A single-cell range comes back as a bare scalar
+            values = ((values,),)
+        rows = len(values)
+        cols = max((len(row) for row in values), default=1)
+        header_row = find_header_row(values)
         ps.PrintTitleRows = f"${header_row}:${header_row}"
         ps.CenterFooter = "Page &P of &N"
         def col_letter(n: int) -> str:
@@ -172,8 +258,18 @@ class ExcelConverter:
         start_col = col_letter(1)
         end_col = col_letter(cols)
         ps.PrintArea = f"{sheet_name}!${start_col}$1:${end_col}${rows}"
+        try:
+            app.PrintCommunication = True
+        except Exception:
+            pass
         ws.Rows(header_row).Font.Bold = True
         ws.Range(ws.Cells(header_row,1), ws.Cells(rows,cols)).Columns.AutoFit()
-        bgr = STRIPE_RGB[0] | (STRIPE_RGB[1] << 8) | (STRIPE_RGB[2] << 16)
-        for r in range(header_row+1, rows+1, 2):
-            ws.Rows(r).Interior.Color = bgr
+        if rows > header_row:
+            bgr = STRIPE_RGB[0] | (STRIPE_RGB[1] << 8) | (STRIPE_RGB[2] << 16)
+            # Same rows as before (header+1, header+3, ...) in one format condition
+            sep = self._list_separator(app)
+            stripe = ws.Range(f"{header_row+1}:{rows}").FormatConditions.Add(
+                XL_EXPRESSION, Formula1=f"=MOD(ROW()-{header_row}{sep}2)=1"
+            )
+            stripe.Interior.Color = bgr
+        return rows, cols
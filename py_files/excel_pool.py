@@ -0,0 +1,183 @@
+# excel_pool.py
+"""
+Warm Excel.Application instances that are reused across workbooks and
+folders, and recycled before they get slow or bloated.
+
+Starting Excel costs seconds and a long-lived instance slowly leaks
+memory, so an instance is kept between conversions and replaced when it
+has opened `max_workbooks` workbooks, when its working set exceeds
+`max_memory_mb`, or when it fails the health check run before every reuse.
+The application factory and memory probe are injectable, so the pool runs
+against fake_com.FakeApplication on any platform.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Calculation mode is remembered by Excel, so restore it before quitting
+XL_CALCULATION_AUTOMATIC = -4105
+
+
+def excel_pid(app) -> Optional[int]:
+    """Process id of the EXCEL.EXE behind `app`; None if unknown."""
+    try:
+        import win32process
+        return win32process.GetWindowThreadProcessId(app.Hwnd)[1]
+    except Exception:
+        return None
+
+
+def excel_memory_mb(app) -> Optional[float]:
+    """Working set of the EXCEL.EXE process behind `app`; None if unknown."""
+    try:
+        import win32api
+        import win32con
+        import win32process
+        handle = win32api.OpenProcess(
+            win32con.PROCESS_QUERY_INFORMATION | win32con.PROCESS_VM_READ, False, excel_pid(app)
+        )
+        try:
+            return win32process.GetProcessMemoryInfo(handle)["WorkingSetSize"] / 1048576
+        finally:
+            win32api.CloseHandle(handle)
+    except Exception:
+        return None
+
+
+class _Instance:
+    def __init__(self, app):
+        self.app = app
+        self.pid = excel_pid(app)
+        self.workbooks = 0
+        self.started = time.monotonic()
+
+
+class ExcelPool:
+    """
+    :param factory: Returns a new, configured Application object.
+    :param size: Instances kept warm.
+    :param max_workbooks: Recycle after this many workbooks (0 = never).
+    :param max_memory_mb: Recycle once the working set exceeds this (0 = never).
+    :param memory_probe: app -> MB or None; defaults to excel_memory_mb.
+    """
+    def __init__(self, factory: Callable, size: int = 1, max_workbooks: int = 200,
+                 max_memory_mb: float = 0, memory_probe: Callable = excel_memory_mb):
+        self.factory = factory
+        self.size = max(1, int(size))
+        self.max_workbooks = int(max_workbooks)
+        self.max_memory_mb = float(max_memory_mb)
+        self.memory_probe = memory_probe
+        self._idle: List[_Instance] = []
+        self._leased: dict = {}
+        self.started = 0
+        self.recycled = 0
+        self.unhealthy = 0
+
+    def __enter__(self):
+        self.warm()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def warm(self) -> None:
+        """Start instances up to `size` so the first workbook pays no startup."""
+        while len(self._idle) + len(self._leased) < self.size:
+            self._idle.append(self._start())
+
+    def _start(self) -> _Instance:
+        t0 = time.perf_counter()
+        inst = _Instance(self.factory())
+        self.started += 1
+        logger.info("Started Excel instance in %.1fs", time.perf_counter() - t0)
+        return inst
+
+    @staticmethod
+    def _quit(inst: _Instance) -> None:
+        try:
+            inst.app.Calculation = XL_CALCULATION_AUTOMATIC
+        except Exception:
+            pass
+        try:
+            inst.app.Quit()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _healthy(inst: _Instance) -> bool:
+        """Instance answers and has no workbook left open by a failed job."""
+        try:
+            books = inst.app.Workbooks
+            if books.Count:
+                books.Close()
+            return bool(inst.app.Ready)
+        except Exception:
+            return False
+
+    def _worn_out(self, inst: _Instance) -> Optional[str]:
+        if self.max_workbooks and inst.workbooks >= self.max_workbooks:
+            return f"{inst.workbooks} workbooks"
+        if self.max_memory_mb:
+            mb = self.memory_probe(inst.app)
+            if mb is not None and mb > self.max_memory_mb:
+                return f"{mb:.0f} MB working set"
+        return None
+
+    def acquire(self):
+        """A healthy Application; replaces instances that fail the check."""
+        while self._idle:
+            inst = self._idle.pop()
+            if self._healthy(inst):
+                self._leased[id(inst.app)] = inst
+                return inst.app
+            self.unhealthy += 1
+            logger.warning("Excel instance failed health check, replacing it")
+            self._quit(inst)
+        inst = self._start()
+        self._leased[id(inst.app)] = inst
+        return inst.app
+
+    def release(self, app, workbooks: int = 1, broken: bool = False) -> None:
+        """
+        Return `app` after it processed `workbooks`. Instances that are
+        broken or past a recycle threshold are quit instead of kept.
+        """
+        inst = self._leased.pop(id(app))
+        inst.workbooks += workbooks
+        reason = "broken" if broken else self._worn_out(inst)
+        if reason:
+            logger.info("Recycling Excel instance (%s)", reason)
+            self.recycled += 1
+            self._quit(inst)
+            return
+        self._idle.append(inst)
+
+    @contextmanager
+    def lease(self):
+        """`with pool.lease() as app:` for one workbook."""
+        app = self.acquire()
+        broken = False
+        try:
+            yield app
+        except BaseException:
+            broken = True
+            raise
+        finally:
+            self.release(app, broken=broken)
+
+    def pids(self) -> List[int]:
+        """Process ids of every live instance, for the pool watchdog."""
+        return [i.pid for i in self._idle + list(self._leased.values()) if i.pid]
+
+    def close(self) -> None:
+        for inst in self._idle + list(self._leased.values()):
+            self._quit(inst)
+        self._idle = []
+        self._leased = {}
+
+    def summary(self) -> str:
+        return (f"Excel pool: {self.started} started, {self.recycled} recycled, "
+                f"{self.unhealthy} failed health checks")
@@ -0,0 +1,366 @@
+# fake_com.py
+"""
+Minimal in-process stand-in for the Excel COM object model.
+
+Each attribute read, attribute write or method call on a fake object is
+counted as one round trip, which is what it would cost against a real
+out-of-process Excel. Used to measure and guard the number of COM calls
+ExcelConverter makes per sheet without needing Windows, and as the
+application behind ExcelPool / ExcelConverter on other platforms
+(FakeApplication opens .csv/.xlsx sources and exports placeholder PDFs).
+
+Run directly to check _format_sheet against ROUND_TRIP_BUDGET, and that
+it still bolds the header row it detected and stripes every other row
+below it, with both "," and ";" locales:
+    python -m py_files.fake_com [rows] [cols]
+"""
+import re
+import sys
+import tempfile
+from collections import Counter
+from typing import List, Optional, Sequence, Tuple
+
+# Upper bound on round trips for _format_sheet, independent of sheet size.
+ROUND_TRIP_BUDGET = 60
+
+
+class CallCounter:
+    """Tallies round trips, overall and per "Class.member"."""
+    def __init__(self):
+        self.total = 0
+        self.by_name: Counter = Counter()
+
+    def hit(self, name: str) -> None:
+        self.total += 1
+        self.by_name[name] += 1
+
+    def reset(self) -> None:
+        self.total = 0
+        self.by_name.clear()
+
+
+class _Dispatch:
+    """Counts every public attribute get/set as a round trip."""
+    def __init__(self, counter: CallCounter):
+        object.__setattr__(self, "_counter", counter)
+
+    def __getattribute__(self, name):
+        if not name.startswith("_"):
+            object.__getattribute__(self, "_counter").hit(f"{type(self).__name__}.{name}")
+        return object.__getattribute__(self, name)
+
+    def __setattr__(self, name, value):
+        if not name.startswith("_"):
+            self._counter.hit(f"{type(self).__name__}.{name}=")
+        object.__setattr__(self, name, value)
+
+    def _values_of(self, name):
+        """Uncounted attribute read, for inspecting state after the fact."""
+        return object.__getattribute__(self, name)
+
+
+class FakeFont(_Dispatch):
+    def __init__(self, counter):
+        super().__init__(counter)
+        object.__setattr__(self, "Bold", False)
+
+
+class FakeInterior(_Dispatch):
+    def __init__(self, counter):
+        super().__init__(counter)
+        object.__setattr__(self, "Color", None)
+
+
+class FakeFormatCondition(_Dispatch):
+    def __init__(self, counter, type_, formula):
+        super().__init__(counter)
+        object.__setattr__(self, "Type", type_)
+        object.__setattr__(self, "Formula1", formula)
+        object.__setattr__(self, "Interior", FakeInterior(counter))
+
+
+class FakeFormatConditions(_Dispatch):
+    def __init__(self, counter, owner):
+        super().__init__(counter)
+        object.__setattr__(self, "_owner", owner)
+        object.__setattr__(self, "_items", [])
+
+    def Add(self, Type, Operator=None, Formula1=None, Formula2=None):
+        cond = FakeFormatCondition(self._counter, Type, Formula1)
+        self._items.append(cond)
+        self._owner._sheet._conditions.append((self._owner, cond))
+        return cond
+
+
+class FakeAxis(_Dispatch):
+    """Range.Rows / Range.Columns."""
+    def __init__(self, counter, count):
+        super().__init__(counter)
+        object.__setattr__(self, "Count", count)
+
+    def AutoFit(self):
+        return True
+
+
+class FakeRange(_Dispatch):
+    """Rectangular block r1..r2 x c1..c2 (1-based, inclusive) of a sheet."""
+    def __init__(self, sheet, r1, c1, r2, c2):
+        super().__init__(sheet._counter)
+        object.__setattr__(self, "_sheet", sheet)
+        object.__setattr__(self, "_bounds", (r1, c1, r2, c2))
+        object.__setattr__(self, "Font", FakeFont(sheet._counter))
+        object.__setattr__(self, "Interior", FakeInterior(sheet._counter))
+        object.__setattr__(self, "FormatConditions", FakeFormatConditions(sheet._counter, self))
+
+    @property
+    def Rows(self):
+        r1, _, r2, _ = self._bounds
+        return FakeAxis(self._counter, r2 - r1 + 1)
+
+    @property
+    def Columns(self):
+        _, c1, _, c2 = self._bounds
+        return FakeAxis(self._counter, c2 - c1 + 1)
+
+    @property
+    def Value(self):
+        r1, c1, r2, c2 = self._bounds
+        block = tuple(
+            tuple(self._sheet._cell(r, c) for c in range(c1, c2 + 1))
+            for r in range(r1, r2 + 1)
+        )
+        if len(block) == 1 and len(block[0]) == 1:
+            return block[0][0]
+        return block
+
+    def Cells(self, r, c):
+        r1, c1, _, _ = self._bounds
+        return FakeRange(self._sheet, r1 + r - 1, c1 + c - 1, r1 + r - 1, c1 + c - 1)
+
+
+class FakeComError(Exception):
+    """Raised where real COM would raise pywintypes.com_error."""
+
+
+class FakeApplication(_Dispatch):
+    """
+    Excel.Application stand-in. Usable as an ExcelPool factory or as
+    ExcelConverter(app_factory="py_files.fake_com:FakeApplication").
+    After crash() every call raises, like a dead EXCEL.EXE.
+
+    :param list_separator: What International(xlListSeparator) reports.
+    """
+    def __init__(self, counter: Optional[CallCounter] = None, list_separator: str = ","):
+        counter = counter or CallCounter()
+        super().__init__(counter)
+        object.__setattr__(self, "_list_separator", list_separator)
+        object.__setattr__(self, "_dead", False)
+        object.__setattr__(self, "_quit", False)
+        object.__setattr__(self, "_memory_mb", 100.0)
+        object.__setattr__(self, "PrintCommunication", True)
+        object.__setattr__(self, "Ready", True)
+        object.__setattr__(self, "Workbooks", FakeWorkbooks(counter, self))
+
+    def __getattribute__(self, name):
+        if not name.startswith("_") and object.__getattribute__(self, "_dead"):
+            raise FakeComError("The RPC server is unavailable")
+        return super().__getattribute__(name)
+
+    def InchesToPoints(self, inches):
+        return inches * 72.0
+
+    def International(self, index):
+        # Only xlListSeparator (5) is needed by the converter
+        return self._list_separator if index == 5 else None
+
+    def Quit(self):
+        object.__setattr__(self, "_quit", True)
+        object.__setattr__(self, "_dead", True)
+
+    def crash(self) -> None:
+        object.__setattr__(self, "_dead", True)
+
+
+class FakeWorkbook(_Dispatch):
+    """One-sheet workbook; its rows are read from a .csv/.xlsx source."""
+    def __init__(self, counter, books, sheet):
+        super().__init__(counter)
+        object.__setattr__(self, "_books", books)
+        object.__setattr__(self, "_sheet", sheet)
+
+    def Worksheets(self, index):
+        return self._sheet
+
+    def ExportAsFixedFormat(self, type_, filename):
+        with open(filename, "wb") as fh:
+            fh.write(b"%PDF-1.4\n% fake Excel export\n%%EOF\n")
+
+    def Close(self, SaveChanges=False):
+        if self in self._books._open:
+            self._books._open.remove(self)
+
+
+class FakeWorkbooks(_Dispatch):
+    def __init__(self, counter, app):
+        super().__init__(counter)
+        object.__setattr__(self, "_app", app)
+        object.__setattr__(self, "_open", [])
+        object.__setattr__(self, "opened", 0)
+
+    @property
+    def Count(self):
+        return len(self._open)
+
+    def Open(self, filename):
+        from pathlib import Path
+        from py_files.sheet_reader import SheetReadError, iter_rows
+        try:
+            rows = [[v if v != "" else None for v in row] for row in iter_rows(Path(filename))]
+        except (OSError, SheetReadError) as e:
+            raise FakeComError(f"Excel cannot open the file: {e}") from e
+        sheet = FakeWorksheet(rows, counter=self._counter, app=self._app)
+        wb = FakeWorkbook(self._counter, self, sheet)
+        self._open.append(wb)
+        object.__setattr__(self, "opened", self._values_of("opened") + 1)
+        return wb
+
+    def Close(self):
+        self._open.clear()
+
+
+class FakePageSetup(_Dispatch):
+    def __init__(self, counter, app):
+        super().__init__(counter)
+        object.__setattr__(self, "Application", app)
+
+
+class FakeWorksheet(_Dispatch):
+    """
+    Worksheet backed by a list of rows; trailing short rows are padded
+    with None so UsedRange is rectangular like Excel's.
+    """
+    def __init__(self, values: Sequence[Sequence], name: str = "Sheet1",
+                 counter: Optional[CallCounter] = None, app: Optional[FakeApplication] = None):
+        counter = counter or CallCounter()
+        super().__init__(counter)
+        width = max((len(r) for r in values), default=1) or 1
+        object.__setattr__(self, "_rows", [list(r) + [None] * (width - len(r)) for r in values] or [[None]])
+        object.__setattr__(self, "_width", width)
+        object.__setattr__(self, "_conditions", [])
+        object.__setattr__(self, "_row_ranges", {})
+        object.__setattr__(self, "Name", name)
+        object.__setattr__(self, "PageSetup", FakePageSetup(counter, app or FakeApplication(counter)))
+
+    @property
+    def counter(self) -> CallCounter:
+        return self._counter
+
+    def _cell(self, r, c):
+        try:
+            return self._rows[r - 1][c - 1]
+        except IndexError:
+            return None
+
+    @property
+    def UsedRange(self):
+        return FakeRange(self, 1, 1, len(self._rows), self._width)
+
+    def Cells(self, r, c):
+        return FakeRange(self, r, c, r, c)
+
+    def Rows(self, r):
+        # Keep one object per row so formatting set on it can be inspected
+        if r not in self._row_ranges:
+            self._row_ranges[r] = FakeRange(self, r, 1, r, self._width)
+        return self._row_ranges[r]
+
+    def Range(self, a, b=None):
+        if isinstance(a, str):
+            first, _, last = a.partition(":")
+            return FakeRange(self, int(first), 1, int(last or first), self._width)
+        r1, c1, _, _ = a._bounds
+        _, _, r2, c2 = (b or a)._bounds
+        return FakeRange(self, r1, c1, r2, c2)
+
+    def striped_rows(self) -> List[int]:
+        """Rows shaded by row formatting or an alternating-row format condition."""
+        shaded = {r for r, rng in self._row_ranges.items() if rng._values_of("Interior")._values_of("Color") is not None}
+        for rng, cond in self._conditions:
+            if cond._values_of("Interior")._values_of("Color") is None:
+                continue
+            r1, _, r2, _ = rng._bounds
+            # Only "=MOD(ROW()-h<sep>2)=k" with the locale's separator is understood here;
+            # anything else shades nothing, as Excel would reject it
+            sep = re.escape(self.PageSetup._values_of("Application")._list_separator)
+            m = re.fullmatch(rf"=MOD\(ROW\(\)-(\d+){sep}2\)=(\d+)",
+                             cond._values_of("Formula1").replace(" ", ""))
+            if not m:
+                continue
+            h, k = int(m.group(1)), int(m.group(2))
+            shaded.update(r for r in range(r1, r2 + 1) if (r - h) % 2 == k)
+        return sorted(shaded)
+
+    def bold_rows(self) -> List[int]:
+        return sorted(r for r, rng in self._row_ranges.items() if rng._values_of("Font")._values_of("Bold"))
+
+
+def format_synthetic_sheet(rows: int, cols: int, list_separator: str = ","
+                           ) -> Tuple[CallCounter, "FakeWorksheet"]:
+    """
+    Run ExcelConverter._format_sheet on a synthetic rows x cols sheet (a
+    title in row 1, headers in row 2) under an Excel whose locale uses
+    `list_separator`; returns the counter and the sheet.
+    """
+    from pathlib import Path
+    from py_files.excel_converter import ExcelConverter
+
+    values = [["Title"] + [None] * (cols - 1)]
+    values.append([f"Header {c}" for c in range(1, cols + 1)])
+    values.extend([[f"r{r}c{c}" for c in range(1, cols + 1)] for r in range(3, rows + 1)])
+    counter = CallCounter()
+    ws = FakeWorksheet(values, counter=counter,
+                       app=FakeApplication(counter, list_separator=list_separator))
+    with tempfile.TemporaryDirectory() as tmp:
+        converter = ExcelConverter(Path(tmp), app_factory=FakeApplication)
+        counter.reset()
+        converter._format_sheet(ws)
+    return counter, ws
+
+
+def main(argv=None) -> int:
+    args = argv if argv is not None else sys.argv[1:]
+    rows = int(args[0]) if len(args) > 0 else 2000
+    cols = int(args[1]) if len(args) > 1 else 12
+    from py_files.utils import find_header_row
+
+    ok = True
+    for sep in (",", ";"):
+        counter, ws = format_synthetic_sheet(rows, cols, list_separator=sep)
+        print(f"_format_sheet on {rows}x{cols} with list separator {sep!r}: "
+              f"{counter.total} COM round trips (budget {ROUND_TRIP_BUDGET})")
+        for name, n in counter.by_name.most_common(5):
+            print(f"  {n:6d}  {name}")
+        ok = ok and counter.total <= ROUND_TRIP_BUDGET
+        # The header the converter should have found in what it read
+        header_row = find_header_row(ws._rows)
+        used_rows = len(ws._rows)
+        titles = ws.PageSetup._values_of("PrintTitleRows")
+        if titles != f"${header_row}:${header_row}":
+            print(f"  print title rows {titles}, expected row {header_row}")
+            ok = False
+        bold = ws.bold_rows()
+        if bold != [header_row]:
+            print(f"  bold rows {bold}, expected [{header_row}]")
+            ok = False
+        # header+1, header+3, ... are shaded
+        expected = list(range(header_row + 1, used_rows + 1, 2))
+        striped = ws.striped_rows()
+        if striped != expected:
+            print(f"  {len(striped)} striped rows (first {striped[:4]}), expected "
+                  f"{len(expected)} (first {expected[:4]})")
+            ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
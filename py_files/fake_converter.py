@@ -0,0 +1,78 @@
+# fake_converter.py
+"""
+Stand-in for ExcelConverter that needs neither Windows nor Excel.
+Follows the same context-manager / convert(src) -> Optional[Path] contract
+so the worker pool and CLI can be exercised on any platform.
+"""
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from py_files.utils import extract_ids, pdf_name
+
+logger = logging.getLogger(__name__)
+
+
+class FakeConverter:
+    """
+    Writes a tiny placeholder PDF for every recognised source.
+
+    :param delay: Seconds to sleep per conversion, to imitate Excel.
+    :param fail_on: Filename substrings that make convert() return None.
+    :param crash_on: Filename substrings that kill the whole process,
+                     to imitate Excel taking a worker down with it.
+    :param hang_on: Filename substrings that block forever in `hang_stage`,
+                    to imitate a password prompt or a stalled export.
+    :param hang_stage: "open" or "export".
+    """
+    SUPPORTED_EXTENSIONS = (".xlsx", ".xls", ".csv")
+
+    def __init__(self, output_dir: Path, delay: float = 0.0,
+                 fail_on: Iterable[str] = (), crash_on: Iterable[str] = (),
+                 hang_on: Iterable[str] = (), hang_stage: str = "export"):
+        self.output_dir = output_dir
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.delay = delay
+        self.fail_on = tuple(fail_on)
+        self.crash_on = tuple(crash_on)
+        self.hang_on = tuple(hang_on)
+        self.hang_stage = hang_stage
+        self.converted = 0
+        self.on_stage: Optional[Callable[[str], None]] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def _stage(self, name: str, src: Path) -> None:
+        if self.on_stage:
+            self.on_stage(name)
+        if name == self.hang_stage and any(s in src.name for s in self.hang_on):
+            logger.error("Fake hang in %s on %s", name, src.name)
+            while True:
+                time.sleep(3600)
+
+    def convert(self, src: Path) -> Optional[Path]:
+        if any(s in src.name for s in self.crash_on):
+            logger.error("Fake crash on %s", src.name)
+            os._exit(3)
+        self._stage("open", src)
+        if self.delay:
+            time.sleep(self.delay)
+        if any(s in src.name for s in self.fail_on):
+            logger.error("Fake failure on %s", src.name)
+            return None
+        prop, unit = extract_ids(src.stem)
+        if not prop or not unit:
+            logger.warning("Pattern not recognised for %s, skipping", src.name)
+            return None
+        self._stage("export", src)
+        final_path = self.output_dir / pdf_name(prop, unit)
+        final_path.write_bytes(b"%PDF-1.4\n% fake conversion of " + src.name.encode() + b"\n%%EOF\n")
+        self.converted += 1
+        logger.info("Created %s", final_path.name)
+        return final_path
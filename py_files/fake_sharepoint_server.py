@@ -0,0 +1,257 @@
+# fake_sharepoint_server.py
+"""
+Minimal local HTTP stand-in for the SharePoint REST endpoints RestClient
+uses to move files, so chunked uploads can be checked offline:
+
+    POST .../GetFolderByServerRelativePath(decodedurl=@f)/Files/AddUsingPath(...)
+    POST .../GetFileByServerRelativePath(decodedurl=@u)/StartUpload(uploadId=...)
+    POST ...                                          /ContinueUpload(uploadId=...,fileOffset=N)
+    POST ...                                          /FinishUpload(uploadId=...,fileOffset=N)
+    POST ...                                          /CancelUpload(uploadId=...)
+    POST ...                                          /MoveTo(newurl=@n,flags=1)
+    GET  ...                                          /$value
+    GET  .../GetFileByServerRelativePath(decodedurl=@u)           (Length)
+    DELETE ...
+
+Files live in memory. Bodies larger than max_body are refused with 413,
+like SharePoint's request-size limit. fail_next() makes chunk requests
+answer with a throttling status, and drop_next() makes the server accept
+a chunk and then close the connection without answering, as when a
+response is lost on the way back. Every accepted chunk is recorded as
+(name, offset, length).
+
+Run directly to upload a random file through a throttled, lossy session
+and check that it arrives intact with no finished chunk sent twice, and
+that a failed upload leaves the previous copy alone:
+    python -m py_files.fake_sharepoint_server [size_kb] [chunk_kb]
+"""
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, unquote, urlsplit
+
+logger = logging.getLogger(__name__)
+
+_SESSION_CALL = re.compile(
+    r"/(StartUpload|ContinueUpload|FinishUpload|CancelUpload)"
+    r"\(uploadId=guid'([^']+)'(?:,fileOffset=(\d+))?\)$")
+_ADD_FILE = "/Files/AddUsingPath(decodedurl=@n,overwrite=true)"
+_FILE = "/GetFileByServerRelativePath(decodedurl=@u)"
+_MOVE = "/MoveTo(newurl=@n,flags=1)"
+# fail_next/drop_next action that answers nothing
+DROP = "drop"
+
+# What RestClient needs from an azure-identity credential
+AccessToken = namedtuple("AccessToken", "token expires_on")
+
+
+class StaticCredential:
+    def get_token(self, *scopes):
+        return AccessToken("fake", time.time() + 3600)
+
+
+def _param(query: Dict[str, List[str]], alias: str) -> str:
+    value = query[alias][0]
+    return value[1:-1].replace("''", "'")
+
+
+class FakeSharePointServer(ThreadingHTTPServer):
+    """
+    :param max_body: Largest request body accepted, in bytes.
+    """
+    daemon_threads = True
+
+    def __init__(self, max_body: int = 4 * 1024 * 1024):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.max_body = max_body
+        self.files: Dict[str, bytes] = {}
+        self.accepted: List[Tuple[str, int, int]] = []
+        self._sessions: Dict[str, Tuple[str, bytearray]] = {}
+        self._faults: List[Tuple[int, Union[int, str]]] = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def site_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/sites/fake"
+
+    def fail_next(self, *statuses: int, after: int = 0) -> None:
+        """
+        Answer chunk requests with these statuses, in order, once `after`
+        more chunks have been accepted.
+        """
+        with self._lock:
+            due = len(self.accepted) + after
+            self._faults.extend((due, status) for status in statuses)
+
+    def drop_next(self, after: int = 0) -> None:
+        """Accept a chunk once `after` more have been, then answer nothing."""
+        self.fail_next(DROP, after=after)  # type: ignore[arg-type]
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+    def handle_call(self, method: str, path: str, query: Dict[str, List[str]],
+                    body: bytes) -> Tuple[Optional[int], dict, bytes]:
+        """(status, json payload, raw body) for one request; status None drops it."""
+        if method == "GET" and path.endswith("/$value"):
+            data = self.files.get(_param(query, "@u"))
+            return (404, {"error": "not found"}, b"") if data is None else (200, {}, data)
+        if path.endswith(_FILE) and method in ("GET", "DELETE"):
+            name = _param(query, "@u")
+            with self._lock:
+                data = self.files.get(name)
+                if data is None:
+                    return 404, {"error": f"{name} not found"}, b""
+                if method == "DELETE":
+                    del self.files[name]
+                    return 200, {}, b""
+            return 200, {"Name": name.rsplit("/", 1)[-1], "Length": str(len(data))}, b""
+        if method != "POST":
+            return 405, {"error": method}, b""
+        if path.endswith(_ADD_FILE):
+            name = f"{_param(query, '@f').rstrip('/')}/{_param(query, '@n')}"
+            with self._lock:
+                self.files[name] = b""
+            return 200, {"ServerRelativeUrl": name, "Length": "0"}, b""
+        if path.endswith(_MOVE):
+            name, target = _param(query, "@u"), _param(query, "@n")
+            with self._lock:
+                if name not in self.files:
+                    return 404, {"error": f"{name} not found"}, b""
+                self.files[target] = self.files.pop(name)
+            return 200, {}, b""
+        m = _SESSION_CALL.search(path)
+        if not m:
+            return 404, {"error": f"no endpoint for {path}"}, b""
+        call, upload_id, offset = m.group(1), m.group(2), int(m.group(3) or 0)
+        name = _param(query, "@u")
+        with self._lock:
+            fault = None
+            if call != "CancelUpload" and self._faults and self._faults[0][0] <= len(self.accepted):
+                fault = self._faults.pop(0)[1]
+                if fault != DROP:
+                    return fault, {"error": "throttled"}, b""
+            status, payload = self._session_call(call, upload_id, offset, name, body)
+        return (None if fault == DROP else status), payload, b""
+
+    def _session_call(self, call: str, upload_id: str, offset: int, name: str,
+                      body: bytes) -> Tuple[int, dict]:
+        if call == "CancelUpload":
+            self._sessions.pop(upload_id, None)
+            return 200, {}
+        if call == "StartUpload":
+            if name not in self.files:
+                return 404, {"error": f"{name} does not exist"}
+            if upload_id in self._sessions:
+                return 400, {"error": f"upload session {upload_id} already started"}
+            self._sessions[upload_id] = (name, bytearray())
+        session = self._sessions.get(upload_id)
+        if session is None or session[0] != name:
+            return 400, {"error": f"no upload session {upload_id}"}
+        buf = session[1]
+        if offset != len(buf):
+            return 400, {"error": f"offset {offset} != {len(buf)}"}
+        buf.extend(body)
+        self.accepted.append((name, offset, len(body)))
+        if call == "FinishUpload":
+            del self._sessions[upload_id]
+            self.files[name] = bytes(buf)
+            return 200, {"ServerRelativeUrl": name, "Length": str(len(buf))}
+        return 200, {"value": str(len(buf))}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeSharePointServer
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt, *args)
+
+    def _serve(self, method: str) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if length > self.server.max_body:
+            status, payload, raw = 413, {"error": "request too large"}, b""
+        else:
+            parts = urlsplit(self.path)
+            status, payload, raw = self.server.handle_call(
+                method, unquote(parts.path), parse_qs(parts.query), body)
+        if status is None:
+            # The work is done; the response is "lost"
+            self.close_connection = True
+            return
+        out = raw or json.dumps(payload).encode()
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def do_GET(self):
+        self._serve("GET")
+
+    def do_POST(self):
+        self._serve("POST")
+
+    def do_DELETE(self):
+        self._serve("DELETE")
+
+
+def main(argv=None) -> int:
+    from py_files.rest_client import RestClient
+
+    args = argv if argv is not None else sys.argv[1:]
+    size = int(args[0]) * 1024 if len(args) > 0 else 2500 * 1024
+    chunk = int(args[1]) * 1024 if len(args) > 1 else 256 * 1024
+    folder = "/sites/fake/Shared Documents/Output"
+    target = f"{folder}/report.pdf"
+    data = os.urandom(size)
+    with tempfile.TemporaryDirectory() as tmp, FakeSharePointServer(max_body=chunk) as server:
+        src = Path(tmp) / "report.pdf"
+        src.write_bytes(data)
+        client = RestClient(server.site_url, StaticCredential(), max_retries=2, backoff=0.01)
+        server.files[target] = b"previous upload"
+        # A session that fails for good must not touch the previous copy
+        server.fail_next(503, 503, 503, after=1)
+        try:
+            client.upload_chunked(folder, src.name, src, chunk)
+            survived = False
+        except Exception:
+            survived = server.files == {target: b"previous upload"}
+        server.accepted.clear()
+        # Throttle the first chunk and the fourth twice; lose the replies
+        # to the second chunk and the last
+        server.fail_next(503)
+        server.drop_next(after=1)
+        server.fail_next(429, 503, after=3)
+        server.drop_next(after=(size - 1) // chunk)
+        client.upload_chunked(folder, src.name, src, chunk)
+        intact = server.files.get(target) == data
+        leftovers = sorted(set(server.files) - {target})
+        offsets = [o for _, o, _ in server.accepted]
+    resent = len(offsets) - len(set(offsets))
+    print(f"{size} bytes in {len(offsets)} chunks of {chunk}: "
+          f"{'intact' if intact else 'CORRUPT'}, {client.upload_stats.retries} retries, "
+          f"{resent} finished chunks resent, leftovers {leftovers}; previous copy "
+          f"{'kept' if survived else 'DAMAGED'} by a failed upload")
+    return 0 if intact and resent == 0 and not leftovers and survived else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
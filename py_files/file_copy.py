@@ -0,0 +1,112 @@
+# file_copy.py
+"""
+Copy files without pulling them through Python memory.
+
+fast_copy() tries, in order:
+    same             dst is already a hardlink to src; nothing to do
+    link             hardlink; same volume, no data copied at all
+    reflink          copy-on-write clone (Btrfs, XFS; Linux only)
+    copy_file_range  copied inside the kernel, server-side on NFS/SMB3
+    sendfile         copied inside the kernel
+    stream           chunked read/write, CHUNK_SIZE at a time
+and falls through whenever the platform or file system refuses a method.
+The destination is written under a temporary name and swapped in with
+os.replace, so readers never see a partial file and an existing
+destination never shares an inode with the source by accident.
+"""
+import logging
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import BinaryIO
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+# linux/fs.h: _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+
+
+def fast_copy(src: Path, dst: Path, link: bool = True) -> str:
+    """
+    Copy `src` to `dst` and return the method used.
+
+    :param link: Allow a hardlink. Only safe when nobody writes to either
+                 path in place afterwards, since both names share the data.
+    """
+    try:
+        if link and os.path.samefile(src, dst):
+            # Already linked; os.replace(tmp, dst) would be a no-op
+            return "same"
+    except OSError:
+        pass
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.part")
+    tmp.unlink(missing_ok=True)
+    try:
+        method = _copy_to(src, tmp, link)
+        os.replace(tmp, dst)
+    finally:
+        tmp.unlink(missing_ok=True)
+    logger.debug("Copied %s -> %s via %s", src, dst, method)
+    return method
+
+
+def _copy_to(src: Path, tmp: Path, link: bool) -> str:
+    if link:
+        try:
+            os.link(src, tmp)
+            return "link"
+        except (OSError, NotImplementedError):
+            pass
+    with open(src, "rb") as fin, open(tmp, "wb") as fout:
+        if _reflink(fin, fout):
+            return "reflink"
+        size = os.fstat(fin.fileno()).st_size
+        for name, kernel_copy in (("copy_file_range", _copy_file_range), ("sendfile", _sendfile)):
+            if kernel_copy(fin, fout, size):
+                return name
+            # Start over cleanly after a method gave up part way
+            fin.seek(0)
+            fout.seek(0)
+            fout.truncate()
+        shutil.copyfileobj(fin, fout, CHUNK_SIZE)
+        return "stream"
+
+
+def _reflink(fin: BinaryIO, fout: BinaryIO) -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+    try:
+        fcntl.ioctl(fout.fileno(), _FICLONE, fin.fileno())
+        return True
+    except OSError:
+        return False
+
+
+def _copy_file_range(fin: BinaryIO, fout: BinaryIO, size: int) -> bool:
+    if not hasattr(os, "copy_file_range"):
+        return False
+    return _kernel_loop(lambda n: os.copy_file_range(fin.fileno(), fout.fileno(), n), size)
+
+
+def _sendfile(fin: BinaryIO, fout: BinaryIO, size: int) -> bool:
+    # Regular-file destinations work on Linux; macOS/BSD need a socket
+    if not hasattr(os, "sendfile") or not sys.platform.startswith("linux"):
+        return False
+    return _kernel_loop(lambda n: os.sendfile(fout.fileno(), fin.fileno(), None, n), size)
+
+
+def _kernel_loop(step, size: int) -> bool:
+    copied = 0
+    while copied < size:
+        try:
+            n = step(min(size - copied, 1 << 30))
+        except OSError:
+            return False
+        if n == 0:
+            # Source shrank while copying; keep what was there
+            break
+        copied += n
+    return True
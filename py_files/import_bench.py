@@ -0,0 +1,84 @@
+# import_bench.py
+"""
+Startup guard: how long `import main` takes and what it drags in.
+
+Runs `python -X importtime -c "import main"` in fresh interpreters and
+fails when the fastest run exceeds IMPORT_BUDGET_MS, when any module in
+FORBIDDEN_AT_STARTUP was imported, or when importing read the checklist
+(unit codes must stay lazy). Heavy modules belong inside the code paths
+that need them.
+
+    python -m py_files.import_bench [runs]
+"""
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+# Cumulative import time of main.py (excluding interpreter startup).
+IMPORT_BUDGET_MS = 150
+
+# Only the SharePoint / Excel code paths may load these.
+FORBIDDEN_AT_STARTUP = (
+    "office365",
+    "azure",
+    "requests",
+    "win32com",
+    "pythoncom",
+    "pywintypes",
+    "py_files.sharepoint_gateway",
+    "py_files.excel_converter",
+    "py_files.pipeline",
+)
+
+_ROOT = Path(__file__).resolve().parent.parent
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+_PROBE = (
+    "import sys, main, py_files.config as c; "
+    "sys.exit(c.valid_unit_codes.cache_info().currsize)"
+)
+
+
+def measure_once() -> Tuple[float, List[str], bool]:
+    """(ms to import main, modules imported, unit codes were loaded)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE],
+        cwd=_ROOT, capture_output=True, text=True,
+    )
+    total_us = 0
+    modules = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        modules.append(m.group(4))
+        if m.group(4) == "main":
+            total_us = int(m.group(2))
+    if not total_us:
+        raise RuntimeError(f"import main failed:\n{proc.stderr[-2000:]}")
+    return total_us / 1000, modules, proc.returncode != 0
+
+
+def main(argv=None) -> int:
+    args = argv if argv is not None else sys.argv[1:]
+    runs = int(args[0]) if args else 5
+    samples = [measure_once() for _ in range(max(1, runs))]
+    best = min(ms for ms, _, _ in samples)
+    _, modules, units_loaded = samples[0]
+    heavy = sorted({m for m in modules
+                    for f in FORBIDDEN_AT_STARTUP if m == f or m.startswith(f + ".")})
+    print(f"import main: {best:.1f} ms best of {len(samples)} (budget {IMPORT_BUDGET_MS} ms), "
+          f"{len(modules)} modules")
+    ok = best <= IMPORT_BUDGET_MS
+    if heavy:
+        print("  imported at startup: " + ", ".join(heavy))
+        ok = False
+    if units_loaded:
+        print("  valid unit codes were loaded at import time")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+# lease_queue.py
+"""
+Shared job queue so several conversion machines can split one run.
+
+Jobs are "Property_Unit" keys in an SQLite database on a shared path.
+A machine claims a job with a time-limited lease, keeps it alive with
+heartbeats while converting, and marks it done when finished. If a machine
+dies, its lease expires and another machine reclaims the job. Each claim
+and completion is a single IMMEDIATE transaction, so two machines can
+never hold the same live lease. A job that fails, or whose lease expires,
+max_attempts times is parked as failed until reset_failed() reopens it.
+
+The database uses a rollback journal rather than WAL, because WAL needs
+shared memory that network file systems do not provide. Lease expiry uses
+wall-clock time, so the machines' clocks must agree to within a fraction of
+lease_seconds (domain-joined Windows boxes do).
+
+Exercise it with several local processes:
+    python -m py_files.lease_queue [processes] [jobs]
+"""
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    key           TEXT PRIMARY KEY,
+    folder        TEXT,
+    source        TEXT,
+    state         TEXT NOT NULL DEFAULT 'pending',  -- pending, leased, done, failed
+    owner         TEXT,
+    lease_expires REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    updated       REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, folder);
+"""
+
+# try_claim() results besides a job's own state
+CLAIMED = "claimed"
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseQueue:
+    """
+    :param path: SQLite file on a path every machine can reach.
+    :param owner: This worker's id; defaults to host:pid.
+    :param lease_seconds: How long a claim lives without a heartbeat.
+    :param max_attempts: Failed or expired claims before a job is parked as
+                         failed. A job released unfinished (failed=False)
+                         gets its attempt back.
+    """
+    def __init__(self, path: Path, owner: Optional[str] = None,
+                 lease_seconds: float = 300, max_attempts: int = 3):
+        self.path = path
+        self.owner = owner or default_owner()
+        self.lease_seconds = float(lease_seconds)
+        self.max_attempts = int(max_attempts)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=60, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.executescript(_SCHEMA)
+
+    @classmethod
+    def from_cfg(cls, cfg: dict) -> Optional["LeaseQueue"]:
+        """Build from config.yaml ('lease_queue', 'lease_seconds'); None if unset."""
+        path = cfg.get("lease_queue")
+        if not path:
+            return None
+        return cls(Path(path), lease_seconds=cfg.get("lease_seconds", 300))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # ------------------------------------------------------------------ #
+    # Claiming
+    # ------------------------------------------------------------------ #
+    def try_claim(self, key: str, folder: str = "", source: str = "") -> str:
+        """
+        Lease `key` for this owner, creating the job if it is new.
+        Returns CLAIMED, or the state that prevented it: "leased" (held by
+        another live owner), "done" or "failed".
+        """
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "INSERT OR IGNORE INTO jobs (key, folder, source, updated) VALUES (?, ?, ?, ?)",
+                (key, folder, source, now),
+            )
+            cur = db.execute(
+                "UPDATE jobs SET state = 'leased', owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated = ? "
+                "WHERE key = ? AND attempts < ? AND "
+                "(state = 'pending' OR (state = 'leased' AND (lease_expires < ? OR owner = ?)))",
+                (self.owner, now + self.lease_seconds, now, key, self.max_attempts, now, self.owner),
+            )
+            if cur.rowcount:
+                return CLAIMED
+            state, attempts = db.execute(
+                "SELECT state, attempts FROM jobs WHERE key = ?", (key,)
+            ).fetchone()
+            if state == "leased" and attempts >= self.max_attempts:
+                # Expired too often: every machine that took it died
+                if db.execute("UPDATE jobs SET state = 'failed', updated = ? "
+                              "WHERE key = ? AND lease_expires < ?", (now, key, now)).rowcount:
+                    logger.warning("Parked %s as failed: its lease expired %d times",
+                                   key, attempts)
+                    state = "failed"
+        return state
+
+    def claim_next(self, folder: Optional[str] = None) -> Optional[str]:
+        """Lease any claimable job (optionally within `folder`); its key or None."""
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT key FROM jobs WHERE attempts < ? AND (? IS NULL OR folder = ?) AND "
+                "(state = 'pending' OR (state = 'leased' AND lease_expires < ?)) "
+                "ORDER BY updated LIMIT 1",
+                (self.max_attempts, folder, folder, now),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET state = 'leased', owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated = ? WHERE key = ?",
+                (self.owner, now + self.lease_seconds, now, row[0]),
+            )
+        return row[0]
+
+    def enqueue(self, folder: str, jobs: Dict[str, str]) -> None:
+        """Add key -> source name jobs that are not queued yet."""
+        now = time.time()
+        with self._transaction() as db:
+            db.executemany(
+                "INSERT OR IGNORE INTO jobs (key, folder, source, updated) VALUES (?, ?, ?, ?)",
+                [(key, folder, source, now) for key, source in jobs.items()],
+            )
+
+    # ------------------------------------------------------------------ #
+    # While holding leases
+    # ------------------------------------------------------------------ #
+    def heartbeat(self) -> int:
+        """Extend every live lease held by this owner; returns how many."""
+        now = time.time()
+        with self._transaction() as db:
+            return db.execute(
+                "UPDATE jobs SET lease_expires = ? "
+                "WHERE owner = ? AND state = 'leased' AND lease_expires >= ?",
+                (now + self.lease_seconds, self.owner, now),
+            ).rowcount
+
+    @contextmanager
+    def heartbeats(self, interval: Optional[float] = None) -> Iterator[None]:
+        """Run heartbeat() in the background for the duration of the block."""
+        interval = interval or self.lease_seconds / 3
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(interval):
+                try:
+                    self.heartbeat()
+                except sqlite3.Error as e:
+                    logger.warning("Lease heartbeat failed: %s", e)
+
+        thread = threading.Thread(target=beat, name="lease-heartbeat", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, key: str) -> bool:
+        """
+        Mark `key` done if this owner still holds it. False means the lease
+        was lost (expired and reclaimed), and the other owner's result stands.
+        """
+        with self._transaction() as db:
+            return db.execute(
+                "UPDATE jobs SET state = 'done', lease_expires = NULL, updated = ? "
+                "WHERE key = ? AND owner = ? AND state = 'leased'",
+                (time.time(), key, self.owner),
+            ).rowcount == 1
+
+    def release(self, key: str, failed: bool = False) -> None:
+        """
+        Give a job back. A `failed` job keeps the attempt and is parked as
+        failed once it is out of attempts; otherwise (e.g. an interrupted
+        run) the attempt is handed back.
+        """
+        with self._transaction() as db:
+            released = db.execute(
+                "UPDATE jobs SET owner = NULL, lease_expires = NULL, updated = ?, "
+                "attempts = attempts - CASE WHEN ? THEN 0 ELSE 1 END, "
+                "state = CASE WHEN ? AND attempts >= ? THEN 'failed' ELSE 'pending' END "
+                "WHERE key = ? AND owner = ? AND state = 'leased'",
+                (time.time(), failed, failed, self.max_attempts, key, self.owner),
+            ).rowcount
+            if failed and released and db.execute("SELECT state = 'failed' FROM jobs WHERE key = ?",
+                                     (key,)).fetchone() == (1,):
+                logger.warning("Parked %s as failed after %d attempts", key, self.max_attempts)
+
+    def reopen(self, key: str, modified: float) -> bool:
+        """
+        Put a done job back to pending when its source was modified after
+        it was completed; True if it was reopened. Other machines see the
+        newer 'updated' and leave it alone.
+        """
+        with self._transaction() as db:
+            return db.execute(
+                "UPDATE jobs SET state = 'pending', attempts = 0, updated = ? "
+                "WHERE key = ? AND state = 'done' AND updated < ?",
+                (time.time(), key, modified),
+            ).rowcount == 1
+
+    def reset_failed(self, folder: Optional[str] = None) -> int:
+        """Reopen failed jobs (optionally within `folder`) with fresh attempts; how many."""
+        with self._transaction() as db:
+            return db.execute(
+                "UPDATE jobs SET state = 'pending', attempts = 0, owner = NULL, "
+                "lease_expires = NULL, updated = ? "
+                "WHERE state = 'failed' AND (? IS NULL OR folder = ?)",
+                (time.time(), folder, folder),
+            ).rowcount
+
+    # ------------------------------------------------------------------ #
+    # Inspection
+    # ------------------------------------------------------------------ #
+    def state(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM jobs WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def counts(self, folder: Optional[str] = None) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) FROM jobs WHERE ? IS NULL OR folder = ? GROUP BY state",
+                (folder, folder),
+            ).fetchall()
+        return dict(rows)
+
+
+# --------------------------------------------------------------------------- #
+# Multi-process exercise
+# --------------------------------------------------------------------------- #
+def _demo_worker(path: str, idx: int, results) -> None:
+    queue = LeaseQueue(Path(path), owner=f"demo-{idx}", lease_seconds=1.0)
+    done = []
+    with queue.heartbeats(interval=0.3):
+        while True:
+            key = queue.claim_next()
+            if key is None:
+                if not queue.counts().get("leased"):
+                    break
+                # Others still hold leases; one may expire and need taking over
+                time.sleep(0.2)
+                continue
+            if idx == 0 and not done:
+                # Die holding a lease; another process must reclaim it
+                results.put((idx, done, key))
+                results.close()
+                results.join_thread()
+                os._exit(1)
+            time.sleep(0.005)
+            if queue.complete(key):
+                done.append(key)
+    results.put((idx, done, None))
+
+
+def main(argv=None) -> int:
+    import multiprocessing as mp
+    import tempfile
+
+    args = argv if argv is not None else sys.argv[1:]
+    processes = int(args[0]) if len(args) > 0 else 4
+    jobs = int(args[1]) if len(args) > 1 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "queue.db"
+        LeaseQueue(path).enqueue("demo", {f"{9000 + i}_1A": f"{9000 + i}-1A-XRF.xlsx"
+                                          for i in range(jobs)})
+        ctx = mp.get_context("spawn")
+        results = ctx.Queue()
+        procs = [ctx.Process(target=_demo_worker, args=(str(path), i, results))
+                 for i in range(processes)]
+        for p in procs:
+            p.start()
+        reports = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+        counts = LeaseQueue(path).counts()
+    completed = [key for _, keys, _ in reports for key in keys]
+    abandoned = [key for _, _, key in reports if key]
+    print(f"{processes} processes, {jobs} jobs: {len(completed)} completions, "
+          f"{len(set(completed))} distinct, abandoned {abandoned} and reclaimed; states {counts}")
+    ok = len(completed) == len(set(completed)) == jobs and counts == {"done": jobs}
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# metrics.py
+"""
+Timing spans written as JSON lines, plus an end-of-run summary.
+
+    with metrics.span("export", file=src.name) as sp:
+        ...
+        sp["rows"] = rows
+
+Each span becomes one line in the metrics file, e.g.
+{"ts": ..., "run": ..., "pid": ..., "stage": "export", "seconds": 1.42,
+ "outcome": "ok", "file": "1001-1A-XRF.xlsx", "rows": 812}
+
+Spans raising an exception get outcome "error". Converter workers call
+buffer() so their spans are collected with drain() and sent back to the
+parent with each result; only the parent process writes the file.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Metrics:
+    def __init__(self):
+        self.run_id: Optional[str] = None
+        self.path: Optional[Path] = None
+        self._fh = None
+        self._lock = threading.Lock()
+        self._buffer: Optional[List[dict]] = None
+        self._durations: Dict[str, List[float]] = {}
+        self._outcomes: Dict[str, Dict[str, int]] = {}
+        self._started = time.perf_counter()
+
+    def open(self, path: Optional[Path], run_id: Optional[str] = None) -> None:
+        """Start a run; spans are appended to `path` (None = summary only)."""
+        self.close()
+        self.run_id = run_id or time.strftime("%Y%m%dT%H%M%S")
+        self.path = path
+        self._durations.clear()
+        self._outcomes.clear()
+        self._started = time.perf_counter()
+        if path:
+            try:
+                self._fh = open(path, "a", encoding="utf-8")
+            except OSError as e:
+                logger.warning("Metrics file %s not writable: %s", path, e)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh:
+                self._fh.close()
+                self._fh = None
+
+    def buffer(self) -> None:
+        """Hold spans in memory for drain() instead of writing them."""
+        self._buffer = []
+
+    def drain(self) -> List[dict]:
+        with self._lock:
+            out = self._buffer or []
+            if self._buffer is not None:
+                self._buffer = []
+        return out
+
+    def emit(self, record: dict) -> None:
+        """Record one finished span (also used for spans from workers)."""
+        with self._lock:
+            if self._buffer is not None:
+                self._buffer.append(record)
+                return
+            stage = record["stage"]
+            self._durations.setdefault(stage, []).append(record["seconds"])
+            outcomes = self._outcomes.setdefault(stage, {})
+            outcome = record.get("outcome", "ok")
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            if self._fh:
+                self._fh.write(json.dumps({"run": self.run_id, **record}, default=str) + "\n")
+                self._fh.flush()
+
+    @contextmanager
+    def span(self, stage: str, **attrs) -> Iterator[dict]:
+        """Time the block; set keys on the yielded dict to add attributes."""
+        attrs.setdefault("outcome", "ok")
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException:
+            attrs["outcome"] = "error"
+            raise
+        finally:
+            self.emit({
+                "ts": round(time.time(), 3),
+                "pid": os.getpid(),
+                "stage": stage,
+                "seconds": round(time.perf_counter() - start, 4),
+                **attrs,
+            })
+
+    def summary(self) -> str:
+        """Per-stage table of busy time, sorted by where the time went."""
+        with self._lock:
+            stages = {k: sorted(v) for k, v in self._durations.items()}
+            outcomes = {k: dict(v) for k, v in self._outcomes.items()}
+        if not stages:
+            return "no timing spans recorded"
+        wall = time.perf_counter() - self._started or 1.0
+        # Stages nest and run concurrently, so "% wall" can add up past 100
+        lines = [f"Timing summary ({wall:.1f}s wall clock):",
+                 f"  {'stage':<14}{'count':>7}{'total s':>10}{'% wall':>8}{'mean s':>9}{'p95 s':>9}  outcomes"]
+        for stage, values in sorted(stages.items(), key=lambda kv: -sum(kv[1])):
+            total = sum(values)
+            p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+            outs = ", ".join(f"{k} {n}" for k, n in sorted(outcomes.get(stage, {}).items()))
+            lines.append(f"  {stage:<14}{len(values):>7}{total:>10.2f}{total / wall:>8.0%}"
+                         f"{total / len(values):>9.3f}{p95:>9.3f}  {outs}")
+        return "\n".join(lines)
+
+
+# Process-wide instance used by the converters, gateways and CLI
+metrics = Metrics()
@@ -1,23 +1,36 @@
 # mock_sharepoint_gateway.py
+import json
 import logging
+import os
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple, Union
 
-from office365.sharepoint.folders.folder import Folder  # type: ignore
+if TYPE_CHECKING:  # office365 is not needed to run the mock
+    from office365.sharepoint.folders.folder import Folder  # type: ignore
+
+from py_files.file_copy import fast_copy
+from py_files.metrics import metrics
+from py_files.utils import PDF_SUFFIX, SOURCE_EXTENSIONS, DownloadFailed, SourceInfo
 
 logger = logging.getLogger(__name__)
 
 class MockSharePointGateway:
     """
     Mocks SharePoint operations by using a local filesystem directory structure.
+
+    Transfers go through fast_copy, so no file is read into memory. With
+    'local_read_in_place' the sources are handed to the converter where they
+    are instead of being copied at all.
     """
     def __init__(self, cfg: dict):
         self.local_root = Path(cfg.get('local_root', '.'))
         self.output_folder = Path(cfg.get('local_output', 'output'))
+        self.hardlinks = cfg.get('local_hardlinks', True)
+        self.read_in_place = cfg.get('local_read_in_place', False)
         self.output_folder.mkdir(parents=True, exist_ok=True)
         logger.info("Using local mock root: %s", self.local_root)
 
-    def list_immediate_subfolders(self) -> List[Folder]:
+    def list_immediate_subfolders(self) -> List["Folder"]:
         class DummyFolder:
             def __init__(self, path):
                 self.name = path.name
@@ -29,18 +42,88 @@ class MockSharePointGateway:
         folder = self.local_root / Path(rel_url).name
         return any(p.name.lower().endswith('_lease_leadpaint_xrf.pdf') for p in folder.rglob('*_lease_leadpaint_xrf.pdf'))
 
-    def download_sources(self, rel_url: str, dest: Path) -> List[Path]:
-        # Download only from the specific local folder
+    def list_completed_pdfs(self) -> List[str]:
+        """Paths of every *_lease_leadpaint_xrf.pdf under local_root and local_output."""
+        roots = [self.local_root]
+        try:
+            self.output_folder.resolve().relative_to(self.local_root.resolve())
+        except ValueError:
+            roots.append(self.output_folder)
+        end = f"{PDF_SUFFIX}.pdf"
+        found: List[str] = []
+        with metrics.span("list.pdfs") as sp:
+            for root in roots:
+                for dirpath, _, files in os.walk(root):
+                    found.extend(os.path.join(dirpath, f) for f in files if f.lower().endswith(end))
+            sp["pdfs"] = len(found)
+        return found
+
+    def list_changes(self, token: Optional[str]
+                     ) -> Tuple[Optional[Dict[str, List[SourceInfo]]], str]:
+        """
+        Sources added or modified since `token`, by folder, plus the next
+        token. The token is a snapshot of every source's size and mtime,
+        and changes are the difference from it. None for a missing or
+        unreadable token means list everything.
+        """
+        listing = {str(p): self.list_sources(str(p))
+                   for p in self.local_root.iterdir() if p.is_dir()}
+        snapshot = {info.url: [info.size, info.modified]
+                    for infos in listing.values() for info in infos}
+        new_token = json.dumps(snapshot)
+        try:
+            old = json.loads(token) if token else None
+        except ValueError:
+            old = None
+        if old is None:
+            return None, new_token
+        changed = {}
+        for rel, infos in listing.items():
+            fresh = [info for info in infos if old.get(info.url) != snapshot[info.url]]
+            if fresh:
+                changed[rel] = fresh
+        return changed, new_token
+
+    def list_sources(self, rel_url: str) -> List[SourceInfo]:
+        """Name, size and mtime of each source in the folder, without reading it."""
         src_folder = self.local_root / Path(rel_url).name
-        paths: List[Path] = []
-        for p in src_folder.iterdir():
-            if p.suffix.lower() in ('.xls', '.xlsx', '.csv'):
-                dst = dest / p.name
-                dst.write_bytes(p.read_bytes())
-                paths.append(dst)
-        return paths
+        infos: List[SourceInfo] = []
+        with os.scandir(src_folder) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.lower().endswith(SOURCE_EXTENSIONS):
+                    st = entry.stat()
+                    infos.append(SourceInfo(entry.name, entry.path, st.st_size, st.st_mtime))
+        return infos
+
+    def download_sources(self, rel_url: str, dest: Path,
+                         sources: Optional[List[SourceInfo]] = None
+                         ) -> Iterator[Union[Path, DownloadFailed]]:
+        # Download only from the specific local folder (or just `sources`, which
+        # may span folders); yields each file as soon as it is copied so callers
+        # can start early, or a DownloadFailed for one that could not be copied
+        if sources is None:
+            sources = self.list_sources(rel_url)
+        for info in sources:
+            if self.read_in_place:
+                yield Path(info.url)
+                continue
+            dst = dest / info.name
+            try:
+                with metrics.span("download", file=info.name, bytes=info.size) as sp:
+                    sp["method"] = fast_copy(Path(info.url), dst, link=self.hardlinks)
+            except OSError as e:
+                logger.error("Download of %s failed: %s", info.name, e)
+                yield DownloadFailed(info, str(e))
+                continue
+            yield dst
+
+    def list_outputs(self) -> Dict[str, int]:
+        """Name -> size of every file in the output folder."""
+        with os.scandir(self.output_folder) as it:
+            return {e.name: e.stat().st_size for e in it if e.is_file()}
 
     def upload_pdf(self, pdf_path: Path) -> None:
         dst = self.output_folder / pdf_path.name
-        dst.write_bytes(pdf_path.read_bytes())
-        logger.info("Mock uploaded %s to %s", pdf_path.name, dst)
\ No newline at end of file
+        with metrics.span("upload", file=pdf_path.name, bytes=pdf_path.stat().st_size) as sp:
+            sp["method"] = fast_copy(pdf_path, dst, link=self.hardlinks)
+        logger.info("Mock uploaded %s to %s", pdf_path.name, dst)
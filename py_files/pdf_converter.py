@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+pdf_converter.py
+
+Pure-Python converter that renders .xlsx/.csv sources straight to PDF,
+without Windows, pywin32 or Excel. Follows the same context-manager and
+convert(src) -> Optional[Path] contract as ExcelConverter and reproduces
+its page layout from config.py: margins, landscape one-page-wide fit,
+repeated bold header row, STRIPE_RGB banding and a "Page n of N" footer.
+
+Each source is streamed twice (measure, then draw), so memory use does
+not depend on the number of rows.
+"""
+import logging
+import re
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+from py_files.config import (
+    MARGIN_LEFT_RIGHT,
+    MARGIN_TOP,
+    MARGIN_BOTTOM,
+    FOOTER_MARGIN,
+    STRIPE_RGB,
+)
+from py_files.pdf_writer import PageCanvas, PdfWriter, fit_text, text_width
+from py_files.sheet_reader import iter_rows
+from py_files.utils import extract_ids, pdf_name
+
+logger = logging.getLogger(__name__)
+
+POINTS_PER_INCH = 72.0
+PAGE_SIZE = (11.0 * POINTS_PER_INCH, 8.5 * POINTS_PER_INCH)  # Letter, landscape
+FONT_SIZE = 10.0
+ROW_HEIGHT = 14.0
+CELL_PADDING = 3.0
+DEFAULT_COL_WIDTH = 48.0   # Excel's default 8.43-character column
+MAX_COL_WIDTH = 300.0
+MIN_SCALE = 0.10           # Excel will not shrink below 10%
+
+_NUMBER = re.compile(r"^[-+]?[$]?[\d,]*\.?\d+(?:[eE][-+]?\d+)?%?$")
+
+
+class SheetLayout(NamedTuple):
+    rows: int
+    cols: int
+    header_row: int
+    widths: List[float]
+    scale: float
+    rows_per_page: int
+    pages: int
+
+
+def measure(src: Path) -> Optional[SheetLayout]:
+    """
+    First streaming pass: find the header row (most populated cells, as in
+    ExcelConverter._format_sheet), autofit widths from the header row down
+    and work out the page count. Returns None for an empty sheet.
+    """
+    rows = 0
+    cols = 0
+    header_row = 1
+    maxpop = 0
+    widths: List[float] = []
+    for r, row in enumerate(iter_rows(src), start=1):
+        rows = r
+        cnt = sum(1 for v in row if v)
+        if cnt:
+            cols = max(cols, max(i for i, v in enumerate(row, start=1) if v))
+        if cnt > maxpop:
+            # Widths only count rows from the header down, so restart them
+            maxpop = cnt
+            header_row = r
+            widths = []
+        if maxpop and r >= header_row:
+            bold = r == header_row
+            for i, v in enumerate(row):
+                w = text_width(v, FONT_SIZE, bold) + 2 * CELL_PADDING if v else 0.0
+                if i >= len(widths):
+                    widths.append(w)
+                elif w > widths[i]:
+                    widths[i] = w
+    if not maxpop:
+        return None
+    widths = (widths + [0.0] * cols)[:cols]
+    widths = [min(w, MAX_COL_WIDTH) if w else DEFAULT_COL_WIDTH for w in widths]
+    printable_w = PAGE_SIZE[0] - 2 * MARGIN_LEFT_RIGHT * POINTS_PER_INCH
+    scale = max(MIN_SCALE, min(1.0, printable_w / sum(widths)))
+    printable_h = PAGE_SIZE[1] - (MARGIN_TOP + MARGIN_BOTTOM) * POINTS_PER_INCH
+    rows_per_page = max(2, int(printable_h // (ROW_HEIGHT * scale)))
+    return SheetLayout(rows, cols, header_row, widths, scale, rows_per_page,
+                       _count_pages(rows, header_row, rows_per_page))
+
+
+def _count_pages(rows: int, header_row: int, per_page: int) -> int:
+    """Pages needed when the header row is repeated at the top of each page."""
+    pages, slot = 1, 0
+    for r in range(1, rows + 1):
+        if slot == per_page:
+            pages += 1
+            slot = 1 if r > header_row else 0
+        slot += 1
+    return pages
+
+
+def render(src: Path, dest: Path) -> bool:
+    """
+    Render the first sheet of `src` into the PDF `dest`.
+    Returns False (and writes nothing) when the sheet is empty.
+    """
+    layout = measure(src)
+    if layout is None:
+        return False
+    scale = layout.scale
+    row_h = ROW_HEIGHT * scale
+    size = FONT_SIZE * scale
+    pad = CELL_PADDING * scale
+    col_w = [w * scale for w in layout.widths]
+    table_w = sum(col_w)
+    left = MARGIN_LEFT_RIGHT * POINTS_PER_INCH
+    top = PAGE_SIZE[1] - MARGIN_TOP * POINTS_PER_INCH
+    printable_w = PAGE_SIZE[0] - 2 * left
+
+    def draw_row(canvas: PageCanvas, slot: int, r: int, row: List[str]) -> None:
+        y = top - (slot + 1) * row_h
+        if r > layout.header_row and (r - layout.header_row) % 2 == 1:
+            canvas.fill_rect(left, y, table_w, row_h, STRIPE_RGB)
+        bold = r == layout.header_row
+        baseline = y + (row_h - size) / 2 + 0.22 * size
+        if r < layout.header_row:
+            # Title rows above the header overflow into empty cells like Excel
+            text = " ".join(v for v in row if v)
+            canvas.text(left + pad, baseline, fit_text(text, printable_w - 2 * pad, size, bold), size, bold)
+            return
+        items = []
+        x = left
+        for w, v in zip(col_w, row):
+            if v:
+                v = fit_text(v, w - 2 * pad, size, bold)
+                if not bold and _NUMBER.match(v):
+                    items.append((x + w - pad - text_width(v, size), v))
+                else:
+                    items.append((x + pad, v))
+            x += w
+        canvas.text_line(baseline, items, size, bold)
+
+    def footer(canvas: PageCanvas, page: int) -> None:
+        text = f"Page {page} of {layout.pages}"
+        w = text_width(text, FONT_SIZE)
+        canvas.text((PAGE_SIZE[0] - w) / 2, FOOTER_MARGIN * POINTS_PER_INCH, text, FONT_SIZE)
+
+    with PdfWriter(dest, PAGE_SIZE) as pdf:
+        page = 1
+        canvas = PageCanvas()
+        slot = 0
+        header: List[str] = []
+        for r, row in enumerate(iter_rows(src), start=1):
+            if r > layout.rows:
+                break
+            if slot == layout.rows_per_page:
+                footer(canvas, page)
+                pdf.add_page(canvas)
+                page += 1
+                canvas = PageCanvas()
+                slot = 0
+                if r > layout.header_row:
+                    draw_row(canvas, slot, layout.header_row, header)
+                    slot += 1
+            if r == layout.header_row:
+                header = row
+            draw_row(canvas, slot, r, row)
+            slot += 1
+        footer(canvas, page)
+        pdf.add_page(canvas)
+    return True
+
+
+class PdfConverter:
+    """
+    Context manager with the ExcelConverter interface that renders PDFs in
+    pure Python. Only .xlsx and .csv can be read; legacy .xls is skipped.
+    """
+    SUPPORTED_EXTENSIONS = (".xlsx", ".csv")
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def convert(self, src: Path) -> Optional[Path]:
+        """Convert a single spreadsheet to PDF."""
+        if src.suffix.lower() not in self.SUPPORTED_EXTENSIONS:
+            logger.warning("Unsupported file type for %s, skipping", src.name)
+            return None
+        prop, unit = extract_ids(src.stem)
+        if not prop or not unit:
+            logger.warning("Pattern not recognised for %s, skipping", src.name)
+            return None
+        final_name = pdf_name(prop, unit)
+        final_path = self.output_dir / final_name
+        temp_pdf = final_path.with_suffix(".pdf.part")
+        try:
+            if not render(src, temp_pdf):
+                logger.info("Skipping empty workbook %s", src.name)
+                return None
+            temp_pdf.replace(final_path)
+        except Exception as e:
+            logger.error("Error exporting %s: %s", src.name, e)
+            temp_pdf.unlink(missing_ok=True)
+            return None
+        logger.info("Created %s", final_name)
+        return final_path
@@ -0,0 +1,184 @@
+# pdf_writer.py
+"""
+Small dependency-free PDF writer.
+
+Pages are compressed and written to disk as soon as they are finished, so
+only the byte offsets of written objects are kept in memory. Text uses the
+standard Helvetica / Helvetica-Bold fonts (WinAnsi encoding), which every
+PDF viewer provides, so nothing has to be embedded.
+"""
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+# Helvetica and Helvetica-Bold advance widths (1/1000 em) for chars 32..126,
+# from the Adobe core font metrics.
+_HELVETICA_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+_HELVETICA_BOLD_WIDTHS = (
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+)
+_DEFAULT_WIDTH = 556
+
+FONT_REGULAR = "F1"
+FONT_BOLD = "F2"
+
+
+def _byte_table(widths: Sequence[int]) -> List[int]:
+    """Width per WinAnsi byte value, so text can be measured after encoding."""
+    table = [_DEFAULT_WIDTH] * 256
+    table[32:127] = widths
+    return table
+
+
+_REGULAR_TABLE = _byte_table(_HELVETICA_WIDTHS)
+_BOLD_TABLE = _byte_table(_HELVETICA_BOLD_WIDTHS)
+
+
+@lru_cache(maxsize=8192)
+def _units(text: str, bold: bool) -> int:
+    # Sheets repeat the same labels on every row, hence the cache
+    table = _BOLD_TABLE if bold else _REGULAR_TABLE
+    return sum(map(table.__getitem__, text.encode("cp1252", errors="replace")))
+
+
+def text_width(text: str, size: float, bold: bool = False) -> float:
+    """Width of `text` in points when set in Helvetica(-Bold) at `size`."""
+    return _units(text, bold) * size / 1000.0
+
+
+def fit_text(text: str, width: float, size: float, bold: bool = False) -> str:
+    """Trim `text` so it fits in `width` points."""
+    limit = width * 1000.0 / size
+    if _units(text, bold) <= limit:
+        return text
+    table = _BOLD_TABLE if bold else _REGULAR_TABLE
+    units = 0
+    for i, b in enumerate(text.encode("cp1252", errors="replace")):
+        units += table[b]
+        if units > limit:
+            return text[:i]
+    return text
+
+
+def _pdf_string(text: str) -> bytes:
+    raw = text.encode("cp1252", errors="replace")
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+class PageCanvas:
+    """Collects drawing operators for one page."""
+    def __init__(self):
+        self._ops: List[bytes] = []
+
+    def fill_rect(self, x: float, y: float, w: float, h: float,
+                  rgb: Sequence[int]) -> None:
+        r, g, b = (c / 255.0 for c in rgb)
+        self._ops.append(
+            f"{r:.3f} {g:.3f} {b:.3f} rg {x:.2f} {y:.2f} {w:.2f} {h:.2f} re f".encode()
+        )
+
+    def text(self, x: float, y: float, text: str, size: float, bold: bool = False) -> None:
+        if not text:
+            return
+        font = FONT_BOLD if bold else FONT_REGULAR
+        self._ops.append(
+            f"BT 0 0 0 rg /{font} {size:.2f} Tf {x:.2f} {y:.2f} Td ".encode()
+            + _pdf_string(text) + b" Tj ET"
+        )
+
+    def text_line(self, y: float, items: Sequence[Tuple[float, str]], size: float,
+                  bold: bool = False) -> None:
+        """Several strings on one baseline, sharing a single text object."""
+        if not items:
+            return
+        font = FONT_BOLD if bold else FONT_REGULAR
+        parts = [f"BT 0 0 0 rg /{font} {size:.2f} Tf".encode()]
+        for x, text in items:
+            parts.append(f"1 0 0 1 {x:.2f} {y:.2f} Tm ".encode() + _pdf_string(text) + b" Tj")
+        parts.append(b"ET")
+        self._ops.append(b" ".join(parts))
+
+    def getvalue(self) -> bytes:
+        return b"\n".join(self._ops)
+
+
+class PdfWriter:
+    """
+    Streams a PDF document to `path`.
+
+    Object numbers 1-4 are reserved for the catalog, page tree and the two
+    fonts; each page then takes a content stream and a page object.
+    """
+    def __init__(self, path: Path, page_size: Tuple[float, float]):
+        self.path = path
+        self.page_width, self.page_height = page_size
+        self._fh = None
+        self._offsets = {}
+        self._pages: List[int] = []
+        self._next_obj = 5
+
+    def __enter__(self):
+        self._fh = self.path.open("wb")
+        self._fh.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._write_obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._write_obj(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+                           b"/Encoding /WinAnsiEncoding >>")
+        self._write_obj(4, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold "
+                           b"/Encoding /WinAnsiEncoding >>")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                self._finish()
+        finally:
+            self._fh.close()
+            self._fh = None
+
+    def _write_obj(self, num: int, body: bytes) -> None:
+        self._offsets[num] = self._fh.tell()
+        self._fh.write(f"{num} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    def add_page(self, canvas: PageCanvas) -> None:
+        data = zlib.compress(canvas.getvalue())
+        content_num, page_num = self._next_obj, self._next_obj + 1
+        self._next_obj += 2
+        self._write_obj(
+            content_num,
+            f"<< /Length {len(data)} /Filter /FlateDecode >>\nstream\n".encode()
+            + data + b"\nendstream",
+        )
+        self._write_obj(
+            page_num,
+            (f"<< /Type /Page /Parent 2 0 R "
+             f"/MediaBox [0 0 {self.page_width:.2f} {self.page_height:.2f}] "
+             f"/Resources << /Font << /{FONT_REGULAR} 3 0 R /{FONT_BOLD} 4 0 R >> >> "
+             f"/Contents {content_num} 0 R >>").encode(),
+        )
+        self._pages.append(page_num)
+
+    def _finish(self) -> None:
+        kids = " ".join(f"{n} 0 R" for n in self._pages)
+        self._write_obj(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>".encode())
+        xref_at = self._fh.tell()
+        size = self._next_obj
+        lines = [f"xref\n0 {size}\n".encode(), b"0000000000 65535 f \n"]
+        for num in range(1, size):
+            lines.append(f"{self._offsets[num]:010d} 00000 n \n".encode())
+        self._fh.write(b"".join(lines))
+        self._fh.write(
+            f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode()
+        )
@@ -0,0 +1,504 @@
+# pipeline.py
+"""
+Staged download -> convert -> upload pipeline over one or more source folders.
+
+Each stage runs concurrently and hands work on through bounded queues, so
+a slow stage applies backpressure to the one before it instead of letting
+files pile up on disk or in memory:
+
+    download thread --(convert_q)--> converter pool --(upload_q)--> upload threads
+
+Sources from every folder passed to run_all() are merged into one queue
+and ordered longest-first by a CostModel, so one folder of huge workbooks
+neither holds up the others nor leaves a single worker finishing alone.
+
+The converter pool is only ever touched from the thread calling run().
+Works with any gateway exposing list_sources(), download_sources() and
+upload_pdf().
+"""
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from py_files.conversion_cache import ConversionCache
+from py_files.lease_queue import CLAIMED, LeaseQueue
+from py_files.metrics import metrics
+from py_files.preflight import check as preflight_check, check_name
+from py_files.quarantine import Quarantine
+from py_files.run_journal import CONVERTED, DOWNLOADED, UPLOADED, RunJournal
+from py_files.scheduler import CostModel
+from py_files.upload_manifest import UploadManifest
+from py_files.utils import (
+    DownloadFailed, SourceInfo, extract_ids, is_pending, key_from_pdf, pdf_name, source_key,
+)
+from py_files.worker_pool import ConverterPool
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class Job(NamedTuple):
+    src: Path
+    key: Optional[str] = None           # conversion cache key
+    cached_pdf: Optional[Path] = None   # set when served from the cache
+    info: Optional[SourceInfo] = None   # listing metadata, for quarantining
+    folder: str = ""                    # rel_path the source was listed in
+    rejected: Optional[str] = None      # preflight's reason it cannot convert
+    failed: Optional[str] = None        # download error; never reaches a converter
+
+
+@dataclass
+class PipelineStats:
+    listed: int = 0
+    queued: int = 0         # pending units scheduled for this run
+    downloaded: int = 0
+    cached: int = 0
+    converted: int = 0
+    skipped: int = 0
+    rejected: int = 0       # failed preflight, never sent to a converter
+    failed: int = 0
+    quarantined: int = 0
+    elsewhere: int = 0      # units leased or finished by another machine
+    resumed: int = 0        # converted in an earlier run, only uploaded now
+    uploaded: int = 0
+    unchanged: int = 0      # uploads skipped, the destination already matched
+    upload_failed: int = 0
+    errors: List[str] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @property
+    def processed(self) -> int:
+        """Scheduled units that have reached a final state."""
+        return (self.cached + self.converted + self.skipped + self.rejected
+                + self.failed + self.elsewhere)
+
+    def summary(self) -> str:
+        return (f"{self.listed} listed, {self.downloaded} downloaded, {self.cached} cached, "
+                f"{self.converted} converted, {self.skipped} skipped, {self.rejected} rejected, "
+                f"{self.failed} failed, {self.quarantined} quarantined, {self.elsewhere} elsewhere, "
+                f"{self.resumed} resumed, {self.uploaded} uploaded, {self.unchanged} unchanged, "
+                f"{self.upload_failed} upload failures")
+
+
+class Pipeline:
+    """
+    :param gateway: SharePointGateway or MockSharePointGateway.
+    :param pool: An entered ConverterPool (create with isolate=True).
+    :param cache: Optional ConversionCache consulted before converting.
+    :param upload: Push finished PDFs through gateway.upload_pdf.
+    :param upload_workers: Concurrent upload threads.
+    :param queue_size: Capacity of each inter-stage queue.
+    :param quarantine: Sources that hung or crashed a worker; skipped while
+                       unchanged, and added to when it happens again.
+    :param lease_queue: Shared queue; each unit is leased just before it is
+                        downloaded so several machines can split a folder.
+    :param journal: RunJournal recording each unit's transitions; units it
+                    shows as converted but not uploaded are only uploaded.
+    :param cost_model: Orders the merged queue longest-first and learns from
+                       each conversion; defaults to an in-memory model.
+    :param preflight: Run preflight.check on each download and keep sources
+                      that cannot convert away from the converter pool.
+    :param rejections: Sources preflight rejected after downloading them;
+                       skipped without a download while unchanged.
+    :param manifest: UploadManifest; PDFs the destination already holds
+                     unchanged are not uploaded again.
+    """
+    def __init__(self, gateway, pool: ConverterPool, cache: Optional[ConversionCache] = None,
+                 upload: bool = True, upload_workers: int = 2, queue_size: int = 8,
+                 quarantine: Optional[Quarantine] = None,
+                 lease_queue: Optional[LeaseQueue] = None,
+                 journal: Optional[RunJournal] = None,
+                 cost_model: Optional[CostModel] = None,
+                 preflight: bool = True,
+                 manifest: Optional[UploadManifest] = None,
+                 rejections: Optional[Quarantine] = None):
+        self.gateway = gateway
+        self.pool = pool
+        self.cache = cache
+        self.quarantine = quarantine
+        self.lease_queue = lease_queue
+        self.journal = journal
+        self.cost_model = cost_model or CostModel(path=None)
+        self.preflight = preflight
+        self.manifest = manifest
+        self.rejections = rejections
+        self._staging: Optional[Path] = None
+        self._held: set = set()
+        self._total = 0
+        self.upload = upload
+        self.upload_workers = max(1, int(upload_workers))
+        self.queue_size = max(1, int(queue_size))
+
+    def run(self, rel_path: str, done_map: Dict[str, bool]) -> PipelineStats:
+        return self.run_all([rel_path], done_map)[rel_path]
+
+    def run_all(self, rel_paths: List[str], done_map: Dict[str, bool],
+                sources: Optional[Dict[str, List[SourceInfo]]] = None) -> Dict[str, PipelineStats]:
+        """
+        Convert every pending source of `rel_paths` as one scheduled run.
+        `sources` replaces the listing of the folders it covers with only
+        what changed since the last run (ChangeTracker); those are converted
+        even when their unit is already complete.
+        """
+        if self.lease_queue is None:
+            return self._run(rel_paths, done_map, sources)
+        try:
+            with self.lease_queue.heartbeats():
+                return self._run(rel_paths, done_map, sources)
+        finally:
+            # Leases of units that never finished (download errors, early stop)
+            for key in list(self._held):
+                self._release(key, failed=False)
+
+    def _run(self, rel_paths: List[str], done_map: Dict[str, bool],
+             sources: Optional[Dict[str, List[SourceInfo]]]) -> Dict[str, PipelineStats]:
+        stats = {rel: PipelineStats() for rel in rel_paths}
+        for rel in rel_paths:
+            self._out_dir(rel).mkdir(parents=True, exist_ok=True)
+        resumed = [(rel, pdf) for rel in rel_paths for pdf in self._resume(rel, done_map)]
+        convert_q: queue.Queue = queue.Queue(self.queue_size)
+        upload_q: queue.Queue = queue.Queue(self.queue_size)
+        with tempfile.TemporaryDirectory(prefix="lp_src_") as tmp:
+            self._staging = Path(tmp)
+            downloader = threading.Thread(
+                target=self._download_stage,
+                args=(rel_paths, Path(tmp), done_map, convert_q, stats, sources),
+                name="download", daemon=True,
+            )
+            uploaders = [
+                threading.Thread(target=self._upload_stage, args=(upload_q, stats),
+                                 name=f"upload-{i}", daemon=True)
+                for i in range(self.upload_workers if self.upload else 0)
+            ]
+            for t in [downloader] + uploaders:
+                t.start()
+            for rel, pdf in resumed:
+                stats[rel].incr("resumed")
+                upload_q.put((rel, pdf))
+            try:
+                self._convert_stage(done_map, convert_q, upload_q, stats)
+            finally:
+                for _ in uploaders:
+                    upload_q.put(_DONE)
+                for t in uploaders:
+                    t.join()
+                # Unblock the downloader if conversion stopped early
+                while downloader.is_alive():
+                    try:
+                        convert_q.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+                self.cost_model.save()
+                if self.manifest is not None:
+                    self.manifest.save()
+        return stats
+
+    @staticmethod
+    def _out_dir(rel_path: str) -> Path:
+        return Path(rel_path) / "automation_output"
+
+    def _resume(self, rel_path: str, done_map: Dict[str, bool]) -> List[Path]:
+        """
+        PDFs an interrupted run converted but never uploaded. Their units are
+        marked done so they are not downloaded again; if the PDF has since
+        gone missing the unit is reopened for conversion instead.
+        """
+        if self.journal is None or not self.upload:
+            return []
+        resumed = []
+        for key, pdf in self.journal.awaiting_upload(rel_path):
+            if pdf.exists():
+                done_map[key] = True
+                resumed.append(pdf)
+            else:
+                logger.warning("Journalled %s is missing; converting %s again", pdf, key)
+                done_map[key] = False
+        if resumed:
+            print(f"Resuming {len(resumed)} upload(s) from the run journal")
+        return resumed
+
+    def _record(self, folder: str, key: Optional[str], event: str,
+                path: Optional[Path] = None) -> None:
+        if self.journal is not None and key:
+            self.journal.record(folder, key, event, path, upload=self.upload)
+
+    # ------------------------------------------------------------------ #
+    # Scheduling
+    # ------------------------------------------------------------------ #
+    def _schedule(self, rel_paths: List[str], done_map: Dict[str, bool],
+                  stats: Dict[str, PipelineStats],
+                  sources: Optional[Dict[str, List[SourceInfo]]] = None
+                  ) -> List[Tuple[str, SourceInfo]]:
+        """Pending (folder, source) jobs of every folder, longest first."""
+        jobs: List[Tuple[str, SourceInfo]] = []
+        seen: Dict[str, str] = {}
+        for rel in rel_paths:
+            st = stats[rel]
+            changed = sources is not None and rel in sources
+            try:
+                # Filter on listing metadata so completed units are never downloaded
+                if changed:
+                    listed = sources[rel]
+                else:
+                    listed = self.gateway.list_sources(rel)
+            except Exception as e:
+                logger.error("Listing of %s failed: %s", rel, e)
+                st.errors.append(f"list: {e}")
+                continue
+            st.listed = len(listed)
+            for info in listed:
+                if self.preflight and source_key(info.name) is None:
+                    # Never downloaded; reported here so nothing vanishes silently
+                    reason = check_name(os.path.splitext(info.name)[0])
+                    logger.warning("Preflight rejected %s: %s", info.name, reason)
+                    st.incr("rejected")
+                    st.queued += 1
+                    continue
+                if changed:
+                    # Edited since its PDF was made, so that PDF is stale
+                    key = source_key(info.name)
+                    if key is None:
+                        continue
+                    if done_map.get(key):
+                        done_map[key] = False
+                    if self.lease_queue is not None:
+                        self.lease_queue.reopen(key, info.modified)
+                elif not is_pending(info.name, done_map):
+                    continue
+                if self.quarantine is not None and self.quarantine.contains(info):
+                    logger.warning("Skipping quarantined %s", info.name)
+                    st.incr("quarantined")
+                    continue
+                if self.preflight and self.rejections is not None and self.rejections.contains(info):
+                    logger.warning("Skipping %s: rejected by preflight and unchanged since",
+                                   info.name)
+                    st.incr("rejected")
+                    st.queued += 1
+                    continue
+                if info.name.lower() in seen:
+                    logger.warning("%s is in both %s and %s; converting it once",
+                                   info.name, seen[info.name.lower()], rel)
+                    continue
+                seen[info.name.lower()] = rel
+                jobs.append((rel, info))
+                st.queued += 1
+        jobs = self.cost_model.order(jobs)
+        self._total = sum(st.queued for st in stats.values())
+        if len(rel_paths) > 1:
+            print(f"Scheduled {self._total} file(s) from {len(rel_paths)} folders, longest first")
+        return jobs
+
+    # ------------------------------------------------------------------ #
+    # Stages
+    # ------------------------------------------------------------------ #
+    def _download_stage(self, rel_paths: List[str], dest: Path, done_map: Dict[str, bool],
+                        convert_q: queue.Queue, stats: Dict[str, PipelineStats],
+                        sources: Optional[Dict[str, List[SourceInfo]]] = None) -> None:
+        label = ", ".join(rel_paths)
+        try:
+            jobs = self._schedule(rel_paths, done_map, stats, sources)
+            folder_of = {info.name: rel for rel, info in jobs}
+            by_name = {info.name: info for _, info in jobs}
+            pending: Iterable[SourceInfo] = (info for _, info in jobs)
+            if self.lease_queue is not None:
+                pending = self._claimed(pending, folder_of, done_map, stats)
+            # Sources carry their own URLs, so one call covers every folder
+            for src in self.gateway.download_sources(label, dest, pending):
+                if isinstance(src, DownloadFailed):
+                    convert_q.put(Job(dest / src.info.name, info=src.info,
+                                      folder=folder_of[src.info.name], failed=src.error))
+                    continue
+                rel = folder_of[src.name]
+                stats[rel].incr("downloaded")
+                self._record(rel, source_key(src.name), DOWNLOADED, src)
+                if self.preflight:
+                    with metrics.span("preflight", file=src.name) as sp:
+                        reason = preflight_check(src)
+                        sp["outcome"] = "rejected" if reason else "ok"
+                    if reason:
+                        logger.warning("Preflight rejected %s: %s", src.name, reason)
+                        convert_q.put(Job(src, info=by_name.get(src.name), folder=rel,
+                                          rejected=reason))
+                        continue
+                prop, unit = extract_ids(src.stem)
+                key = cached = None
+                if self.cache:
+                    with metrics.span("cache.lookup", file=src.name) as sp:
+                        key = self.cache.key_for(src)
+                        cached = self.cache.get(key, self._out_dir(rel) / pdf_name(prop, unit))
+                        sp["outcome"] = "hit" if cached else "miss"
+                convert_q.put(Job(src, key, cached, by_name.get(src.name), rel))
+        except Exception as e:
+            logger.error("Download of %s failed: %s", label, e)
+            for st in stats.values():
+                st.errors.append(f"download: {e}")
+        finally:
+            convert_q.put(_DONE)
+
+    def _claimed(self, pending: Iterable[SourceInfo], folder_of: Dict[str, str],
+                 done_map: Dict[str, bool],
+                 stats: Dict[str, PipelineStats]) -> Iterator[SourceInfo]:
+        """
+        Yield only sources whose unit this machine leased. Consumed lazily by
+        download_sources, so leases are taken as the pipeline has room and
+        other machines pick up the rest of the queue meanwhile.
+        """
+        for info in pending:
+            key = source_key(info.name)
+            rel = folder_of[info.name]
+            state = self.lease_queue.try_claim(key, rel, info.name)
+            if state == CLAIMED:
+                self._held.add(key)
+                yield info
+                continue
+            if state == "failed":
+                logger.warning("Skipping %s: gave up after %d failed attempts "
+                               "(reopen with --reset-failed)", info.name,
+                               self.lease_queue.max_attempts)
+                stats[rel].incr("failed")
+                continue
+            if state == "done":
+                done_map[key] = True
+            logger.info("Skipping %s: %s by another machine", info.name, state)
+            stats[rel].incr("elsewhere")
+
+    def _release(self, key: Optional[str], failed: bool) -> None:
+        if self.lease_queue is not None and key in self._held:
+            self._held.discard(key)
+            self.lease_queue.release(key, failed=failed)
+
+    def _progress(self, job: Job, stats: Dict[str, PipelineStats]) -> str:
+        """'[overall n/N | folder n/N] name' prefix for a finished job."""
+        done = sum(st.processed for st in stats.values())
+        st = stats[job.folder]
+        prefix = f"[{done}/{self._total}"
+        if len(stats) > 1:
+            prefix += f" | {Path(job.folder).name} {st.processed}/{st.queued}"
+        return f"{prefix}] {job.src.name} ... "
+
+    def _convert_stage(self, done_map: Dict[str, bool], convert_q: queue.Queue,
+                       upload_q: queue.Queue, stats: Dict[str, PipelineStats]) -> None:
+        pool = self.pool
+        in_flight: Dict[Path, Job] = {}
+        feeding = True
+        while feeding or in_flight:
+            # Keep every worker busy plus one queued job each, no more
+            while feeding and len(in_flight) < pool.size * 2:
+                try:
+                    job = convert_q.get(timeout=0.2 if not in_flight else 0.01)
+                except queue.Empty:
+                    break
+                if job is _DONE:
+                    feeding = False
+                    break
+                if job.rejected:
+                    stats[job.folder].incr("rejected")
+                    if self.rejections is not None and job.info:
+                        self.rejections.add(job.info, job.rejected)
+                    print(self._progress(job, stats) + f"Rejected ({job.rejected})")
+                    if self._staging in job.src.parents:
+                        job.src.unlink(missing_ok=True)
+                    self._release(source_key(job.src.name), failed=True)
+                    self._folder_done(job, stats)
+                    continue
+                if job.failed:
+                    stats[job.folder].incr("failed")
+                    stats[job.folder].errors.append(f"download {job.src.name}: {job.failed}")
+                    print(self._progress(job, stats) + f"Failed (download: {job.failed})")
+                    self._release(source_key(job.src.name), failed=True)
+                    self._folder_done(job, stats)
+                    continue
+                if job.cached_pdf:
+                    stats[job.folder].incr("cached")
+                    print(self._progress(job, stats) + "Cached")
+                    self._finish(job.folder, job.cached_pdf, done_map, upload_q)
+                    self._folder_done(job, stats)
+                    continue
+                in_flight[job.src] = job
+                pool.submit(job.src)
+            if not in_flight:
+                continue
+            for res in pool.poll(timeout=0.2):
+                job = in_flight.pop(res.src)
+                st = stats[job.folder]
+                # The source copy is no longer needed; keeps temp disk bounded.
+                # Sources read in place (mock gateway) are not ours to delete.
+                if self._staging in res.src.parents:
+                    res.src.unlink(missing_ok=True)
+                if res.pdf:
+                    final = self._out_dir(job.folder) / res.pdf.name
+                    try:
+                        os.replace(res.pdf, final)
+                    except OSError:
+                        shutil.move(str(res.pdf), str(final))
+                    if self.cache and job.key:
+                        self.cache.put(job.key, final)
+                    if job.info and res.seconds is not None:
+                        self.cost_model.observe(job.info, res.seconds)
+                    st.incr("converted")
+                    print(self._progress(job, stats) + "Done")
+                    self._finish(job.folder, final, done_map, upload_q)
+                elif res.error:
+                    st.incr("failed")
+                    print(self._progress(job, stats) + f"Failed ({res.error})")
+                    if res.killed and self.quarantine is not None and job.info:
+                        self.quarantine.add(job.info, res.error)
+                        st.incr("quarantined")
+                    self._release(source_key(res.src.name), failed=True)
+                else:
+                    st.incr("skipped")
+                    print(self._progress(job, stats) + "Skipped")
+                    self._release(source_key(res.src.name), failed=True)
+                self._folder_done(job, stats)
+
+    @staticmethod
+    def _folder_done(job: Job, stats: Dict[str, PipelineStats]) -> None:
+        st = stats[job.folder]
+        if len(stats) > 1 and st.processed == st.queued:
+            print(f"Folder {job.folder} finished: {st.summary()}")
+
+    def _finish(self, folder: str, pdf: Path, done_map: Dict[str, bool],
+                upload_q: queue.Queue) -> None:
+        key = key_from_pdf(pdf.stem)
+        # Journalled first: a crash after this point only re-uploads
+        self._record(folder, key, CONVERTED, pdf)
+        done_map[key] = True
+        if self.lease_queue is not None and key in self._held:
+            self._held.discard(key)
+            if not self.lease_queue.complete(key):
+                logger.warning("Lease on %s expired before completion; kept the result", key)
+        if self.upload:
+            # Blocks when uploads fall behind, which throttles conversion
+            upload_q.put((folder, pdf))
+
+    def _upload_stage(self, upload_q: queue.Queue, stats: Dict[str, PipelineStats]) -> None:
+        while True:
+            item = upload_q.get()
+            if item is _DONE:
+                return
+            folder, pdf = item
+            try:
+                if self.manifest is not None and self.manifest.unchanged(self.gateway, pdf):
+                    logger.info("Skipping upload of unchanged %s", pdf.name)
+                    self._record(folder, key_from_pdf(pdf.stem), UPLOADED)
+                    stats[folder].incr("unchanged")
+                    continue
+                self.gateway.upload_pdf(pdf)
+                if self.manifest is not None:
+                    self.manifest.record(pdf)
+                self._record(folder, key_from_pdf(pdf.stem), UPLOADED)
+                stats[folder].incr("uploaded")
+            except Exception as e:
+                logger.error("Upload of %s failed: %s", pdf.name, e)
+                stats[folder].incr("upload_failed")
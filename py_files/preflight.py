@@ -0,0 +1,214 @@
+# preflight.py
+"""
+Cheap pure-Python checks that run before a source reaches a converter.
+
+Opening a workbook in Excel costs seconds, and a password prompt can hang
+a worker until the watchdog kills it. check() rejects the sources that
+could never convert, using only the filename and a read-only streaming
+look at the file:
+
+  * unrecognised filename, or a unit code not in valid_unit_codes();
+  * zero-byte files and sheets without a single non-blank cell;
+  * password-protected workbooks: an encrypted .xlsx is an OLE2 container
+    holding an EncryptedPackage stream instead of a zip, and an encrypted
+    .xls has a FILEPASS record at the start of its Workbook stream;
+  * files whose container or first sheet cannot be parsed.
+
+OLE2 files are checked by reading their directory sectors, so cell text
+never matters. Beyond that, legacy .xls (BIFF) contents are not parsed
+and Excel decides the rest. A .xls whose structure is protected without
+a password is also encrypted (with Excel's built-in default password)
+and is rejected too.
+"""
+import logging
+import re
+import struct
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+from xml.etree.ElementTree import ParseError
+
+from py_files.sheet_reader import SheetReadError, iter_rows
+from py_files.utils import extract_ids
+
+logger = logging.getLogger(__name__)
+
+OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+ZIP_MAGIC = b"PK\x03\x04"
+# Streams of an encrypted OOXML package (lower-cased directory names)
+_ENCRYPTED_STREAMS = ("encryptedpackage", "encryptioninfo")
+# Sector ids at or above this are markers (end of chain, free, FAT, DIFAT)
+_MAX_SECTOR = 0xFFFFFFFA
+_DIR_ENTRY = 128
+_STREAM, _ROOT = 2, 5
+# BIFF record types
+_BIFF_FILEPASS = 0x002F
+_BIFF_EOF = 0x000A
+# FILEPASS comes right after the globals BOF; this much always covers it
+_BIFF_HEAD = 4096
+
+
+def check(src: Path) -> Optional[str]:
+    """Why `src` cannot convert, or None if it should be sent to a converter."""
+    reason = check_name(src.stem)
+    if reason:
+        return reason
+    try:
+        size = src.stat().st_size
+        if size == 0:
+            return "empty file"
+        with open(src, "rb") as fh:
+            head = fh.read(8)
+        suffix = src.suffix.lower()
+        if head == OLE2_MAGIC:
+            with open(src, "rb") as fh:
+                try:
+                    ole = _OleFile(fh)
+                    if _ole_encrypted(ole):
+                        return "password protected"
+                except (ValueError, struct.error, IndexError) as e:
+                    return f"corrupt: OLE2 container: {e}"
+            if suffix == ".xlsx":
+                return "corrupt: OLE2 container named .xlsx"
+            return None
+        if suffix == ".xls":
+            # Excel also opens HTML/XML/CSV exports saved as .xls
+            return None
+        if suffix == ".xlsx" and not head.startswith(ZIP_MAGIC):
+            return "corrupt: not a zip container"
+        return _check_contents(src)
+    except OSError as e:
+        return f"unreadable: {e}"
+
+
+def check_name(stem: str) -> Optional[str]:
+    """Why a source file stem maps to no unit, or None."""
+    prop, unit = extract_ids(stem)
+    if not prop:
+        return "unrecognised filename"
+    if not unit:
+        m = re.search(r"-([^-]+)-XRF", stem)
+        if not m:
+            return "unrecognised filename"
+        return f"unknown unit code {m.group(1)!r}"
+    return None
+
+
+class _OleFile:
+    """
+    Just enough of a Compound File Binary reader to list the streams and
+    read the start of one: header, DIFAT, FAT, directory and mini stream.
+    Raises ValueError on a malformed container.
+    """
+    def __init__(self, fh: BinaryIO):
+        self.fh = fh
+        header = fh.read(512)
+        if len(header) < 512:
+            raise ValueError("truncated header")
+        self.sector_size = 1 << struct.unpack_from("<H", header, 0x1E)[0]
+        self.mini_size = 1 << struct.unpack_from("<H", header, 0x20)[0]
+        if self.sector_size not in (512, 4096):
+            raise ValueError(f"sector size {self.sector_size}")
+        n_fat, first_dir = struct.unpack_from("<II", header, 0x2C)
+        (self.mini_cutoff, self.first_minifat, _, first_difat,
+         n_difat) = struct.unpack_from("<IIIII", header, 0x38)
+        per_sector = self.sector_size // 4
+        difat = list(struct.unpack_from("<109I", header, 0x4C))
+        sector = first_difat
+        for _ in range(n_difat):
+            if sector >= _MAX_SECTOR:
+                break
+            ids = struct.unpack(f"<{per_sector}I", self._sector(sector))
+            difat.extend(ids[:-1])
+            sector = ids[-1]
+        self.fat: List[int] = []
+        for sector in difat[:n_fat]:
+            self.fat.extend(struct.unpack(f"<{per_sector}I", self._sector(sector)))
+        self.streams: Dict[str, Tuple[int, int]] = {}
+        self.root = (0, 0)
+        directory = b"".join(self._sector(s) for s in self._chain(first_dir, self.fat))
+        for pos in range(0, len(directory) - _DIR_ENTRY + 1, _DIR_ENTRY):
+            entry = directory[pos:pos + _DIR_ENTRY]
+            name_len = min(struct.unpack_from("<H", entry, 64)[0], 64)
+            kind = entry[66]
+            start, size = struct.unpack_from("<IQ", entry, 116)
+            if self.sector_size == 512:
+                size &= 0xFFFFFFFF  # high half is undefined in version 3 files
+            if kind == _ROOT:
+                self.root = (start, size)
+            elif kind == _STREAM:
+                name = entry[:max(0, name_len - 2)].decode("utf-16-le", "replace")
+                self.streams.setdefault(name.lower(), (start, size))
+
+    def _sector(self, sector: int) -> bytes:
+        self.fh.seek((sector + 1) * self.sector_size)
+        data = self.fh.read(self.sector_size)
+        if len(data) < self.sector_size:
+            raise ValueError(f"sector {sector} past end of file")
+        return data
+
+    @staticmethod
+    def _chain(start: int, table: List[int]) -> Iterator[int]:
+        sector, steps = start, 0
+        while sector < _MAX_SECTOR:
+            yield sector
+            sector = table[sector]
+            steps += 1
+            if steps > len(table):
+                raise ValueError("sector chain loops")
+
+    def read(self, name: str, limit: int) -> bytes:
+        """Up to `limit` bytes from the start of stream `name` (lower case)."""
+        start, size = self.streams[name]
+        want = min(size, limit)
+        if size < self.mini_cutoff:
+            table = [n for s in self._chain(self.first_minifat, self.fat)
+                     for n in struct.unpack(f"<{self.sector_size // 4}I", self._sector(s))]
+            root = list(self._chain(self.root[0], self.fat))
+            per_sector = self.sector_size // self.mini_size
+
+            def read_one(mini: int) -> bytes:
+                data = self._sector(root[mini // per_sector])
+                offset = (mini % per_sector) * self.mini_size
+                return data[offset:offset + self.mini_size]
+        else:
+            table = self.fat
+            read_one = self._sector
+        out = bytearray()
+        for sector in self._chain(start, table):
+            if len(out) >= want:
+                break
+            out += read_one(sector)
+        return bytes(out[:want])
+
+
+def _ole_encrypted(ole: _OleFile) -> bool:
+    """An encrypted OOXML package, or a BIFF workbook with a FILEPASS record."""
+    if any(name in ole.streams for name in _ENCRYPTED_STREAMS):
+        return True
+    name = "workbook" if "workbook" in ole.streams else "book"
+    if name not in ole.streams:
+        return False
+    data = ole.read(name, _BIFF_HEAD)
+    pos = 0
+    while pos + 4 <= len(data):
+        rtype, length = struct.unpack_from("<HH", data, pos)
+        if rtype == _BIFF_FILEPASS:
+            return True
+        if rtype == _BIFF_EOF:
+            return False
+        pos += 4 + length
+    return False
+
+
+def _check_contents(src: Path) -> Optional[str]:
+    """Stream the first sheet until a non-blank cell turns up."""
+    try:
+        for row in iter_rows(src):
+            if any(row):
+                return None
+    except (SheetReadError, ParseError, zipfile.BadZipFile, KeyError,
+            ValueError, EOFError) as e:
+        return f"corrupt: {e}"
+    return "empty sheet"
+
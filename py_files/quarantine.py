@@ -0,0 +1,67 @@
+# quarantine.py
+"""
+Persisted list of source files that hung or killed a converter worker.
+
+Quarantined sources are skipped by the pipeline until the file changes
+(different size or modified time) or its entry is removed from the JSON
+file, so one bad workbook cannot stall every run in a retry loop. The
+same list, saved to REJECTED_PATH, remembers sources preflight rejected
+after downloading them.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+from py_files.config import QUARANTINE_PATH
+from py_files.utils import SourceInfo
+
+logger = logging.getLogger(__name__)
+
+
+class Quarantine:
+    """
+    :param path: JSON file of {filename: {size, modified, reason, when}}.
+    :param label: What being listed means, for log messages.
+    """
+    def __init__(self, path: Path = QUARANTINE_PATH, label: str = "quarantined"):
+        self.path = path
+        self.label = label
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+        try:
+            self._entries = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable %s list %s: %s", label, path, e)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def contains(self, info: SourceInfo) -> bool:
+        """True while `info` is quarantined and unchanged since."""
+        with self._lock:
+            entry = self._entries.get(info.name.lower())
+        return bool(entry) and entry["size"] == info.size and entry["modified"] == info.modified
+
+    def add(self, info: SourceInfo, reason: str) -> None:
+        logger.error("%s %s: %s", self.label.capitalize(), info.name, reason)
+        with self._lock:
+            self._entries[info.name.lower()] = {
+                "name": info.name,
+                "size": info.size,
+                "modified": info.modified,
+                "reason": reason,
+                "when": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            data = json.dumps(self._entries, indent=1)
+        tmp = self.path.with_suffix(".tmp")
+        try:
+            tmp.write_text(data, encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("Could not save %s list %s: %s", self.label, self.path, e)
@@ -0,0 +1,332 @@
+# rest_client.py
+"""
+Thread-safe SharePoint REST client for bulk file transfer.
+
+office365's ClientContext queues requests on a single object and cannot be
+shared between threads, so file bodies are moved over a requests.Session
+instead: one keep-alive connection pool shared by every transfer thread,
+a bearer token taken from the same azure-identity credential, chunked
+streaming to disk and retry with backoff when SharePoint throttles.
+Large uploads go through an upload session in fixed-size chunks
+(upload_chunked); py_files/fake_sharepoint_server.py emulates those
+endpoints for offline checks.
+"""
+import logging
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Throttling / transient statuses worth retrying
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+_JSON_HEADERS = {"Content-Type": "application/json;odata=nometadata"}
+_BINARY_HEADERS = {"Content-Type": "application/octet-stream"}
+
+
+def _alias(value: str) -> str:
+    """A REST parameter alias value: quoted, with embedded quotes doubled."""
+    return quote("'" + value.replace("'", "''") + "'", safe="")
+
+
+@dataclass
+class TransferStats:
+    """Per-file (name, bytes, seconds) records plus aggregate rates."""
+    records: List[Tuple[str, int, float]] = field(default_factory=list)
+    retries: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, name: str, size: int, seconds: float) -> None:
+        with self._lock:
+            self.records.append((name, size, seconds))
+
+    def add_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def summary(self) -> str:
+        if not self.records:
+            return "no transfers"
+        total = sum(r[1] for r in self.records)
+        latencies = sorted(r[2] for r in self.records)
+        busy = sum(latencies)
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        rate = total / busy / 1024 if busy else 0.0
+        return (f"{len(self.records)} files, {total / 1048576:.1f} MB, "
+                f"{rate:.0f} KB/s per stream, latency p50 {p50:.2f}s p95 {p95:.2f}s, "
+                f"{self.retries} retries")
+
+
+class RestClient:
+    """
+    :param site_url: https://<tenant>/sites/<site>
+    :param credential: azure-identity credential (anything with get_token).
+    :param pool_size: Max keep-alive connections, i.e. useful concurrency.
+    :param max_retries: Attempts after the first on throttling/transient errors.
+    :param backoff: Base delay in seconds, doubled per attempt.
+    """
+    def __init__(self, site_url: str, credential, pool_size: int = 4,
+                 max_retries: int = 5, backoff: float = 1.0):
+        self.site_url = site_url.rstrip("/")
+        self.resource = "/".join(self.site_url.split("/")[:3])
+        self.credential = credential
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.download_stats = TransferStats()
+        self.upload_stats = TransferStats()
+        self._token = None
+        self._token_lock = threading.Lock()
+
+    def _auth_header(self) -> dict:
+        with self._token_lock:
+            if self._token is None or self._token.expires_on - 60 < time.time():
+                self._token = self.credential.get_token(f"{self.resource}/.default")
+            return {"Authorization": f"Bearer {self._token.token}"}
+
+    def file_url(self, server_relative_url: str) -> str:
+        """REST URL of a file's content, safe for names with quotes/#/%."""
+        return self._file_api(server_relative_url, "/$value")
+
+    def _file_api(self, server_relative_url: str, path: str = "") -> str:
+        return (f"{self.site_url}/_api/web/GetFileByServerRelativePath(decodedurl=@u)"
+                f"{path}?@u={_alias(server_relative_url)}")
+
+    def request(self, method: str, url: str, stream: bool = False,
+                stats: Optional[TransferStats] = None, **kwargs) -> requests.Response:
+        """Send a request, retrying throttled and transient failures."""
+        extra_headers = kwargs.pop("headers", {})
+        attempt = 0
+        while True:
+            headers = {"Accept": "application/json;odata=nometadata", **self._auth_header(),
+                       **extra_headers}
+            try:
+                resp = self.session.request(method, url, headers=headers, stream=stream,
+                                            timeout=(10, 120), **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._delay(attempt, None)
+                logger.warning("%s %s failed (%s), retrying in %.1fs", method, url, e, delay)
+            else:
+                if resp.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    resp.raise_for_status()
+                    return resp
+                delay = self._delay(attempt, resp.headers.get("Retry-After"))
+                logger.warning("%s %s returned %s, retrying in %.1fs",
+                               method, url, resp.status_code, delay)
+                resp.close()
+            if stats:
+                stats.add_retry()
+            time.sleep(delay)
+            attempt += 1
+
+    def _list_api(self, list_url: str, path: str = "") -> str:
+        """REST URL of `path` on the list at `list_url` (server-relative)."""
+        return f"{self.site_url}/_api/web/GetList(@l){path}?@l={_alias(list_url)}"
+
+    def _post_json(self, url: str, body: dict) -> dict:
+        resp = self.request("POST", url, json=body, headers=_JSON_HEADERS)
+        return resp.json()
+
+    def render_list_data(self, list_url: str, view_xml: str,
+                         folder_url: Optional[str] = None) -> Iterator[dict]:
+        """
+        Yield the rows of a CAML view over the list at `list_url`
+        (server-relative), following NextHref from page to page.
+        RenderListDataAsStream pages by item ID, so a RecursiveAll view
+        works on libraries past the 5000-item view threshold.
+        """
+        base = self._list_api(list_url, "/RenderListDataAsStream")
+        params = {"ViewXml": view_xml, "RenderOptions": 2}  # 2 = ListData only
+        if folder_url:
+            params["FolderServerRelativeUrl"] = folder_url
+        url = base
+        while url:
+            data = self._post_json(url, {"parameters": params})
+            yield from data.get("Row", [])
+            next_href = data.get("NextHref")
+            url = f"{base}&{next_href.lstrip('?')}" if next_href else None
+
+    def current_change_token(self, list_url: str) -> str:
+        resp = self.request("GET", self._list_api(list_url) + "&$select=CurrentChangeToken")
+        return resp.json()["CurrentChangeToken"]["StringValue"]
+
+    def get_changes(self, list_url: str, token: str, fetch_limit: int = 1000) -> Iterator[dict]:
+        """
+        Item adds, updates, renames and moves on the list since `token`,
+        fetched fetch_limit at a time. Raises requests.HTTPError when the
+        token is no longer valid (the change log is kept for ~60 days).
+        """
+        url = self._list_api(list_url, "/GetChanges")
+        while True:
+            query = {"Item": True, "Add": True, "Update": True, "Rename": True,
+                     "Move": True, "Restore": True, "FetchLimit": fetch_limit,
+                     "ChangeTokenStart": {"StringValue": token}}
+            changes = self._post_json(url, {"query": query}).get("value", [])
+            yield from changes
+            if len(changes) < fetch_limit:
+                return
+            token = changes[-1]["ChangeToken"]["StringValue"]
+
+    def get_items(self, list_url: str, ids: List[int], select: str,
+                  batch: int = 40) -> Iterator[dict]:
+        """Items by ID, `batch` IDs per request ($filter ... or ...)."""
+        base = self._list_api(list_url, "/items")
+        for i in range(0, len(ids), batch):
+            flt = " or ".join(f"ID eq {n}" for n in ids[i:i + batch])
+            resp = self.request("GET", f"{base}&$select={select}&$filter={quote(flt)}")
+            yield from resp.json().get("value", [])
+
+    def _delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff * (2 ** attempt) * (1 + random.random() / 2)
+
+    def download(self, server_relative_url: str, dest: Path, chunk_size: int = 1024 * 1024) -> Path:
+        """
+        Stream a file to `dest` in chunks; never holds the whole body.
+        A connection dropped mid-body restarts the file, within max_retries.
+        """
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            size = 0
+            resp = self.request("GET", self.file_url(server_relative_url), stream=True,
+                                stats=self.download_stats)
+            try:
+                with resp, open(dest, "wb") as fh:
+                    for chunk in resp.iter_content(chunk_size):
+                        fh.write(chunk)
+                        size += len(chunk)
+                break
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._delay(attempt, None)
+                logger.warning("Download of %s interrupted (%s), retrying in %.1fs",
+                               server_relative_url, e, delay)
+                self.download_stats.add_retry()
+                time.sleep(delay)
+                attempt += 1
+        elapsed = time.perf_counter() - start
+        self.download_stats.add(dest.name, size, elapsed)
+        logger.info("Downloaded %s (%d bytes in %.2fs, %.0f KB/s)",
+                    server_relative_url, size, elapsed, size / 1024 / elapsed if elapsed else 0.0)
+        return dest
+
+    def upload_chunked(self, folder_url: str, name: str, src: Path,
+                       chunk_size: int = 8 * 1024 * 1024) -> int:
+        """
+        Upload `src` to `folder_url`/`name` (server-relative) through an
+        upload session: StartUpload with the first chunk, ContinueUpload for
+        the middle ones, FinishUpload with the last. Only one chunk is held
+        in memory, and each chunk request is retried on its own, so a
+        throttled or dropped chunk never resends the ones before it. The
+        next chunk starts at the offset SharePoint reports back.
+
+        A chunk whose response was lost lands on the server, and its retry
+        is then refused for a stale offset. That chunk is taken as committed
+        and the next one is sent: its own offset check confirms the guess,
+        and the final chunk is confirmed by reading the file's Length back.
+
+        The session writes to a temporary name in the same folder, which is
+        moved over `name` only once it is complete. A session that fails for
+        good is cancelled, the temporary file deleted and the error
+        re-raised, so an earlier upload of `name` is never left truncated.
+
+        :param chunk_size: Bytes per request; `src` must be larger.
+        :return: Bytes uploaded.
+        """
+        size = src.stat().st_size
+        if size <= chunk_size:
+            raise ValueError(f"{src.name} ({size} bytes) fits in one {chunk_size}-byte chunk")
+        upload_id = uuid.uuid4()
+        session = f"uploadId=guid'{upload_id}'"
+        # Does not end in .pdf, so a leftover is never mistaken for output
+        part_name = f"{name}.{upload_id.hex[:8]}.part"
+        file_url = f"{folder_url.rstrip('/')}/{name}"
+        part_url = f"{folder_url.rstrip('/')}/{part_name}"
+        start = time.perf_counter()
+        # A session continues an existing file, so create it first
+        self.request("POST", f"{self.site_url}/_api/web/GetFolderByServerRelativePath(decodedurl=@f)"
+                             f"/Files/AddUsingPath(decodedurl=@n,overwrite=true)"
+                             f"?@f={_alias(folder_url)}&@n={_alias(part_name)}",
+                     stats=self.upload_stats)
+        offset = 0
+        chunks = 0
+        unconfirmed = False
+        try:
+            with open(src, "rb") as fh:
+                while True:
+                    fh.seek(offset)
+                    chunk = fh.read(chunk_size)
+                    last = offset + len(chunk) >= size
+                    if offset == 0:
+                        method = f"/StartUpload({session})"
+                    elif last:
+                        method = f"/FinishUpload({session},fileOffset={offset})"
+                    else:
+                        method = f"/ContinueUpload({session},fileOffset={offset})"
+                    try:
+                        resp = self.request("POST", self._file_api(part_url, method), data=chunk,
+                                            headers=_BINARY_HEADERS, stats=self.upload_stats)
+                    except requests.HTTPError:
+                        if unconfirmed:
+                            raise
+                        if last:
+                            if self._length(part_url) != size:
+                                raise
+                            logger.warning("%s: final chunk had already landed", part_url)
+                            break
+                        logger.warning("%s: chunk at %d refused, assuming it had landed",
+                                       part_url, offset)
+                        unconfirmed = True
+                        offset += len(chunk)
+                        continue
+                    unconfirmed = False
+                    chunks += 1
+                    if last:
+                        break
+                    offset = int(resp.json()["value"])
+            # SP.MoveOperations.Overwrite
+            self.request("POST", self._file_api(part_url, "/MoveTo(newurl=@n,flags=1)")
+                         + f"&@n={_alias(file_url)}", stats=self.upload_stats)
+        except Exception:
+            self._discard_upload(part_url, session)
+            raise
+        elapsed = time.perf_counter() - start
+        self.upload_stats.add(name, size, elapsed)
+        logger.info("Uploaded %s in %d chunks (%d bytes in %.2fs, %.0f KB/s)",
+                    file_url, chunks, size, elapsed, size / 1024 / elapsed if elapsed else 0.0)
+        return size
+
+    def _length(self, server_relative_url: str) -> int:
+        resp = self.request("GET", self._file_api(server_relative_url) + "&$select=Length")
+        return int(resp.json()["Length"])
+
+    def _discard_upload(self, part_url: str, session: str) -> None:
+        """Best effort: cancel the session, then delete its temporary file."""
+        try:
+            self.request("POST", self._file_api(part_url, f"/CancelUpload({session})"))
+        except requests.RequestException as e:
+            logger.debug("CancelUpload for %s failed: %s", part_url, e)
+        try:
+            self.request("DELETE", self._file_api(part_url), headers={"IF-MATCH": "*"})
+        except requests.RequestException as e:
+            logger.warning("Could not delete partial upload %s: %s", part_url, e)
@@ -0,0 +1,106 @@
+# run_journal.py
+"""
+Append-only, fsynced journal of per-unit state transitions.
+
+Every transition the pipeline makes (downloaded, converted, uploaded) is
+written as one JSON line and forced to disk before the run moves on, so a
+run that dies mid-folder can be resumed: on restart the journal is
+replayed and units that were converted but never uploaded are uploaded
+from automation_output instead of being converted again. Finished entries
+are compacted away at the end of each run.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from py_files.config import RUN_JOURNAL
+
+logger = logging.getLogger(__name__)
+
+DOWNLOADED = "downloaded"
+CONVERTED = "converted"
+UPLOADED = "uploaded"
+
+
+class RunJournal:
+    """
+    :param path: Journal file; replayed on open, appended to afterwards.
+    """
+    def __init__(self, path: Path = RUN_JOURNAL):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state: Dict[Tuple[str, str], dict] = {}
+        self._replay()
+        self._fh = open(path, "a", encoding="utf-8")
+
+    def _replay(self) -> None:
+        try:
+            fh = open(self.path, encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write
+                    continue
+                self._state[(entry["folder"], entry["key"])] = entry
+        if self._state:
+            logger.info("Replayed %d unit(s) from %s", len(self._state), self.path)
+
+    @staticmethod
+    def _finished(entry: dict) -> bool:
+        return entry["event"] == UPLOADED or (
+            entry["event"] == CONVERTED and not entry.get("upload", True)
+        )
+
+    def record(self, folder: str, key: str, event: str,
+               path: Optional[Path] = None, upload: bool = True) -> None:
+        """Append one transition and fsync it before returning."""
+        entry = {"ts": round(time.time(), 3), "folder": folder, "key": key, "event": event}
+        if path is not None:
+            entry["path"] = str(path)
+        if event == CONVERTED:
+            entry["upload"] = upload
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            previous = self._state.get((folder, key))
+            if event == UPLOADED and previous and "path" in previous:
+                entry.setdefault("path", previous["path"])
+            self._state[(folder, key)] = entry
+            self._fh.write(line)
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+
+    def awaiting_upload(self, folder: str) -> List[Tuple[str, Path]]:
+        """(key, pdf) of units converted in an earlier run but not uploaded."""
+        with self._lock:
+            return [
+                (key, Path(entry["path"]))
+                for (f, key), entry in self._state.items()
+                if f == folder and entry["event"] == CONVERTED and entry.get("upload", True)
+            ]
+
+    def compact(self) -> None:
+        """Rewrite the journal with only unfinished units (atomic replace)."""
+        with self._lock:
+            keep = [e for e in self._state.values() if not self._finished(e)]
+            self._state = {(e["folder"], e["key"]): e for e in keep}
+            self._fh.close()
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as fh:
+                fh.writelines(json.dumps(e) + "\n" for e in keep)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp, self.path)
+            self._fh = open(self.path, "a", encoding="utf-8")
+
+    def close(self) -> None:
+        self.compact()
+        with self._lock:
+            self._fh.close()
@@ -0,0 +1,114 @@
+# scan_index.py
+"""
+Persistent, incremental index of converted PDFs under each folder.
+
+For every directory the index stores its mtime, the matching PDF names
+and its subdirectories. A rescan only lists (os.scandir) directories whose
+mtime changed and merely stats the rest, which is what makes repeated
+scans cheap on network shares. Top-level folders are scanned in parallel,
+and results are memoised so menu redraws are answered from memory.
+"""
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from py_files.config import SCAN_INDEX
+from py_files.utils import PDF_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+_PDF_END = f"{PDF_SUFFIX}.pdf"
+
+
+class ScanIndex:
+    """
+    :param path: JSON file the per-directory entries are persisted to.
+    :param workers: Folders scanned concurrently.
+    """
+    def __init__(self, path: Path = SCAN_INDEX, workers: int = 8):
+        self.path = path
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._dirs: Dict[str, dict] = {}
+        self._memo: Dict[str, List[str]] = {}
+        self._dirty = False
+        try:
+            self._dirs = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable scan index %s: %s", path, e)
+
+    def _walk(self, d: str) -> List[str]:
+        try:
+            mtime = os.stat(d).st_mtime_ns
+        except OSError:
+            with self._lock:
+                if self._dirs.pop(d, None) is not None:
+                    self._dirty = True
+            return []
+        with self._lock:
+            entry = self._dirs.get(d)
+        if entry is None or entry["mtime_ns"] != mtime:
+            pdfs, subdirs = [], []
+            try:
+                with os.scandir(d) as it:
+                    for e in it:
+                        if e.is_dir(follow_symlinks=False):
+                            subdirs.append(e.name)
+                        elif e.name.lower().endswith(_PDF_END):
+                            pdfs.append(e.name)
+            except OSError as e:
+                logger.warning("Could not list %s: %s", d, e)
+            entry = {"mtime_ns": mtime, "pdfs": pdfs, "subdirs": subdirs}
+            with self._lock:
+                self._dirs[d] = entry
+                self._dirty = True
+        found = [os.path.join(d, name) for name in entry["pdfs"]]
+        for sub in entry["subdirs"]:
+            found.extend(self._walk(os.path.join(d, sub)))
+        return found
+
+    def scan(self, roots: Iterable[str], refresh: bool = False) -> Dict[str, List[str]]:
+        """
+        PDF paths under each root. Roots already memoised are served from
+        memory unless `refresh`; the rest are walked in parallel.
+        """
+        roots = list(roots)
+        todo = [r for r in roots if refresh or r not in self._memo]
+        if todo:
+            with ThreadPoolExecutor(min(self.workers, len(todo))) as pool:
+                for root, pdfs in zip(todo, pool.map(self._walk, todo)):
+                    self._memo[root] = pdfs
+            self.save()
+        return {r: self._memo[r] for r in roots}
+
+    def pdfs(self, root: str) -> List[str]:
+        return self.scan([root])[root]
+
+    def count(self, root: str) -> int:
+        return len(self.pdfs(root))
+
+    def invalidate(self, root: Optional[str] = None) -> None:
+        """Forget memoised results (all, or one root) so the next scan rechecks mtimes."""
+        if root is None:
+            self._memo.clear()
+        else:
+            self._memo.pop(root, None)
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._dirs)
+            self._dirty = False
+        tmp = self.path.with_suffix(".tmp")
+        try:
+            tmp.write_text(data, encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("Could not save scan index %s: %s", self.path, e)
@@ -0,0 +1,91 @@
+# scheduler.py
+"""
+Cost model and ordering for the cross-folder conversion queue.
+
+Jobs from every selected folder are merged into one list and converted
+longest-first: with the expensive workbooks started early, the last worker
+to finish is left holding a short job instead of a huge one.
+
+The estimate for a source is, in order of preference:
+  * its own conversion time from an earlier run, if size is unchanged;
+  * base + seconds-per-MB for its extension, learned from past runs
+    (a moving average seeded with DEFAULT_RATES).
+Row counts are not known before a file is downloaded, so size stands in
+for them.
+"""
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from py_files.config import COST_MODEL
+from py_files.utils import SourceInfo
+
+logger = logging.getLogger(__name__)
+
+# extension -> (fixed seconds per workbook, seconds per MB)
+DEFAULT_RATES = {
+    ".xlsx": (3.0, 2.0),
+    ".xls": (3.0, 2.5),
+    ".csv": (1.0, 0.5),
+}
+# Weight of each new observation in the per-extension average
+SMOOTHING = 0.2
+MAX_FILES = 20000
+
+
+def _ext(name: str) -> str:
+    return os.path.splitext(name)[1].lower()
+
+
+class CostModel:
+    """
+    :param path: JSON file the learned rates and timings persist in;
+                 None keeps them in memory only.
+    """
+    def __init__(self, path: Optional[Path] = COST_MODEL):
+        self.path = path
+        self.rates: Dict[str, List[float]] = {k: list(v) for k, v in DEFAULT_RATES.items()}
+        self.files: Dict[str, List[float]] = {}    # lower name -> [size, seconds]
+        self._dirty = False
+        if path and path.exists():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+                self.rates.update(data.get("rates", {}))
+                self.files = data.get("files", {})
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable cost model %s: %s", path, e)
+
+    def estimate(self, info: SourceInfo) -> float:
+        """Expected conversion seconds for `info`."""
+        seen = self.files.get(info.name.lower())
+        if seen and seen[0] == info.size:
+            return seen[1]
+        base, per_mb = self.rates.get(_ext(info.name), DEFAULT_RATES[".xlsx"])
+        return base + per_mb * info.size / 2 ** 20
+
+    def observe(self, info: SourceInfo, seconds: float) -> None:
+        """Learn from one finished conversion."""
+        self.files[info.name.lower()] = [info.size, round(seconds, 3)]
+        mb = info.size / 2 ** 20
+        ext = _ext(info.name)
+        if mb >= 0.05 and ext in self.rates:
+            base, per_mb = self.rates[ext]
+            sample = max(seconds - base, 0.0) / mb
+            self.rates[ext] = [base, round(per_mb + SMOOTHING * (sample - per_mb), 4)]
+        self._dirty = True
+
+    def order(self, jobs: List[Tuple[str, SourceInfo]]) -> List[Tuple[str, SourceInfo]]:
+        """(folder, source) jobs sorted longest-first; ties keep listing order."""
+        return sorted(jobs, key=lambda job: -self.estimate(job[1]))
+
+    def save(self) -> None:
+        if not self.path or not self._dirty:
+            return
+        if len(self.files) > MAX_FILES:
+            self.files = dict(list(self.files.items())[-MAX_FILES:])
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"rates": self.rates, "files": self.files}), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._dirty = False
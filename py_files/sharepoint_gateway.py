@@ -1,16 +1,46 @@
 # sharepoint_gateway.py
 import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+import requests
 from office365.sharepoint.client_context import ClientContext
 from office365.sharepoint.files.file import File
 from office365.sharepoint.folders.folder import Folder
-from azure.identity import DeviceCodeCredential  # updated import
 
-from py_files.config import PUBLIC_GRAPH_CLIENT_ID
+from py_files.auth import make_credential, site_scope
+from py_files.metrics import metrics
+from py_files.rest_client import RestClient
+from py_files.utils import PDF_SUFFIX, SOURCE_EXTENSIONS, DownloadFailed, SourceInfo
 
 logger = logging.getLogger(__name__)
 
+# Every item below the folder, only FileRef and FSObjType returned, in
+# pages of 5000 ordered by ID. There is deliberately no Where: filtering on
+# an unindexed column (FSObjType, FileLeafRef) hits the list view
+# threshold on large libraries, so folders and names are matched client-side.
+_RECURSIVE_ITEMS_VIEW = (
+    "<View Scope='RecursiveAll'><Query><OrderBy><FieldRef Name='ID'/></OrderBy></Query>"
+    "<ViewFields><FieldRef Name='FileRef'/><FieldRef Name='FSObjType'/></ViewFields>"
+    "<RowLimit Paged='TRUE'>5000</RowLimit></View>"
+)
+_CHANGED_ITEM_FIELDS = "ID,FSObjType,FileRef,FileLeafRef,File_x0020_Size,Modified"
+
+
+def _timestamp(value) -> float:
+    """SharePoint returns TimeLastModified as a datetime or ISO-8601 string."""
+    if value is None:
+        return 0.0
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return 0.0
+
+
 class SharePointGateway:
     """
     Encapsulates SharePoint Online operations.
@@ -20,13 +50,28 @@ class SharePointGateway:
         self.site_name = cfg["site"].strip("/")
         self.root_folder = cfg["root_folder"].rstrip("/")
         self.output_folder = cfg["output_folder"].rstrip("/")
-
-        client_id = cfg.get("auth", {}).get("client_id", PUBLIC_GRAPH_CLIENT_ID)
-        tenant_id = cfg.get("auth", {}).get("tenant_id", "common")
-        cred = DeviceCodeCredential(tenant_id=tenant_id, client_id=client_id)
+        self.site_path = f"/sites/{self.site_name}"
 
         site_url = f"https://{self.tenant}/sites/{self.site_name}"
+        # Cached, silently refreshed tokens; see py_files/auth.py
+        cred = make_credential(cfg.get("auth") or {}, site_scope(site_url))
+
         self.ctx = ClientContext(site_url).with_credentials(cred)
+        # ClientContext queues requests internally and is not thread-safe;
+        # the pipeline downloads and uploads from different threads.
+        self._lock = threading.Lock()
+        # File bodies go over a pooled, thread-safe REST session instead
+        self.download_workers = max(1, int(cfg.get("download_workers", 4)))
+        self.chunk_size = int(cfg.get("download_chunk_kb", 1024)) * 1024
+        # PDFs from this size up go through a chunked upload session
+        self.upload_chunk = int(cfg.get("upload_chunk_mb", 8)) * 1024 * 1024
+        self.session_threshold = int(cfg.get("upload_session_mb", 32)) * 1024 * 1024
+        self.rest = RestClient(
+            site_url,
+            cred,
+            pool_size=self.download_workers + int(cfg.get("upload_workers", 2)),
+            max_retries=int(cfg.get("http_retries", 5)),
+        )
         logger.info("Authenticated to %s", site_url)
 
     def list_immediate_subfolders(self) -> List[Folder]:
@@ -41,23 +86,157 @@ class SharePointGateway:
         self.ctx.execute_query()
         return any(f.name.lower().endswith("_lease_leadpaint_xrf.pdf") for f in folder.files)
 
-    def download_sources(self, rel_url: str, dest: Path) -> List[Path]:
-        folder = self.ctx.web.get_folder_by_server_relative_url(rel_url)
-        self.ctx.load(folder.files)
-        self.ctx.execute_query()
+    def _server_relative(self, url: str) -> str:
+        return url if url.startswith("/") else f"{self.site_path}/{url}"
 
-        files: List[Path] = []
-        for item in folder.files:
-            if not item.name.lower().endswith((".xls", ".xlsx", ".csv")):
+    def _library_of(self, folder_url: str) -> str:
+        """Server-relative URL of the document library holding `folder_url`."""
+        rest = folder_url[len(self.site_path):].strip("/")
+        return f"{self.site_path}/{rest.split('/')[0]}"
+
+    def list_completed_pdfs(self) -> List[str]:
+        """
+        Server-relative URLs of every *_lease_leadpaint_xrf.pdf under the
+        root folder (and the output folder, when it lies outside the root),
+        each fetched as one paged recursive query instead of one request
+        per folder.
+        """
+        root = self._server_relative(self.root_folder)
+        output = self._server_relative(self.output_folder)
+        folders = [root]
+        if not (output == root or output.startswith(root + "/")):
+            folders.append(output)
+        end = f"{PDF_SUFFIX}.pdf"
+        found: List[str] = []
+        with metrics.span("list.pdfs") as sp:
+            for folder in folders:
+                for row in self.rest.render_list_data(self._library_of(folder),
+                                                      _RECURSIVE_ITEMS_VIEW, folder):
+                    ref = row.get("FileRef", "")
+                    # FSObjType 1 is a folder, which may well be named *.pdf
+                    if str(row.get("FSObjType", "0")) == "0" and ref.lower().endswith(end):
+                        found.append(ref)
+            sp["pdfs"] = len(found)
+        logger.info("Listed %d completed PDFs under %s", len(found), ", ".join(folders))
+        return found
+
+    def list_changes(self, token: Optional[str]
+                     ) -> Tuple[Optional[Dict[str, List[SourceInfo]]], str]:
+        """
+        Sources added or modified under the root folder since `token`,
+        grouped by immediate subfolder, plus the token to pass next time.
+        The first element is None when there is no usable token (first run,
+        or expired), meaning the caller must list everything once.
+        Cost grows with the number of changes, not the size of the library.
+        """
+        root = self._server_relative(self.root_folder)
+        library = self._library_of(root)
+        # Taken first, so changes made while we read are seen again next time
+        new_token = self.rest.current_change_token(library)
+        if token is None:
+            return None, new_token
+        try:
+            ids = sorted({c["ItemId"] for c in self.rest.get_changes(library, token)})
+        except requests.HTTPError as e:
+            logger.warning("Change token rejected (%s); listing every folder", e)
+            return None, new_token
+        changed: Dict[str, List[SourceInfo]] = {}
+        for item in self.rest.get_items(library, ids, _CHANGED_ITEM_FIELDS):
+            ref, name = item.get("FileRef", ""), item.get("FileLeafRef", "")
+            folder = ref.rpartition("/")[0]
+            if (str(item.get("FSObjType")) != "0" or folder.rpartition("/")[0] != root
+                    or not name.lower().endswith(SOURCE_EXTENSIONS)):
                 continue
-            local = dest / item.name
-            with open(local, "wb") as fh:
-                File.open_binary(self.ctx, item.serverRelativeUrl, fh)
-            files.append(local)
-            logger.info("Downloaded %s", item.serverRelativeUrl)
-        return files
+            changed.setdefault(folder, []).append(SourceInfo(
+                name, ref, int(item.get("File_x0020_Size") or 0), _timestamp(item.get("Modified")),
+            ))
+        logger.info("%d changed item(s), %d source(s) in %d folder(s)",
+                    len(ids), sum(map(len, changed.values())), len(changed))
+        return changed, new_token
+
+    def list_sources(self, rel_url: str) -> List[SourceInfo]:
+        """
+        Name, size and modified time of each source in the folder.
+        Only those fields are requested ($select), and no content is fetched.
+        """
+        with self._lock:
+            folder = self.ctx.web.get_folder_by_server_relative_url(rel_url)
+            files = folder.files
+            self.ctx.load(files, ["Name", "ServerRelativeUrl", "Length", "TimeLastModified"])
+            self.ctx.execute_query()
+        infos: List[SourceInfo] = []
+        for item in files:
+            props = item.properties
+            name = props.get("Name", "")
+            if not name.lower().endswith(SOURCE_EXTENSIONS):
+                continue
+            infos.append(SourceInfo(
+                name,
+                props.get("ServerRelativeUrl", f"{rel_url}/{name}"),
+                int(props.get("Length") or 0),
+                _timestamp(props.get("TimeLastModified")),
+            ))
+        return infos
+
+    def download_sources(self, rel_url: str, dest: Path,
+                         sources: Optional[List[SourceInfo]] = None
+                         ) -> Iterator[Union[Path, DownloadFailed]]:
+        """
+        Yield each source file as soon as it has been downloaded, or a
+        DownloadFailed for one that could not be fetched; pass
+        `sources` (from list_sources) to fetch only those files. They may
+        come from several folders; rel_url then only labels the log line.
+        Up to download_workers files are fetched at once over the shared
+        REST connection pool; at most twice that many are started ahead of
+        the consumer, so a slow caller still throttles the downloads.
+        """
+        if sources is None:
+            sources = self.list_sources(rel_url)
+
+        with ThreadPoolExecutor(self.download_workers, thread_name_prefix="download") as pool:
+            running: Dict = {}
+            for info in sources:
+                running[pool.submit(self._download_one, info, dest)] = info
+                if len(running) >= self.download_workers * 2:
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    yield from self._collect(finished, running)
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                yield from self._collect(finished, running)
+        logger.info("Downloads for %s: %s", rel_url, self.rest.download_stats.summary())
+
+    def _download_one(self, info: SourceInfo, dest: Path) -> Path:
+        with metrics.span("download", file=info.name, bytes=info.size):
+            return self.rest.download(info.url, dest / info.name, self.chunk_size)
+
+    @staticmethod
+    def _collect(futures, running: Dict) -> Iterator[Union[Path, DownloadFailed]]:
+        for fut in futures:
+            info = running.pop(fut)
+            try:
+                yield fut.result()
+            except Exception as e:
+                logger.error("Download of %s failed: %s", info.name, e)
+                yield DownloadFailed(info, str(e))
+
+    def list_outputs(self) -> Dict[str, int]:
+        """Name -> size of every file in the output folder, in one request."""
+        with self._lock:
+            folder = self.ctx.web.get_folder_by_server_relative_url(self.output_folder)
+            files = folder.files
+            self.ctx.load(files, ["Name", "Length"])
+            self.ctx.execute_query()
+        return {f.properties.get("Name", ""): int(f.properties.get("Length") or 0) for f in files}
 
     def upload_pdf(self, pdf_path: Path) -> None:
-        with open(pdf_path, "rb") as fh:
-            File.save_binary(self.ctx, f"{self.output_folder}/{pdf_path.name}", fh)
+        size = pdf_path.stat().st_size
+        with metrics.span("upload", file=pdf_path.name, bytes=size) as sp:
+            if size >= self.session_threshold and size > self.upload_chunk:
+                # Over the pooled REST session; ClientContext is not involved
+                sp["chunked"] = True
+                self.rest.upload_chunked(self._server_relative(self.output_folder),
+                                         pdf_path.name, pdf_path, self.upload_chunk)
+            else:
+                with self._lock, open(pdf_path, "rb") as fh:
+                    File.save_binary(self.ctx, f"{self.output_folder}/{pdf_path.name}", fh)
         logger.info("Uploaded %s", pdf_path.name)
\ No newline at end of file
@@ -0,0 +1,188 @@
+# sheet_reader.py
+"""
+Streaming row readers for .csv and .xlsx sources.
+
+Rows are yielded one at a time as lists of display strings ("" for empty
+cells), so callers can walk arbitrarily large sheets in bounded memory.
+For .xlsx only the shared-string table and cell style list are held in
+memory; the worksheet XML itself is parsed incrementally.
+"""
+import csv
+import datetime as dt
+import posixpath
+import re
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterator, List, Set
+from xml.etree.ElementTree import iterparse
+
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Built-in number formats that Excel renders as dates/times
+_BUILTIN_DATE_FORMATS = set(range(14, 23)) | {45, 46, 47}
+_EXCEL_EPOCH = dt.datetime(1899, 12, 30)
+_CELL_REF = re.compile(r"([A-Z]+)(\d+)")
+
+
+class SheetReadError(Exception):
+    """Raised when a source cannot be parsed as a spreadsheet."""
+
+
+def iter_rows(src: Path) -> Iterator[List[str]]:
+    """Yield the rows of the first sheet of `src` (.csv or .xlsx)."""
+    suffix = src.suffix.lower()
+    if suffix == ".csv":
+        return _iter_csv(src)
+    if suffix == ".xlsx":
+        return _iter_xlsx(src)
+    raise SheetReadError(f"Unsupported file type {suffix}")
+
+
+def _iter_csv(src: Path) -> Iterator[List[str]]:
+    # utf-8-sig strips the BOM Excel writes; errors="replace" keeps odd
+    # legacy exports readable instead of aborting half-way through.
+    with src.open(newline="", encoding="utf-8-sig", errors="replace") as f:
+        for row in csv.reader(f):
+            yield [cell.strip() for cell in row]
+
+
+def _col_index(letters: str) -> int:
+    n = 0
+    for ch in letters:
+        n = n * 26 + (ord(ch) - 64)
+    return n
+
+
+def _first_sheet_path(zf: zipfile.ZipFile) -> str:
+    """Resolve the part name of the first worksheet via workbook.xml.rels."""
+    try:
+        with zf.open("xl/workbook.xml") as f:
+            first = next(
+                (el for _, el in iterparse(f) if el.tag == f"{_NS_MAIN}sheet"), None
+            )
+        rid = first.get(f"{_NS_REL}id") if first is not None else None
+        with zf.open("xl/_rels/workbook.xml.rels") as f:
+            for _, el in iterparse(f):
+                if el.tag == f"{_NS_PKG_REL}Relationship" and el.get("Id") == rid:
+                    target = el.get("Target")
+                    if target.startswith("/"):
+                        return target.lstrip("/")
+                    return posixpath.normpath(posixpath.join("xl", target))
+    except KeyError:
+        pass
+    return "xl/worksheets/sheet1.xml"
+
+
+def _shared_strings(zf: zipfile.ZipFile) -> List[str]:
+    strings: List[str] = []
+    try:
+        f = zf.open("xl/sharedStrings.xml")
+    except KeyError:
+        return strings
+    with f:
+        for _, el in iterparse(f):
+            if el.tag == f"{_NS_MAIN}si":
+                strings.append("".join(t.text or "" for t in el.iter(f"{_NS_MAIN}t")))
+                el.clear()
+    return strings
+
+
+def _date_styles(zf: zipfile.ZipFile) -> Set[int]:
+    """Indexes into cellXfs whose number format is a date or time."""
+    try:
+        f = zf.open("xl/styles.xml")
+    except KeyError:
+        return set()
+    custom_dates: Set[int] = set()
+    styles: Set[int] = set()
+    with f:
+        in_xfs = False
+        idx = 0
+        for event, el in iterparse(f, events=("start", "end")):
+            if event == "start" and el.tag == f"{_NS_MAIN}cellXfs":
+                in_xfs = True
+            elif event == "end" and el.tag == f"{_NS_MAIN}cellXfs":
+                in_xfs = False
+            elif event == "end" and el.tag == f"{_NS_MAIN}numFmt":
+                code = re.sub(r'"[^"]*"|\[[^\]]*\]', "", el.get("formatCode", "")).lower()
+                if re.search(r"[dmyhs]", code):
+                    custom_dates.add(int(el.get("numFmtId", "0")))
+            elif event == "end" and in_xfs and el.tag == f"{_NS_MAIN}xf":
+                fmt = int(el.get("numFmtId", "0"))
+                if fmt in _BUILTIN_DATE_FORMATS or fmt in custom_dates:
+                    styles.add(idx)
+                idx += 1
+    return styles
+
+
+def _format_number(raw: str, is_date: bool) -> str:
+    try:
+        num = float(raw)
+    except ValueError:
+        return raw
+    if is_date:
+        stamp = _EXCEL_EPOCH + dt.timedelta(days=num)
+        if num == int(num):
+            return f"{stamp.month}/{stamp.day}/{stamp.year}"
+        return f"{stamp.month}/{stamp.day}/{stamp.year} {stamp:%H:%M}"
+    if num == int(num) and abs(num) < 1e15:
+        return str(int(num))
+    return f"{num:.10g}"
+
+
+def _iter_xlsx(src: Path) -> Iterator[List[str]]:
+    try:
+        zf = zipfile.ZipFile(src)
+    except (zipfile.BadZipFile, OSError) as e:
+        raise SheetReadError(f"Not a readable .xlsx file: {e}") from e
+    with zf:
+        shared = _shared_strings(zf)
+        date_styles = _date_styles(zf)
+        sheet_part = _first_sheet_path(zf)
+        try:
+            f = zf.open(sheet_part)
+        except KeyError as e:
+            raise SheetReadError(f"Worksheet {sheet_part} missing") from e
+        with f:
+            next_row = 1
+            sheet_data = None
+            for event, el in iterparse(f, events=("start", "end")):
+                if event == "start":
+                    if el.tag == f"{_NS_MAIN}sheetData":
+                        sheet_data = el
+                    continue
+                if el.tag != f"{_NS_MAIN}row":
+                    continue
+                r = int(el.get("r", next_row))
+                # Excel omits empty rows; emit blanks so row numbers line up
+                while next_row < r:
+                    yield []
+                    next_row += 1
+                cells: Dict[int, str] = {}
+                col = 0
+                for c in el.iter(f"{_NS_MAIN}c"):
+                    ref = _CELL_REF.match(c.get("r", ""))
+                    col = _col_index(ref.group(1)) if ref else col + 1
+                    kind = c.get("t", "n")
+                    if kind == "inlineStr":
+                        text = "".join(t.text or "" for t in c.iter(f"{_NS_MAIN}t"))
+                    else:
+                        v = c.find(f"{_NS_MAIN}v")
+                        raw = v.text if v is not None and v.text is not None else ""
+                        if kind == "s":
+                            text = shared[int(raw)] if raw else ""
+                        elif kind == "b":
+                            text = "TRUE" if raw == "1" else "FALSE"
+                        elif kind in ("str", "e"):
+                            text = raw
+                        else:
+                            text = _format_number(raw, int(c.get("s", "0")) in date_styles) if raw else ""
+                    cells[col] = text.strip()
+                # Drop parsed rows from the tree so memory stays flat
+                if sheet_data is not None:
+                    sheet_data.clear()
+                width = max(cells) if cells else 0
+                yield [cells.get(i, "") for i in range(1, width + 1)]
+                next_row = r + 1
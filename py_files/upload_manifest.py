@@ -0,0 +1,93 @@
+# upload_manifest.py
+"""
+Skip uploading PDFs the destination already holds.
+
+Every successful upload records the PDF's SHA-256 and size. Before the
+same name is uploaded again, the local hash is compared with that record
+and the recorded size with the remote file's size, taken from a single
+listing of the output folder per run (gateway.list_outputs). Matches are
+skipped. Anything missing remotely, or changed on either side, is uploaded
+again, so a re-run after partial failures only pushes what is missing.
+"""
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from py_files.config import UPLOAD_MANIFEST
+from py_files.conversion_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+
+class UploadManifest:
+    """
+    :param path: JSON file of name -> {"sha256", "size"} for uploaded PDFs.
+    """
+    def __init__(self, path: Path = UPLOAD_MANIFEST):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+        self._remote: Optional[Dict[str, int]] = None
+        self._digests: Dict[Path, str] = {}
+        self._dirty = False
+        try:
+            self._entries = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable upload manifest %s: %s", path, e)
+
+    def _remote_sizes(self, gateway) -> Dict[str, int]:
+        # One metadata query for the whole run, shared by the upload threads
+        with self._lock:
+            if self._remote is None:
+                try:
+                    self._remote = {k.lower(): v for k, v in gateway.list_outputs().items()}
+                except Exception as e:
+                    logger.warning("Could not list uploaded PDFs (%s); uploading everything", e)
+                    self._remote = {}
+            return self._remote
+
+    def unchanged(self, gateway, pdf: Path) -> bool:
+        """True when the destination already holds exactly this PDF."""
+        with self._lock:
+            entry = self._entries.get(pdf.name.lower())
+        if entry is None:
+            return False
+        if self._remote_sizes(gateway).get(pdf.name.lower()) != entry["size"]:
+            return False
+        digest = file_digest(pdf)
+        if digest == entry["sha256"]:
+            return True
+        with self._lock:
+            # Reused by record() after the upload
+            self._digests[pdf] = digest
+        return False
+
+    def record(self, pdf: Path) -> None:
+        """Note a successful upload of `pdf`."""
+        with self._lock:
+            digest = self._digests.pop(pdf, None)
+        digest = digest or file_digest(pdf)
+        size = pdf.stat().st_size
+        with self._lock:
+            self._entries[pdf.name.lower()] = {"sha256": digest, "size": size}
+            if self._remote is not None:
+                self._remote[pdf.name.lower()] = size
+            self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._entries)
+            self._dirty = False
+        tmp = self.path.with_suffix(".tmp")
+        try:
+            tmp.write_text(data, encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("Could not save upload manifest %s: %s", self.path, e)
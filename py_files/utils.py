@@ -0,0 +1,80 @@
+# utils.py
+"""
+Lightweight helpers shared by the converters, gateways and CLI.
+Nothing in here may import COM or SharePoint libraries so it stays
+importable on every platform.
+"""
+import re
+from typing import Iterable, NamedTuple, Optional, Sequence, Tuple
+
+from py_files.config import valid_unit_codes
+
+PDF_SUFFIX = "_lease_leadpaint_xrf"
+PDF_GLOB = f"*{PDF_SUFFIX}.pdf"
+SOURCE_EXTENSIONS = (".xls", ".xlsx", ".csv")
+
+
+class SourceInfo(NamedTuple):
+    """Metadata of a source workbook, as listed by a gateway."""
+    name: str
+    url: str          # server-relative URL (SharePoint) or local path (mock)
+    size: int
+    modified: float   # POSIX timestamp
+
+
+class DownloadFailed(NamedTuple):
+    """Yielded by download_sources in place of a path it could not fetch."""
+    info: SourceInfo
+    error: str
+
+
+def extract_ids(stem: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Pull (property, unit) out of a "<prop>-<unit>-XRF..." file stem.
+    The unit is dropped when it is not a known unit code (valid_unit_codes).
+    """
+    m = re.match(r'^([^-]+)', stem)
+    prop = m.group(1) if m else None
+    m2 = re.search(r'-([^-]+)-XRF', stem)
+    unit = m2.group(1) if m2 else None
+    if unit and unit.upper() not in valid_unit_codes():
+        unit = None
+    return prop, unit
+
+
+def pdf_name(prop: str, unit: str) -> str:
+    """Final PDF filename for a property/unit pair."""
+    return f"{prop}_{unit}{PDF_SUFFIX}.pdf"
+
+
+def key_from_pdf(stem: str) -> str:
+    """Checklist key ("Property_Unit") for a converted PDF stem."""
+    return stem.replace(PDF_SUFFIX, "")
+
+
+def find_header_row(rows: Iterable[Sequence]) -> int:
+    """
+    1-based index of the row with the most populated cells (first one wins
+    on ties). Accepts any iterable of rows so it works on a COM Value
+    array as well as a streamed CSV reader.
+    """
+    header_row = 1
+    maxpop = 0
+    for r, row in enumerate(rows, start=1):
+        cnt = sum(1 for v in row if v not in (None, ""))
+        if cnt > maxpop:
+            maxpop = cnt
+            header_row = r
+    return header_row
+
+
+def source_key(name: str) -> Optional[str]:
+    """Checklist key ("Property_Unit") for a source filename, or None."""
+    prop, unit = extract_ids(name.rsplit(".", 1)[0])
+    return f"{prop}_{unit}" if prop and unit else None
+
+
+def is_pending(name: str, done_map) -> bool:
+    """True when a source filename maps to a unit not yet marked complete."""
+    key = source_key(name)
+    return bool(key) and not done_map.get(key)
@@ -0,0 +1,313 @@
+# worker_pool.py
+"""
+Process pool where every worker owns one converter context (for the Excel
+backend: one DispatchEx Excel instance). Jobs are handed to idle workers
+over private pipes so a crashed worker can only ever lose its own job;
+the pool reports that job as failed and starts a replacement worker.
+
+A watchdog enforces per-stage timeouts: converters report the stage they
+enter through `on_stage`, and a worker stuck past its limit (a password
+prompt in Workbooks.Open, a printer driver stall in ExportAsFixedFormat)
+is killed together with its helper processes (EXCEL.EXE) and replaced.
+"""
+import importlib
+import logging
+import multiprocessing as mp
+import os
+import signal
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+from py_files.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Backend name -> "module:Class". Imported lazily inside each worker so the
+# parent never needs pywin32 just to start a pool.
+BACKENDS = {
+    "excel": "py_files.excel_converter:ExcelConverter",
+    "python": "py_files.pdf_converter:PdfConverter",
+    "fake": "py_files.fake_converter:FakeConverter",
+}
+
+
+def load_backend(name: str):
+    """Resolve a backend name (or a raw "module:Class" path) to a class."""
+    target = BACKENDS.get(name, name)
+    if ":" not in target:
+        raise ValueError(f"Unknown converter backend '{name}'")
+    module, attr = target.split(":", 1)
+    return getattr(importlib.import_module(module), attr)
+
+
+# Give up if this many workers in a row die before reporting ready, instead
+# of respawning forever when e.g. Excel cannot be started at all.
+MAX_STARTUP_FAILURES = 3
+
+
+# Seconds a worker may spend in one stage before it is killed. "start" is
+# converter startup (launching Excel, also reported when an Excel instance
+# is replaced before a job) and "job" caps a whole conversion; the others
+# match the stages converters report via on_stage.
+DEFAULT_TIMEOUTS = {"start": 180, "open": 120, "format": 120, "export": 300, "job": 600}
+
+# How often poll() wakes up to check deadlines while work is outstanding
+WATCHDOG_INTERVAL = 1.0
+
+
+class ConversionResult(NamedTuple):
+    src: Path
+    pdf: Optional[Path]
+    error: Optional[str] = None
+    killed: bool = False    # the worker crashed or hung on this job
+    seconds: Optional[float] = None  # time spent converting in the worker
+
+
+def _helper_pids(conv) -> List[int]:
+    pids = getattr(conv, "helper_pids", None)
+    return list(pids()) if pids else []
+
+
+def _worker_main(backend: str, output_dir: str, options: dict, conn) -> None:
+    """Worker loop: one converter context, one job at a time over `conn`."""
+    log = logging.getLogger(__name__)
+    conv_cls = load_backend(backend)
+    # Spans go back to the parent with each result; it owns the metrics file
+    metrics.buffer()
+    with conv_cls(Path(output_dir), **options) as conv:
+        conv.on_stage = lambda stage: conn.send(("stage", stage, _helper_pids(conv)))
+        conn.send(("ready", _helper_pids(conv)))
+        while True:
+            try:
+                src = conn.recv()
+            except EOFError:
+                break
+            if src is None:
+                break
+            src = Path(src)
+            try:
+                with metrics.span("convert", file=src.name, bytes=src.stat().st_size) as sp:
+                    pdf = conv.convert(src)
+                    sp["outcome"] = "done" if pdf else "skipped"
+                conn.send(("done", str(src), str(pdf) if pdf else None, None, metrics.drain()))
+            except Exception as e:
+                log.exception("Converter raised on %s", src)
+                conn.send(("done", str(src), None, repr(e), metrics.drain()))
+    conn.close()
+
+
+class _Worker:
+    def __init__(self, ctx, backend: str, output_dir: Path, options: dict):
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(
+            target=_worker_main,
+            args=(backend, str(output_dir), options, child),
+            daemon=True,
+        )
+        self.proc.start()
+        child.close()
+        self.job: Optional[Path] = None
+        self.ready = False
+        self.stage: Optional[str] = "start"
+        self.stage_since = self.job_since = time.monotonic()
+        self.helpers: List[int] = []
+
+
+class ConverterPool:
+    """
+    Context-managed pool of converter processes.
+
+    :param output_dir: Directory every worker writes PDFs into.
+    :param workers: Number of worker processes (Excel instances).
+    :param backend: Key of BACKENDS or a "module:Class" path.
+    :param backend_options: Extra keyword arguments for the converter class.
+    :param isolate: Give each worker its own output_dir/w<N> subdirectory, so
+                    concurrent jobs producing the same PDF name cannot clash.
+    :param timeouts: Overrides for DEFAULT_TIMEOUTS (stage -> seconds, 0 = none).
+    """
+    def __init__(self, output_dir: Path, workers: int = 1, backend: str = "excel",
+                 backend_options: Optional[dict] = None, isolate: bool = False,
+                 timeouts: Optional[dict] = None):
+        self.output_dir = output_dir
+        self.isolate = isolate
+        self.size = max(1, int(workers))
+        self.backend = backend
+        self.backend_options = backend_options or {}
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self._ctx = mp.get_context("spawn")
+        self._workers: List[_Worker] = []
+        self._pending: deque = deque()
+        self._done: deque = deque()
+        self._startup_failures = 0
+
+    def __enter__(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._workers = [self._spawn(i) for i in range(self.size)]
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for w in self._workers:
+            try:
+                w.conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+        for w in self._workers:
+            w.proc.join(timeout=30)
+            if w.proc.is_alive():
+                logger.warning("Worker %s did not exit, terminating", w.proc.pid)
+                w.proc.terminate()
+                w.proc.join()
+            w.conn.close()
+        self._workers = []
+
+    def _spawn(self, slot: int) -> _Worker:
+        out = self.output_dir / f"w{slot}" if self.isolate else self.output_dir
+        return _Worker(self._ctx, self.backend, out, self.backend_options)
+
+    @property
+    def outstanding(self) -> int:
+        """Jobs submitted but not yet reported back."""
+        busy = sum(1 for w in self._workers if w.job is not None)
+        return len(self._pending) + busy + len(self._done)
+
+    def submit(self, src: Path) -> None:
+        self._pending.append(src)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        for w in self._workers:
+            if not self._pending:
+                return
+            if w.ready and w.job is None:
+                w.job = self._pending.popleft()
+                w.stage = None
+                w.stage_since = w.job_since = time.monotonic()
+                try:
+                    w.conn.send(str(w.job))
+                except (OSError, BrokenPipeError):
+                    # Picked up as a crash by the next poll()
+                    pass
+
+    def _replace(self, idx: int, reason: Optional[str] = None) -> None:
+        w = self._workers[idx]
+        w.proc.join(timeout=5)
+        reason = reason or f"worker exited with code {w.proc.exitcode}"
+        if not w.ready:
+            self._startup_failures += 1
+            if self._startup_failures >= MAX_STARTUP_FAILURES:
+                raise RuntimeError(
+                    f"Converter backend '{self.backend}' failed to start {self._startup_failures} times"
+                )
+        if w.job is not None:
+            logger.error("Worker %s died on %s (%s)", w.proc.pid, w.job.name, reason)
+            metrics.emit({"ts": round(time.time(), 3), "pid": w.proc.pid, "stage": "convert",
+                          "seconds": round(time.monotonic() - w.job_since, 4),
+                          "outcome": "killed", "file": w.job.name, "error": reason})
+            self._done.append(ConversionResult(w.job, None, reason, killed=True))
+        else:
+            logger.error("Worker %s died while idle (%s)", w.proc.pid, reason)
+        w.conn.close()
+        self._workers[idx] = self._spawn(idx)
+
+    def _overdue(self, w: _Worker, now: float) -> Optional[str]:
+        """Why `w` has hung, or None while it is within its deadlines."""
+        if not w.ready:
+            checks = [("start", w.stage_since)]
+        elif w.job is not None:
+            checks = [(w.stage, w.stage_since), ("job", w.job_since)]
+        else:
+            return None
+        for stage, since in checks:
+            limit = self.timeouts.get(stage) if stage else None
+            if limit and now - since > limit:
+                return f"timed out in {stage} after {limit}s"
+        return None
+
+    @staticmethod
+    def _kill(w: _Worker) -> None:
+        # Excel is a separate process; killing only the worker would leave
+        # it running with the blocking dialog still open
+        for pid in w.helpers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        w.proc.kill()
+
+    def poll(self, timeout: Optional[float] = None) -> List[ConversionResult]:
+        """
+        Wait up to `timeout` seconds and return any finished results.
+        While work is outstanding this wakes every WATCHDOG_INTERVAL to
+        enforce timeouts, so it may return early with nothing.
+        """
+        if not self._done:
+            if any(not w.ready or w.job is not None for w in self._workers):
+                timeout = WATCHDOG_INTERVAL if timeout is None else min(timeout, WATCHDOG_INTERVAL)
+            by_conn = {w.conn: i for i, w in enumerate(self._workers)}
+            by_sentinel = {w.proc.sentinel: i for i, w in enumerate(self._workers)}
+            ready = wait(list(by_conn) + list(by_sentinel), timeout)
+            crashed = set()
+            for obj in ready:
+                if obj in by_conn:
+                    idx = by_conn[obj]
+                    w = self._workers[idx]
+                    try:
+                        msg = w.conn.recv()
+                    except (EOFError, OSError):
+                        crashed.add(idx)
+                        continue
+                    if msg[0] == "ready":
+                        w.ready = True
+                        w.stage = None
+                        w.helpers = msg[1]
+                        self._startup_failures = 0
+                    elif msg[0] == "stage":
+                        _, w.stage, w.helpers = msg
+                        w.stage_since = time.monotonic()
+                    elif msg[0] == "done":
+                        _, src, pdf, err, spans = msg
+                        seconds = None
+                        for record in spans:
+                            metrics.emit(record)
+                            if record["stage"] == "convert":
+                                seconds = record["seconds"]
+                        self._done.append(ConversionResult(w.job or Path(src), Path(pdf) if pdf else None,
+                                                           err, seconds=seconds))
+                        w.job = None
+                        w.stage = None
+                else:
+                    idx = by_sentinel[obj]
+                    # Drain a result the worker managed to send before exiting
+                    w = self._workers[idx]
+                    if w.job is not None and w.conn.poll():
+                        continue
+                    crashed.add(idx)
+            hung = {}
+            now = time.monotonic()
+            for idx, w in enumerate(self._workers):
+                reason = None if idx in crashed else self._overdue(w, now)
+                if reason:
+                    logger.error("Worker %s hung (%s), killing it", w.proc.pid, reason)
+                    self._kill(w)
+                    hung[idx] = reason
+            for idx in sorted(crashed):
+                self._replace(idx)
+            for idx, reason in hung.items():
+                self._replace(idx, reason)
+        self._dispatch()
+        out = list(self._done)
+        self._done.clear()
+        return out
+
+    def results(self) -> Iterator[ConversionResult]:
+        """Yield results as files finish until nothing is outstanding."""
+        while self.outstanding:
+            yield from self.poll(timeout=1.0)
+
+    def map(self, sources: Iterable[Path]) -> Iterator[ConversionResult]:
+        for src in sources:
+            self.submit(src)
+        return self.results()